@@ -0,0 +1,69 @@
+"""
+Gunicorn settings, picked up automatically from the working directory.
+
+Request metrics (main/metrics.py) are aggregated across workers with
+prometheus_client's multiprocess mode: each worker writes its samples under
+PROMETHEUS_MULTIPROC_DIR and /metrics sums them. The variable is set here so
+workers inherit it before they import the app.
+
+GUNICORN_PROFILE picks the app: 'wsgi' (default, sync workers) or 'asgi'
+(uvicorn workers, async views on an event loop). `manage.py bench_concurrency`
+compares the two.
+
+The arbiter also runs two commands beside the workers: `manage.py
+media_worker --loop 5`, so queued renditions and geotags are done on the
+machine that holds MEDIA_ROOT, and `manage.py send_outbox --loop 10`, so its
+SMTP timings reach /metrics. Set MEDIA_WORKER=0 or OUTBOX_WORKER=0 to leave
+either to a separately run process.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'photoshoot-metrics'))
+
+if os.environ.get('GUNICORN_PROFILE', 'wsgi') == 'asgi':
+    wsgi_app = 'photoshoot.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'photoshoot.wsgi:application'
+
+
+def on_starting(server):
+    # Samples left over from a previous run would otherwise be summed in forever.
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+BACKGROUND_COMMANDS = {
+    'MEDIA_WORKER': ['media_worker', '--loop', '5'],
+    'OUTBOX_WORKER': ['send_outbox', '--loop', '10'],
+}
+
+
+def when_ready(server):
+    # They inherit PROMETHEUS_MULTIPROC_DIR, so their metrics are served too.
+    server.background = [
+        subprocess.Popen(
+            [sys.executable, 'manage.py', *command],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        for switch, command in BACKGROUND_COMMANDS.items()
+        if os.environ.get(switch, '1') != '0'
+    ]
+
+
+def on_exit(server):
+    for process in getattr(server, 'background', []):
+        process.terminate()
+    for process in getattr(server, 'background', []):
+        process.wait(timeout=30)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,3 +1,10 @@
 from django.contrib import admin
-from .models import Post, Location, Comment, Like, PhotographerProfile
+from .models import Post, Location, Comment, Like, PhotographerProfile, OutboundEmail
 admin.site.register([Post, Location, Comment, Like, PhotographerProfile])
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'last_error')
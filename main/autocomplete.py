@@ -0,0 +1,159 @@
+"""
+Location autocomplete.
+
+Each process keeps a prefix index over the words of every location's name
+and city: a sorted list of (word, location id), so the locations with a
+word starting with "mon" are one bisect range. Every word of the query has
+to prefix-match a word of the location; results rank locations whose name
+starts with the query first, then by number of posts.
+
+The index refreshes the same way as the map cluster index (main/clusters.py):
+locations whose updated_at moved since the last look are re-read and patched
+in, and deleting a location bumps a cache epoch that forces a rebuild.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+EPOCH_KEY = 'autocomplete:epoch'
+# See clusters.WATERMARK_LAG.
+WATERMARK_LAG = timedelta(seconds=60)
+WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    """
+    Lower-cased, accent-free words: 'Montmartre, Paris' -> ['montmartre', 'paris'].
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return WORD.findall(text.casefold())
+
+
+class LocationIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = None   # {id: (name, city, posts, words)}
+        self.words = []       # sorted [(word, id), ...]
+        self.epoch = None
+        self.watermark = None
+        self.checked_at = 0
+
+    def _rows(self, queryset):
+        rows = queryset.annotate(posts=Count('post')).values_list('id', 'name', 'city', 'posts', 'updated_at')
+        return list(rows.iterator(chunk_size=5000))
+
+    def _entry(self, name, city, posts):
+        return name, city, posts, sorted(set(normalize(name) + normalize(city)))
+
+    def rebuild(self):
+        from .models import Location
+
+        epoch = cache.get(EPOCH_KEY)
+        rows = self._rows(Location.objects.all())
+        self.entries = {pk: self._entry(name, city, posts) for pk, name, city, posts, _ in rows}
+        self.words = sorted((word, pk) for pk, entry in self.entries.items() for word in entry[3])
+        self.epoch = epoch
+        self.watermark = max((row[4] for row in rows), default=None)
+
+    def apply_changes(self):
+        """
+        Re-read locations touched since the watermark. Returns how many changed.
+        """
+        from .models import Location
+
+        changed = 0
+        for pk, name, city, posts, updated in self._rows(
+            Location.objects.filter(updated_at__gte=self.watermark - WATERMARK_LAG)
+        ):
+            self.watermark = max(self.watermark, updated)
+            entry = self._entry(name, city, posts)
+            old = self.entries.get(pk)
+            if old == entry:
+                continue
+            for word in old[3] if old else ():
+                del self.words[bisect.bisect_left(self.words, (word, pk))]
+            for word in entry[3]:
+                bisect.insort(self.words, (word, pk))
+            self.entries[pk] = entry
+            changed += 1
+        return changed
+
+    def refresh(self):
+        """
+        Bring the index up to date; checks at most every AUTOCOMPLETE_REFRESH_SECONDS.
+        """
+        with self.lock:
+            if self.entries is not None and time.monotonic() - self.checked_at < settings.AUTOCOMPLETE_REFRESH_SECONDS:
+                return
+            if self.entries is None or cache.get(EPOCH_KEY) != self.epoch or self.watermark is None:
+                self.rebuild()
+            else:
+                self.apply_changes()
+            self.checked_at = time.monotonic()
+
+    def _range(self, prefix):
+        start = bisect.bisect_left(self.words, (prefix,))
+        # '\uffff' sorts after any character a word can continue with.
+        return start, bisect.bisect_left(self.words, (prefix + '\uffff',), start)
+
+    def search(self, query, limit):
+        """
+        [(id, name, city), ...] for locations matching every word of the query, best first.
+        """
+        terms = normalize(query)
+        if not terms:
+            return []
+        self.refresh()
+        entries = self.entries
+        # Narrow by the term with the fewest matching words, then check the rest.
+        ranges = sorted((end - start, start, end, term) for term in terms for start, end in [self._range(term)])
+        _, start, end, _ = ranges[0]
+        rest = [term for *_, term in ranges[1:]]
+        matches = []
+        for pk in {pk for _, pk in self.words[start:end]}:
+            name, city, posts, words = entries[pk]
+            if all(any(w.startswith(term) for w in words) for term in rest):
+                matches.append((pk, name, city, posts))
+
+        phrase = ' '.join(terms)
+        matches.sort(key=lambda m: (not ' '.join(normalize(m[1])).startswith(phrase), -m[3], m[1].casefold(), m[0]))
+        return [(pk, name, city) for pk, name, city, _ in matches[:limit]]
+
+
+index = LocationIndex()
+
+
+def invalidate():
+    """
+    Force every process to rebuild (for deletions, which leave no updated_at behind).
+    """
+    transaction.on_commit(lambda: cache.set(EPOCH_KEY, uuid.uuid4().hex, None))
+
+
+def parse_query(params):
+    """
+    (q, limit) from ?q=&limit=; raises ValueError for a limit that is not a positive integer.
+    """
+    query = params.get('q', '')[:100]
+    limit = params.get('limit')
+    if limit is None or limit == '':
+        return query, settings.AUTOCOMPLETE_DEFAULT_RESULTS
+    limit = int(limit)
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return query, min(limit, settings.AUTOCOMPLETE_MAX_RESULTS)
+
+
+def label(name, city):
+    return f'{name}, {city}' if city else name
@@ -0,0 +1,326 @@
+"""
+Map marker clustering.
+
+Every Location with coordinates and at least one post is projected to Web
+Mercator ([0, 1) x [0, 1)) and bucketed into a grid per zoom level: at zoom
+z the world is 2**z * 256 / CLUSTER_CELL_PX cells across, so one cell is
+roughly one marker's worth of screen. Levels 0..CLUSTER_MAX_ZOOM are kept
+in memory as NumPy arrays sorted by cell key (count, post total, coordinate
+sums for the centroid, and the sum of location ids, which *is* the id when
+a cell holds one location). Each level is built from the one below by
+halving the cell coordinates. Deeper zooms group the raw points of the
+visible area on the fly.
+
+A request reads only the visible columns of one level (a searchsorted per
+column), so the response has at most one marker per visible cell however
+many locations exist.
+
+The index lives per process. It is rebuilt from scratch when the cache key
+'clusters:epoch' moves (a location was deleted), and otherwise patched
+incrementally from locations whose `updated_at` moved since the last look
+(post changes touch their location's updated_at, see main/signals.py).
+"""
+import math
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+MAX_LATITUDE = 85.05112878
+TILE_PX = 256
+EPOCH_KEY = 'clusters:epoch'
+# Re-read changes this far behind the newest updated_at seen, so rows
+# committed late by slow transactions are not missed (applying is idempotent).
+WATERMARK_LAG = timedelta(seconds=60)
+
+
+class BBoxTooLarge(ValueError):
+    pass
+
+
+def project(lat, lng):
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    x = (np.asarray(lng, dtype=np.float64) + 180.0) / 360.0
+    s = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return np.clip(x, 0, 1 - 1e-12), np.clip(y, 0, 1 - 1e-12)
+
+
+def unproject(x, y):
+    lng = x * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * y))))
+    return lat, lng
+
+
+def cells_across(zoom):
+    return 2 ** zoom * TILE_PX // settings.CLUSTER_CELL_PX
+
+
+def _group(keys, columns):
+    """
+    Sum `columns` (dict of arrays aligned with keys) per distinct key.
+    Returns (sorted unique keys, dict of summed arrays).
+    """
+    unique, inverse = np.unique(keys, return_inverse=True)
+    summed = {name: np.bincount(inverse, weights=values, minlength=len(unique)) for name, values in columns.items()}
+    return unique, summed
+
+
+class Level:
+    def __init__(self, n, keys, sums):
+        self.n = n
+        self.keys = keys.astype(np.int64)
+        self.count = np.rint(sums['count']).astype(np.int64)
+        self.posts = np.rint(sums['posts']).astype(np.int64)
+        self.ids = np.rint(sums['ids']).astype(np.int64)
+        self.sx = sums['sx']
+        self.sy = sums['sy']
+
+    def columns(self):
+        return {'count': self.count, 'posts': self.posts, 'ids': self.ids, 'sx': self.sx, 'sy': self.sy}
+
+    def coarser(self):
+        n = self.n // 2
+        cx, cy = self.keys // self.n, self.keys % self.n
+        return Level(n, *_group((cx // 2) * n + cy // 2, self.columns()))
+
+    def patched(self, keys, delta):
+        """
+        This level with per-cell deltas (aligned with keys) added; empty cells dropped.
+        """
+        merged = {name: np.concatenate([values, delta[name]]) for name, values in self.columns().items()}
+        level = Level(self.n, *_group(np.concatenate([self.keys, keys]), merged))
+        keep = level.count > 0
+        for name in ('keys', 'count', 'posts', 'ids', 'sx', 'sy'):
+            setattr(level, name, getattr(level, name)[keep])
+        return level
+
+
+class ClusterIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.levels = None
+        self.epoch = None
+        self.watermark = None
+        self.checked_at = 0
+
+    # ----- building -----
+
+    def _rows(self, queryset):
+        """
+        Arrays (ids, lats, lngs, posts) for the locations, NaN coordinates
+        where unset, plus the newest updated_at among them.
+        """
+        rows = queryset.annotate(posts=Count('post')).values_list('id', 'latitude', 'longitude', 'posts', 'updated_at')
+        ids, lats, lngs, posts, newest = [], [], [], [], None
+        for pk, lat, lng, n, updated in rows.iterator(chunk_size=5000):
+            ids.append(pk)
+            lats.append(math.nan if lat is None else float(lat))
+            lngs.append(math.nan if lng is None else float(lng))
+            posts.append(n)
+            newest = updated if newest is None or updated > newest else newest
+        return (np.array(ids, dtype=np.int64), np.array(lats, dtype=np.float64),
+                np.array(lngs, dtype=np.float64), np.array(posts, dtype=np.int64), newest)
+
+    def _points(self, ids, lats, lngs, posts):
+        """
+        The mappable locations (coordinates and posts) sorted by their cell at CLUSTER_MAX_ZOOM.
+        """
+        keep = (posts > 0) & ~np.isnan(lats) & ~np.isnan(lngs)
+        x, y = project(lats[keep], lngs[keep])
+        n = cells_across(settings.CLUSTER_MAX_ZOOM)
+        keys = np.floor(x * n).astype(np.int64) * n + np.floor(y * n).astype(np.int64)
+        order = np.argsort(keys, kind='stable')
+        return {'keys': keys[order], 'ids': ids[keep][order], 'x': x[order], 'y': y[order], 'posts': posts[keep][order]}
+
+    def _build_levels(self):
+        p = self.points
+        n = cells_across(settings.CLUSTER_MAX_ZOOM)
+        finest = Level(n, *_group(p['keys'], {
+            'count': np.ones(len(p['keys'])), 'posts': p['posts'].astype(np.float64),
+            'ids': p['ids'].astype(np.float64), 'sx': p['x'], 'sy': p['y'],
+        }))
+        levels = [finest]
+        for _ in range(settings.CLUSTER_MAX_ZOOM):
+            levels.append(levels[-1].coarser())
+        self.levels = levels[::-1]   # index by zoom
+
+    def rebuild(self):
+        from .models import Location
+
+        epoch = cache.get(EPOCH_KEY)
+        ids, lats, lngs, posts, newest = self._rows(Location.objects.all())
+        self.points = self._points(ids, lats, lngs, posts)
+        self._build_levels()
+        self.epoch = epoch
+        self.watermark = newest
+
+    def apply_changes(self):
+        """
+        Re-read locations touched since the watermark and patch the index.
+        Returns how many locations were re-read and patched in.
+        """
+        from .models import Location
+
+        changed = Location.objects.filter(updated_at__gte=self.watermark - WATERMARK_LAG)
+        ids, lats, lngs, posts, newest = self._rows(changed)
+        if newest and newest > self.watermark:
+            self.watermark = newest
+
+        p = self.points
+        old = np.isin(p['ids'], ids)
+        old_points = {name: values[old] for name, values in p.items()}
+        new_points = self._points(ids, lats, lngs, posts)
+        if self._same(old_points, new_points):
+            return 0   # only the lag window re-read, or changes that move nothing
+
+        merged = {name: np.concatenate([values[~old], new_points[name]]) for name, values in p.items()}
+        order = np.argsort(merged['keys'], kind='stable')
+        self.points = {name: values[order] for name, values in merged.items()}
+
+        # Per level: subtract the old contributions, add the new ones.
+        n_max = cells_across(settings.CLUSTER_MAX_ZOOM)
+        for zoom in range(settings.CLUSTER_MAX_ZOOM, -1, -1):
+            shift = settings.CLUSTER_MAX_ZOOM - zoom
+            n = n_max >> shift
+            parts_keys, parts = [], {'count': [], 'posts': [], 'ids': [], 'sx': [], 'sy': []}
+            for points, sign in ((old_points, -1), (new_points, 1)):
+                cx, cy = (points['keys'] // n_max) >> shift, (points['keys'] % n_max) >> shift
+                parts_keys.append(cx * n + cy)
+                parts['count'].append(sign * np.ones(len(cx)))
+                parts['posts'].append(sign * points['posts'].astype(np.float64))
+                parts['ids'].append(sign * points['ids'].astype(np.float64))
+                parts['sx'].append(sign * points['x'])
+                parts['sy'].append(sign * points['y'])
+            self.levels[zoom] = self.levels[zoom].patched(
+                np.concatenate(parts_keys), {name: np.concatenate(v) for name, v in parts.items()}
+            )
+        return len(ids)
+
+    @staticmethod
+    def _same(a, b):
+        if len(a['ids']) != len(b['ids']):
+            return False
+        ia, ib = np.argsort(a['ids']), np.argsort(b['ids'])
+        return all(np.array_equal(a[name][ia], b[name][ib]) for name in ('ids', 'x', 'y', 'posts'))
+
+    def refresh(self):
+        """
+        Bring the index up to date; checks at most every CLUSTER_REFRESH_SECONDS.
+        """
+        with self.lock:
+            if self.levels is not None and time.monotonic() - self.checked_at < settings.CLUSTER_REFRESH_SECONDS:
+                return
+            if self.levels is None or cache.get(EPOCH_KEY) != self.epoch or self.watermark is None:
+                self.rebuild()
+            else:
+                self.apply_changes()
+            self.checked_at = time.monotonic()
+
+    # ----- querying -----
+
+    def _spans(self, n, west, south, east, north):
+        """
+        Visible (column range, row range) at a grid of n cells; two column
+        ranges when the box crosses the antimeridian.
+        """
+        (x0, x1), (y1, y0) = project([south, north], [west, east])   # y grows southwards
+        cols = [(int(x0 * n), int(x1 * n))] if west <= east else [(int(x0 * n), n - 1), (0, int(x1 * n))]
+        rows = (int(y0 * n), int(y1 * n))
+        cells = sum(c1 - c0 + 1 for c0, c1 in cols) * (rows[1] - rows[0] + 1)
+        if cells > settings.CLUSTER_MAX_CELLS:
+            raise BBoxTooLarge(f"{cells} cells visible at this zoom; the limit is {settings.CLUSTER_MAX_CELLS}.")
+        return cols, rows
+
+    def _slices(self, keys, n, cols, rows):
+        for c0, c1 in cols:
+            for cx in range(c0, c1 + 1):
+                lo = np.searchsorted(keys, cx * n + rows[0])
+                hi = np.searchsorted(keys, cx * n + rows[1], side='right')
+                if hi > lo:
+                    yield slice(lo, hi)
+
+    def query(self, west, south, east, north, zoom):
+        """
+        Markers in the box: [(lat, lng, count, posts, location_id or None), ...].
+        """
+        self.refresh()
+        levels = self.levels
+        if zoom <= settings.CLUSTER_MAX_ZOOM:
+            level = levels[zoom]
+            cols, rows = self._spans(level.n, west, south, east, north)
+            picks = list(self._slices(level.keys, level.n, cols, rows))
+            if not picks:
+                return []
+            pick = np.r_[tuple(picks)]
+            count, posts, ids = level.count[pick], level.posts[pick], level.ids[pick]
+            x, y = level.sx[pick] / count, level.sy[pick] / count
+        else:
+            # Past the deepest stored level: group the visible raw points.
+            self._spans(cells_across(zoom), west, south, east, north)
+            n_max = cells_across(settings.CLUSTER_MAX_ZOOM)
+            cols, rows = self._spans(n_max, west, south, east, north)
+            p = self.points
+            picks = list(self._slices(p['keys'], n_max, cols, rows))
+            if not picks:
+                return []
+            pick = np.r_[tuple(picks)]
+            n = cells_across(zoom)
+            keys = np.floor(p['x'][pick] * n).astype(np.int64) * n + np.floor(p['y'][pick] * n).astype(np.int64)
+            _, sums = _group(keys, {
+                'count': np.ones(len(keys)), 'posts': p['posts'][pick].astype(np.float64),
+                'ids': p['ids'][pick].astype(np.float64), 'sx': p['x'][pick], 'sy': p['y'][pick],
+            })
+            count = np.rint(sums['count']).astype(np.int64)
+            posts, ids = np.rint(sums['posts']).astype(np.int64), np.rint(sums['ids']).astype(np.int64)
+            x, y = sums['sx'] / count, sums['sy'] / count
+
+        lat, lng = unproject(x, y)
+        inside = (lat >= south) & (lat <= north)
+        inside &= ((lng >= west) & (lng <= east)) if west <= east else ((lng >= west) | (lng <= east))
+        return [
+            (float(a), float(b), int(c), int(d), int(e) if c == 1 else None)
+            for a, b, c, d, e in zip(lat[inside], lng[inside], count[inside], posts[inside], ids[inside])
+        ]
+
+
+index = ClusterIndex()
+
+
+def invalidate():
+    """
+    Force every process to rebuild (for deletions, which leave no updated_at behind).
+    """
+    transaction.on_commit(lambda: cache.set(EPOCH_KEY, uuid.uuid4().hex, None))
+
+
+def touch_locations(location_ids):
+    """
+    Mark locations changed (e.g. their post count moved) for the incremental refresh.
+    """
+    from .models import Location
+
+    ids = [pk for pk in location_ids if pk]
+    if ids:
+        Location.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+
+
+def parse_bbox(params):
+    """
+    (west, south, east, north, zoom) from ?bbox=west,south,east,north&zoom=z; raises ValueError.
+    """
+    west, south, east, north = (float(v) for v in params['bbox'].split(','))
+    zoom = int(params['zoom'])
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south < north <= 90):
+        raise ValueError("bbox out of range")
+    if not 0 <= zoom <= 22:
+        raise ValueError("zoom must be between 0 and 22")
+    return west, south, east, north, zoom
@@ -0,0 +1,128 @@
+"""
+Engagement state for a batch of posts, and batched like/unlike.
+
+state() answers "what does this feed page look like for me" in a fixed number
+of queries whatever the number of posts: one for the counters, one for the
+viewer's likes and one for the latest few comments of every post.
+apply_like_ops() applies a queue of like/unlike operations in one
+transaction. Operations are idempotent (set, not toggle), so a client can
+safely resend a batch whose response it never saw.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from . import live, pagecache
+from .models import Comment, Like, Post
+
+LIKE = 'like'
+UNLIKE = 'unlike'
+
+
+class InvalidOps(ValueError):
+    pass
+
+
+def parse_ids(value):
+    """
+    '1,2,3' (or a list) -> [1, 2, 3], deduplicated, at most ENGAGEMENT_MAX_POSTS.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    ids = []
+    for item in value:
+        try:
+            pk = int(item)
+        except (TypeError, ValueError):
+            continue
+        if pk not in ids:
+            ids.append(pk)
+    return ids[:settings.ENGAGEMENT_MAX_POSTS]
+
+
+def state(user, post_ids, preview=None):
+    """
+    {post_id: {'liked', 'like_count', 'comment_count', 'comments'}} for the
+    posts in post_ids that exist. `comments` are the latest `preview`
+    comments, oldest first.
+    """
+    preview = settings.ENGAGEMENT_PREVIEW_COMMENTS if preview is None else preview
+    result = {
+        pk: {'liked': False, 'like_count': likes, 'comment_count': comments, 'comments': []}
+        for pk, likes, comments in Post.objects.filter(id__in=post_ids)
+                                               .values_list('id', 'like_count', 'comment_count')
+    }
+    if not result:
+        return result
+
+    if user.is_authenticated:
+        for pk in Like.objects.filter(user=user, post_id__in=result).values_list('post_id', flat=True):
+            result[pk]['liked'] = True
+
+    if preview:
+        latest = (
+            Comment.objects.filter(post_id__in=result)
+            .select_related('user__photographerprofile')
+            .annotate(rank=Window(
+                RowNumber(), partition_by=F('post_id'), order_by=[F('created_at').desc(), F('id').desc()],
+            ))
+            .filter(rank__lte=preview)
+            .order_by('post_id', 'created_at', 'id')
+        )
+        for comment in latest:
+            result[comment.post_id]['comments'].append(comment)
+    return result
+
+
+def parse_ops(ops):
+    """
+    Validate [{'post_id': 1, 'action': 'like'}, ...] and collapse it to the
+    final wanted state per post: {post_id: liked}. Later operations win.
+    """
+    if not isinstance(ops, list) or len(ops) > settings.ENGAGEMENT_MAX_POSTS:
+        raise InvalidOps(f"ops must be a list of at most {settings.ENGAGEMENT_MAX_POSTS} operations.")
+    wanted = {}
+    for op in ops:
+        try:
+            pk, action = int(op['post_id']), op['action']
+        except (TypeError, KeyError, ValueError):
+            raise InvalidOps("Each op needs a post_id and an action.")
+        if action not in (LIKE, UNLIKE):
+            raise InvalidOps(f"Unknown action {action!r}.")
+        wanted[pk] = action == LIKE
+    return wanted
+
+
+def apply_like_ops(user, wanted):
+    """
+    Bring the user's likes in line with `wanted` ({post_id: liked}) and keep
+    the like_count counters in step. Unknown posts are ignored. Returns the
+    ids of the posts that exist.
+
+    Raises IntegrityError if a concurrent request liked one of the same posts
+    first; the caller can simply retry.
+    """
+    with transaction.atomic():
+        post_ids = set(Post.objects.filter(id__in=wanted).values_list('id', flat=True))
+        existing = set(
+            Like.objects.select_for_update()
+            .filter(user=user, post_id__in=post_ids)
+            .values_list('post_id', flat=True)
+        )
+        to_like = [pk for pk in post_ids if wanted[pk] and pk not in existing]
+        to_unlike = [pk for pk in post_ids if not wanted[pk] and pk in existing]
+
+        if to_like:
+            # bulk_create sends no signals, so bump the counters and push the
+            # new counts here.
+            Like.objects.bulk_create([Like(user=user, post_id=pk) for pk in to_like])
+            Post.bump(to_like, like_count=1)
+            live.counts_changed(to_like)
+        if to_unlike:
+            # The rows are locked above, and post_delete moves the counters.
+            Like.objects.filter(user=user, post_id__in=to_unlike).delete()
+        # Bulk writes send no signals.
+        if to_like or to_unlike:
+            pagecache.invalidate_posts(to_like + to_unlike)
+    return post_ids
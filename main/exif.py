@@ -0,0 +1,74 @@
+"""
+Image metadata: dimensions, capture time and GPS position from EXIF.
+
+Pure functions over an open file; no database or storage access, so they
+can run in worker processes.
+"""
+from datetime import datetime
+
+from PIL import ExifTags, Image
+
+GPS_IFD = ExifTags.IFD.GPSInfo
+EXIF_IFD = ExifTags.IFD.Exif
+ORIENTATION = ExifTags.Base.Orientation
+DATETIME_ORIGINAL = ExifTags.Base.DateTimeOriginal
+MAKE, MODEL = ExifTags.Base.Make, ExifTags.Base.Model
+
+
+def _degrees(value, ref):
+    d, m, s = (float(part) for part in value)
+    degrees = d + m / 60 + s / 3600
+    return -degrees if ref in ('S', 'W') else degrees
+
+
+def gps_position(exif):
+    """
+    (latitude, longitude) from an Image.Exif, or None when the photo has no
+    usable position.
+    """
+    gps = exif.get_ifd(GPS_IFD)
+    try:
+        latitude = _degrees(gps[ExifTags.GPS.GPSLatitude], gps.get(ExifTags.GPS.GPSLatitudeRef, 'N'))
+        longitude = _degrees(gps[ExifTags.GPS.GPSLongitude], gps.get(ExifTags.GPS.GPSLongitudeRef, 'E'))
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or (latitude, longitude) == (0, 0):
+        # (0, 0) is what many cameras write before they have a fix.
+        return None
+    return round(latitude, 6), round(longitude, 6)
+
+
+def taken_at(exif):
+    """
+    The naive capture time (cameras record local time), or None.
+    """
+    value = exif.get_ifd(EXIF_IFD).get(DATETIME_ORIGINAL) or exif.get(ExifTags.Base.DateTime)
+    try:
+        return datetime.strptime(str(value).strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def read(fh):
+    """
+    {'width', 'height', 'taken_at', 'latitude', 'longitude', 'camera'} for
+    an image file. Width and height are as displayed (after EXIF rotation).
+    Raises what Image.open()/verify() do for files that are not valid images.
+    """
+    with Image.open(fh) as image:
+        image.verify()
+    fh.seek(0)
+    with Image.open(fh) as image:
+        exif = image.getexif()
+        width, height = image.size
+    if exif.get(ORIENTATION) in (5, 6, 7, 8):
+        width, height = height, width
+    position = gps_position(exif) or (None, None)
+    return {
+        'width': width,
+        'height': height,
+        'taken_at': taken_at(exif),
+        'latitude': position[0],
+        'longitude': position[1],
+        'camera': ' '.join(str(exif[tag]).strip('\x00 ') for tag in (MAKE, MODEL) if exif.get(tag)),
+    }
@@ -1,12 +1,51 @@
 from django import forms
-from .models import Post, Comment, PhotographerProfile
+from django.urls import reverse_lazy
+from .autocomplete import label as location_label
+from .models import Location, Post, Comment, PhotographerProfile
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 
-class PostForm(forms.ModelForm):
+class UploadErrorsMixin:
+    """
+    Surfaces files rejected mid-stream by main.uploads.StreamingUploadHandler
+    (passed in as upload_errors={field: message}) as ordinary field errors.
+    """
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field, message in self.upload_errors.items():
+            self.add_error(field if field in self.fields else None, message)
+        return cleaned_data
+
+class LocationAutocomplete(forms.Widget):
+    """
+    A search box over the location_autocomplete endpoint plus a hidden input
+    carrying the chosen id. Renders no choices, so the page costs the same
+    however many locations exist; only the selected one is looked up.
+    """
+    template_name = 'main/widgets/location_autocomplete.html'
+
+    def __init__(self, attrs=None, url=reverse_lazy('location_autocomplete')):
+        super().__init__(attrs)
+        self.url = url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        location = Location.objects.filter(pk=value).first() if str(value or '').isdigit() else None
+        context['widget'].update({
+            'url': str(self.url),
+            'label': location_label(location.name, location.city) if location else '',
+        })
+        return context
+
+class PostForm(UploadErrorsMixin, forms.ModelForm):
     class Meta:
         model = Post
         fields = ['title','description','location','image','video']
+        widgets = {'location': LocationAutocomplete}
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -19,7 +58,7 @@ class SignUpForm(UserCreationForm):
         model = User
         fields = ('username','email','password1','password2')
 
-class PhotographerProfileForm(forms.ModelForm):
+class PhotographerProfileForm(UploadErrorsMixin, forms.ModelForm):
     class Meta:
         model = PhotographerProfile
         fields = ['bio','contact','portfolio_link','profile_pic']
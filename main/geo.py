@@ -0,0 +1,215 @@
+"""
+Proximity search over Location coordinates.
+
+Every Location with coordinates stores its geohash (Location.geohash,
+GEOHASH_PRECISION characters), indexed together with the coordinates.
+Points in the same geohash cell share a prefix, so "everything in cell X"
+is the index range [X, X + '{'). nearby() covers the circle's bounding box
+with at most MAX_CELLS cells of the finest size that allows, scans those
+ranges (never the whole table), drops entries outside the box using the
+coordinates in the same index, and only computes exact distances for what
+is left.
+"""
+import math
+
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9          # ~4.8m x 4.8m cells
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# '{' sorts right after 'z', the last base32 digit.
+PREFIX_END = '{'
+# Most prefix ranges one lookup may scan.
+MAX_CELLS = 16
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """
+    (height, width) of a geohash cell in degrees.
+    """
+    lat_bits = (5 * precision) // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle (haversine) distance.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    (south, north, west, east) in degrees around the circle. west > east
+    when the box crosses the antimeridian; a box reaching a pole spans all
+    longitudes.
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    dlat = radius_km / KM_PER_DEGREE
+    south, north = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    edge = max(abs(south), abs(north))
+    if edge >= 89.0:
+        return south, north, -180.0, 180.0
+    dlon = dlat / math.cos(math.radians(edge))
+    if dlon >= 180:
+        return south, north, -180.0, 180.0
+    west = (longitude - dlon + 180) % 360 - 180
+    east = (longitude + dlon + 180) % 360 - 180
+    return south, north, west, east
+
+
+def _cell_span(low, high, size, origin, count):
+    """
+    Indexes of the cells of `size` degrees (counted from `origin`) that
+    overlap [low, high]; wraps around when low > high (antimeridian).
+    """
+    first = min(int((low - origin) // size), count - 1)
+    last = min(int((high - origin) // size), count - 1)
+    if last < first:
+        return list(range(first, count)) + list(range(0, last + 1))
+    return list(range(first, last + 1))
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the circle's bounding box,
+    at the finest cell size that needs no more than MAX_CELLS cells.
+    """
+    south, north, west, east = bounding_box(latitude, longitude, radius_km)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = _cell_span(south, north, height, -90.0, round(180 / height))
+        cols = _cell_span(west, east, width, -180.0, round(360 / width))
+        if len(rows) * len(cols) <= MAX_CELLS:
+            return sorted(
+                encode(-90 + (i + 0.5) * height, -180 + (j + 0.5) * width, precision)
+                for i in rows for j in cols
+            )
+    return ['']   # the box spans a sizeable part of the planet
+
+
+def _ranges(cells):
+    """
+    Merge cells that are consecutive in geohash order into (low, high) ranges.
+    """
+    ranges = []
+    for cell in cells:
+        if not cell:
+            return [('', PREFIX_END)]
+        value = int(''.join(f'{BASE32.index(c):05b}' for c in cell), 2)
+        if ranges and ranges[-1][2] == value - 1 and len(ranges[-1][0]) == len(cell):
+            ranges[-1] = (ranges[-1][0], cell, value)
+        else:
+            ranges.append((cell, cell, value))
+    return [(low, high + PREFIX_END) for low, high, _ in ranges]
+
+
+def cells_filter(cells):
+    """
+    Q() matching locations in any of the cells, as index range lookups.
+    """
+    q = Q()
+    for low, high in _ranges(cells):
+        q |= Q(geohash__gte=low, geohash__lt=high) if low else Q(geohash__gt='')
+    return q
+
+
+def box_filter(latitude, longitude, radius_km):
+    """
+    Q() for the bounding box itself, checked from the same index entries.
+    """
+    south, north, west, east = bounding_box(latitude, longitude, radius_km)
+    q = Q(latitude__range=(south, north))
+    if west <= east:
+        q &= Q(longitude__range=(west, east))
+    else:
+        q &= Q(longitude__gte=west) | Q(longitude__lte=east)
+    return q
+
+
+def nearby(latitude, longitude, radius_km, limit):
+    """
+    [(distance_km, location), ...] within radius_km of the point, nearest first.
+    """
+    from .models import Location
+
+    candidates = []
+    rows = (
+        Location.objects
+        .filter(cells_filter(covering_cells(latitude, longitude, radius_km)))
+        .filter(box_filter(latitude, longitude, radius_km))
+        .values_list('id', 'latitude', 'longitude')
+    )
+    for pk, lat, lon in rows.iterator(chunk_size=2000):
+        d = distance_km(latitude, longitude, lat, lon)
+        if d <= radius_km:
+            candidates.append((d, pk))
+    candidates.sort()
+    candidates = candidates[:limit]
+
+    locations = Location.objects.in_bulk([pk for _, pk in candidates])
+    return [(d, locations[pk]) for d, pk in candidates]
+
+
+def recent_posts(location_ids, per_location):
+    """
+    {location_id: [post, ...]} with the newest `per_location` posts of each, in one query.
+    """
+    from .models import Post
+
+    result = {pk: [] for pk in location_ids}
+    if not location_ids or not per_location:
+        return result
+    posts = (
+        Post.objects.filter(location_id__in=location_ids)
+        .annotate(rank=Window(
+            RowNumber(), partition_by=F('location_id'), order_by=[F('created_at').desc(), F('id').desc()],
+        ))
+        .filter(rank__lte=per_location)
+        .order_by('location_id', '-created_at', '-id')
+    )
+    for post in posts:
+        result[post.location_id].append(post)
+    return result
+
+
+def parse_point(params):
+    """
+    (lat, lng, radius_km, limit) from request params; raises ValueError.
+    """
+    latitude, longitude = float(params['lat']), float(params['lng'])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("lat/lng out of range")
+    radius = float(params.get('radius_km') or settings.NEARBY_DEFAULT_RADIUS_KM)
+    if not (0 < radius <= settings.NEARBY_MAX_RADIUS_KM):
+        raise ValueError(f"radius_km must be between 0 and {settings.NEARBY_MAX_RADIUS_KM}")
+    limit = int(params.get('limit') or settings.NEARBY_MAX_RESULTS)
+    return latitude, longitude, radius, max(1, min(limit, settings.NEARBY_MAX_RESULTS))
@@ -0,0 +1,138 @@
+"""
+Locations from photo GPS.
+
+Saving a post with a new image queues a GeotagJob (one small insert; the
+image is not opened during the request). `manage.py media_worker` reads
+the queued images' EXIF GPS (main/exif.py) and, for each position:
+
+- records it on the post (photo_latitude/photo_longitude);
+- a post without a location gets the nearest existing Location within
+  GEOTAG_SNAP_KM (a geohash lookup, main/geo.py), never a new one;
+- a post whose location has no coordinates gives it the photo's position,
+  unless a different location is already that close (it is probably the
+  same spot under another name, so nothing is changed).
+
+Anything not applied stays on the post as a suggestion for the uploader.
+Images are read outside any transaction: posts are leased in one and each
+result is written in another.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import exif, geo
+from .models import GeotagJob, Post
+
+logger = logging.getLogger(__name__)
+
+SNAPPED = 'snapped'
+FILLED = 'filled'
+SUGGESTED = 'suggested'
+NO_GPS = 'no_gps'
+UNREADABLE = 'unreadable'
+
+
+def enqueue(posts):
+    # One insert; a post already waiting keeps its place, and one being
+    # read loses its lease so its new image is read too.
+    GeotagJob.objects.bulk_create(
+        [GeotagJob(post=post) for post in posts],
+        update_conflicts=True, unique_fields=['post'], update_fields=['claimed_until'],
+    )
+
+
+def read_position(fieldfile):
+    """
+    (latitude, longitude) from an image's EXIF, or None.
+    """
+    with fieldfile.storage.open(fieldfile.name, 'rb') as fh:
+        meta = exif.read(fh)
+    if meta['latitude'] is None:
+        return None
+    return meta['latitude'], meta['longitude']
+
+
+def nearest_location(latitude, longitude):
+    found = geo.nearby(latitude, longitude, settings.GEOTAG_SNAP_KM, 1)
+    return found[0][1] if found else None
+
+
+def apply(post, latitude, longitude):
+    """
+    Record a photo position on `post` and use it where it fills a gap.
+    Returns SNAPPED, FILLED or SUGGESTED.
+    """
+    post.photo_latitude, post.photo_longitude = latitude, longitude
+    fields = ['photo_latitude', 'photo_longitude']
+    location = post.location
+    nearest = nearest_location(latitude, longitude)
+    outcome = SUGGESTED
+
+    if location is None and nearest is not None:
+        post.location = nearest
+        fields.append('location')
+        outcome = SNAPPED
+    elif location is not None and location.latitude is None and nearest is None:
+        location.latitude, location.longitude = latitude, longitude
+        location.save(update_fields=['latitude', 'longitude'])
+        outcome = FILLED
+
+    if 'location' in fields:
+        # A full save so the search index, page cache and map pick it up.
+        post.save(update_fields=fields)
+    else:
+        Post.objects.filter(pk=post.pk).update(photo_latitude=latitude, photo_longitude=longitude)
+    return outcome
+
+
+def process(post):
+    if not post.image:
+        return NO_GPS
+    try:
+        position = read_position(post.image)
+    except Exception:
+        # Decoders raise all sorts on malformed files; skip the image.
+        logger.warning("Could not read EXIF of %s", post.image.name, exc_info=True)
+        return UNREADABLE
+    if position is None:
+        return NO_GPS
+    # The image has been read; only the writes are a transaction.
+    with transaction.atomic():
+        return apply(post, *position)
+
+
+def claim(batch_size):
+    """
+    Lease up to batch_size queued posts for MEDIA_JOB_LEASE_SECONDS, in a
+    transaction of its own, so several workers can share the queue and a
+    worker that dies only delays its posts. Returns (lease, post ids).
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.MEDIA_JOB_LEASE_SECONDS)
+    with transaction.atomic():
+        post_ids = list(
+            GeotagJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(claimed_until=None) | Q(claimed_until__lte=now))
+            .order_by('created_at')
+            .values_list('post_id', flat=True)[:batch_size]
+        )
+        GeotagJob.objects.filter(post_id__in=post_ids).update(claimed_until=lease)
+    return lease, post_ids
+
+
+def run_batch(batch_size=50):
+    """
+    Geotag up to batch_size queued posts. Returns a Counter of outcomes.
+    """
+    outcomes = Counter()
+    lease, post_ids = claim(batch_size)
+    for post in Post.objects.select_related('location').filter(pk__in=post_ids).order_by('pk'):
+        outcomes[process(post)] += 1
+        # Kept if the post was queued again meanwhile.
+        GeotagJob.objects.filter(post_id=post.pk, claimed_until=lease).delete()
+    return outcomes
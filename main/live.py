@@ -0,0 +1,253 @@
+"""
+Live updates pushed to browsers over Server-Sent Events.
+
+Signals publish, once the transaction commits, a 'comment' event for every
+new comment and a 'counts' event whenever a post's like or comment count
+moves. The live_updates view streams the events for a set of posts (the
+open feed page) to one long-lived EventSource per viewer.
+
+Events go through a broker chosen by LIVE_BROKER:
+
+- MemoryBroker (default) fans out inside this process; enough for runserver
+  and a single worker.
+- RedisBroker publishes through Redis (LIVE_REDIS_URL, needs the `redis`
+  package), so a comment saved by one worker reaches viewers connected to
+  any other. Each worker keeps one Redis subscription and fans out locally.
+
+Streams only run under ASGI (LIVE_UPDATES): under WSGI each one would hold
+a sync worker for as long as the page is open, so the view answers 204 and
+the page falls back to fetching on demand. With nobody to receive them,
+nothing is published either.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Comment, Post
+from .pagination import encode_cursor
+from .renditions import url as rendition_url
+
+logger = logging.getLogger(__name__)
+
+
+def channel(post_id):
+    return f'post:{post_id}'
+
+
+def comment_json(c):
+    # c.user.photographerprofile must be select_related by the caller
+    return {
+        "id": c.id,
+        "user": c.user.username,
+        "text": c.text,
+        "created": c.created_at.strftime("%d %b %Y %H:%M"),
+        "profile_pic_url": rendition_url(c.user.photographerprofile.profile_pic, 64) if hasattr(c.user, 'photographerprofile') and c.user.photographerprofile.profile_pic else None
+    }
+
+
+# -----------------------------
+# Brokers
+# -----------------------------
+class Subscription:
+    """
+    One stream's queue. Brokers may deliver from any thread; items are
+    handed to the stream's event loop. A stream that falls LIVE_QUEUE_SIZE
+    events behind is marked overflowed and should end, so the browser
+    reconnects and catches up.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(settings.LIVE_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            pass  # the stream's loop has closed
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """
+        The next message, or None if there was none within `timeout` seconds.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+
+class MemoryBroker:
+    """
+    Delivers to the subscribers in this process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            for name in channels:
+                self._subscribers[name].add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                for name in channels:
+                    self._subscribers[name].discard(subscription)
+                    if not self._subscribers[name]:
+                        del self._subscribers[name]
+
+
+class RedisBroker(MemoryBroker):
+    """
+    Publishes through Redis pub/sub. The first subscriber in a process
+    starts a listener that receives every live channel and delivers to the
+    local subscribers.
+    """
+    prefix = 'photoshoot:live:'
+
+    def __init__(self, url=None):
+        import redis
+
+        super().__init__()
+        self.url = url or settings.LIVE_REDIS_URL
+        self._client = redis.Redis.from_url(self.url)
+        self._listener = None
+
+    def publish(self, channel, message):
+        self._client.publish(self.prefix + channel, json.dumps(message))
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        async with super().subscribe(channels) as subscription:
+            yield subscription
+
+    async def _listen(self):
+        import redis.asyncio
+
+        while True:
+            try:
+                async with redis.asyncio.Redis.from_url(self.url) as client, client.pubsub() as pubsub:
+                    await pubsub.psubscribe(self.prefix + '*')
+                    async for message in pubsub.listen():
+                        if message['type'] == 'pmessage':
+                            name = message['channel'].decode()[len(self.prefix):]
+                            self.deliver(name, json.loads(message['data']))
+            except (OSError, redis.RedisError):
+                logger.exception("Live updates lost their Redis subscription; retrying")
+                await asyncio.sleep(1)
+
+
+_broker = (None, None)
+
+
+def get_broker():
+    """
+    The process's LIVE_BROKER instance (one, so subscribers and publishers
+    in this process meet).
+    """
+    global _broker
+    if _broker[0] != settings.LIVE_BROKER:
+        _broker = (settings.LIVE_BROKER, import_string(settings.LIVE_BROKER)())
+    return _broker[1]
+
+
+# -----------------------------
+# Publishing
+# -----------------------------
+def _counts(post_id):
+    return Post.objects.filter(pk=post_id).values('like_count', 'comment_count').first()
+
+
+def _publish_comment(comment_id):
+    comment = Comment.objects.select_related('user__photographerprofile').filter(pk=comment_id).first()
+    counts = comment and _counts(comment.post_id)
+    if counts:
+        get_broker().publish(channel(comment.post_id), {
+            'event': 'comment',
+            'post': comment.post_id,
+            'comment': comment_json(comment),
+            'latest': encode_cursor(comment.created_at, comment.pk),
+            **counts,
+        })
+
+
+def _publish_counts(post_ids):
+    for row in Post.objects.filter(pk__in=post_ids).values('id', 'like_count', 'comment_count'):
+        post_id = row.pop('id')
+        get_broker().publish(channel(post_id), {'event': 'counts', 'post': post_id, **row})
+
+
+def comment_added(comment):
+    if not settings.LIVE_UPDATES:
+        return
+    transaction.on_commit(lambda: _publish_comment(comment.pk), robust=True)
+
+
+def counts_changed(post_ids):
+    if not settings.LIVE_UPDATES:
+        return
+    post_ids = list(post_ids)
+    transaction.on_commit(lambda: _publish_counts(post_ids), robust=True)
+
+
+# -----------------------------
+# Streaming
+# -----------------------------
+def parse_posts(params):
+    """
+    The post ids in `posts` ("1,2,3"). Raises ValueError if malformed or
+    more than LIVE_MAX_POSTS.
+    """
+    ids = {int(value) for value in params.get('posts', '').split(',') if value}
+    if not ids or len(ids) > settings.LIVE_MAX_POSTS:
+        raise ValueError(f"Pass 1 to {settings.LIVE_MAX_POSTS} post ids.")
+    return ids
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream(post_ids):
+    """
+    The SSE body for `post_ids`: events as they come, a comment line every
+    LIVE_HEARTBEAT_SECONDS to keep proxies from closing the connection,
+    ending after LIVE_STREAM_SECONDS (the browser reconnects by itself).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.LIVE_STREAM_SECONDS
+    yield f"retry: {settings.LIVE_RETRY_MS}\n\n"
+    async with get_broker().subscribe([channel(pk) for pk in post_ids]) as subscription:
+        while loop.time() < deadline and not subscription.overflowed:
+            message = await subscription.get(settings.LIVE_HEARTBEAT_SECONDS)
+            if message is None:
+                yield ": ping\n\n"
+            else:
+                yield _event(message['event'], message)
@@ -0,0 +1,211 @@
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from main.models import Post
+
+from .bench_views import percentile
+
+PROFILES = ('wsgi', 'asgi')
+SCENARIOS = ('get_comments', 'like_post', 'add_comment')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent throughput of the AJAX endpoints (get_comments, "
+        "like_post, add_comment) under the WSGI and ASGI gunicorn profiles. "
+        "Each profile is started on a local port against the current database "
+        "and driven at several concurrency levels; req/s and p50/p95 latency "
+        "are printed and saved as JSON. add_comment leaves its comments behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+        parser.add_argument('--only', nargs='+', choices=SCENARIOS, metavar='VIEW', help="Run just these endpoints.")
+        parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32, 64],
+                            help="Simultaneous connections to try, one run each.")
+        parser.add_argument('--requests', type=int, default=400, help="Requests per endpoint and concurrency level.")
+        parser.add_argument('--workers', type=int, default=2, help="gunicorn workers for both profiles.")
+        parser.add_argument('--threads', type=int, default=1, help="Threads per WSGI worker (gthread when > 1).")
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--output', help="Where to write the JSON (default bench/concurrency-<time>.json).")
+
+    def handle(self, *args, profiles, only, concurrency, requests, workers, threads, port, output, **options):
+        post = Post.objects.order_by('-comment_count', '-id').first()
+        viewer = User.objects.filter(is_active=True).order_by('id').first()
+        if not (post and viewer):
+            raise CommandError("Not enough data to benchmark; run `manage.py seed_data` first.")
+        self.headers = self._auth_headers(viewer)
+        self.post = post
+
+        results = {}
+        for profile in profiles:
+            results[profile] = {}
+            with self._server(profile, port, workers, threads):
+                for scenario in only or SCENARIOS:
+                    results[profile][scenario] = {}
+                    for level in concurrency:
+                        self._run(port, scenario, level, min(level, 10))  # warm up
+                        result = self._run(port, scenario, level, requests)
+                        results[profile][scenario][str(level)] = result
+                        self._print(profile, scenario, level, result)
+
+        run = {
+            'finished_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'workers': workers,
+            'wsgi_threads': threads,
+            'requests': requests,
+            'profiles': results,
+        }
+        output = output or os.path.join(
+            settings.BASE_DIR, 'bench', f"concurrency-{timezone.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(run, f, indent=2)
+        self.stdout.write(f"Saved {output}")
+
+    def _auth_headers(self, user):
+        # A real session row, so the server processes can see it, and a CSRF
+        # secret sent both as the cookie and the header.
+        client = Client()
+        client.force_login(user)
+        csrf = get_random_string(32)
+        return {
+            'Cookie': f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; "
+                      f"{settings.CSRF_COOKIE_NAME}={csrf}",
+            'X-CSRFToken': csrf,
+            'Referer': 'http://127.0.0.1/',
+        }
+
+    # ----- server -----
+
+    def _server(self, profile, port, workers, threads):
+        command = ['gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers)]
+        if profile == 'wsgi' and threads > 1:
+            command += ['--threads', str(threads)]
+        try:
+            process = subprocess.Popen(
+                command, cwd=settings.BASE_DIR, env={**os.environ, 'GUNICORN_PROFILE': profile, 'MEDIA_WORKER': '0', 'OUTBOX_WORKER': '0'},
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+        except OSError as exc:
+            raise CommandError(f"Could not start gunicorn: {exc}")
+        return _Running(process, port)
+
+    # ----- load -----
+
+    def _request(self, scenario, i):
+        if scenario == 'get_comments':
+            return 'GET', reverse('get_comments', args=[self.post.pk]), None
+        if scenario == 'like_post':
+            return 'POST', reverse('like_post'), {'post_id': self.post.pk}
+        return 'POST', reverse('add_comment'), {'post_id': self.post.pk, 'comment': f"Benchmark comment {i}"}
+
+    def _run(self, port, scenario, level, count):
+        remaining = iter(range(count))
+        lock = threading.Lock()
+        timings, statuses = [], {}
+
+        def client():
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            try:
+                while True:
+                    with lock:
+                        i = next(remaining, None)
+                    if i is None:
+                        return
+                    method, path, data = self._request(scenario, i)
+                    headers = dict(self.headers)
+                    body = None
+                    if data is not None:
+                        body = urlencode(data)
+                        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+                    t0 = time.perf_counter()
+                    try:
+                        conn.request(method, path, body, headers)
+                        response = conn.getresponse()
+                        response.read()
+                        status = str(response.status)
+                    except (OSError, http.client.HTTPException):
+                        conn.close()
+                        status = 'error'
+                    elapsed = (time.perf_counter() - t0) * 1000
+                    with lock:
+                        timings.append(elapsed)
+                        statuses[status] = statuses.get(status, 0) + 1
+            finally:
+                conn.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(level) as pool:
+            for future in [pool.submit(client) for _ in range(level)]:
+                future.result()
+        wall = time.perf_counter() - started
+
+        timings.sort()
+        return {
+            'status': statuses,
+            'requests_per_second': round(count / wall, 1),
+            'latency_ms': {
+                'p50': round(percentile(timings, 50), 3),
+                'p95': round(percentile(timings, 95), 3),
+                'mean': round(statistics.fmean(timings), 3),
+                'max': round(timings[-1], 3),
+            },
+        }
+
+    def _print(self, profile, scenario, level, result):
+        latency = result['latency_ms']
+        statuses = ' '.join(f"{code}x{n}" for code, n in sorted(result['status'].items()))
+        self.stdout.write(
+            f"{profile:>4} {scenario:>12} c={level:<3}: {result['requests_per_second']:8.1f} req/s  "
+            f"p50 {latency['p50']:8.2f} ms  p95 {latency['p95']:8.2f} ms  [{statuses}]"
+        )
+
+
+class _Running:
+    """
+    Context manager around a started gunicorn: waits for the port to accept
+    connections, and stops the server on exit.
+    """
+    def __init__(self, process, port, timeout=30):
+        self.process, self.port, self.timeout = process, port, timeout
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"gunicorn exited with status {self.process.returncode}.")
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise CommandError(f"gunicorn did not start listening on port {self.port}.")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
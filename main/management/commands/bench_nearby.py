@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main import geo
+from main.models import Location
+
+from .bench_views import percentile
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic locations and compare the geohash nearby lookup with "
+        "a scan over latitude/longitude. All seeded rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locations', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--scan-queries', type=int, default=5,
+                            help="The scan baseline is slow; run it fewer times.")
+        parser.add_argument('--radius', type=float, nargs='+', default=[1, 5, 25])
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._run(**opts)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _point(self, rng):
+        # Mostly clustered around a few cities, like real photo spots.
+        if rng.random() < 0.8:
+            lat, lng = rng.choice(self.centres)
+            return lat + rng.gauss(0, 0.3), lng + rng.gauss(0, 0.3)
+        return rng.uniform(-60, 70), rng.uniform(-180, 180)
+
+    def _run(self, locations, queries, scan_queries, radius, limit, seed, **options):
+        rng = random.Random(seed)
+        self.centres = [(rng.uniform(-40, 60), rng.uniform(-170, 170)) for _ in range(20)]
+
+        started = time.perf_counter()
+        batch = []
+        for i in range(locations):
+            lat, lng = self._point(rng)
+            lat, lng = round(max(-89.9, min(89.9, lat)), 6), round((lng + 180) % 360 - 180, 6)
+            batch.append(Location(name=f"bench spot {i}", latitude=lat, longitude=lng,
+                                  geohash=geo.encode(lat, lng)))
+            if len(batch) == 10000:
+                Location.objects.bulk_create(batch)
+                batch = []
+        Location.objects.bulk_create(batch)
+        self.stdout.write(f"Seeded {locations} locations in {time.perf_counter() - started:.1f}s")
+
+        for r in radius:
+            points = [self._point(rng) for _ in range(queries)]
+            self._report(f"geohash r={r:g}km", points, lambda lat, lng: geo.nearby(lat, lng, r, limit))
+            self._report(f"scan    r={r:g}km", points[:scan_queries], lambda lat, lng: self._scan(lat, lng, r, limit))
+
+    def _scan(self, lat, lng, radius_km, limit):
+        # The best the schema could do before: a bounding box on the
+        # unindexed coordinate columns, then exact distances.
+        dlat = radius_km / geo.KM_PER_DEGREE
+        rows = Location.objects.filter(
+            latitude__range=(lat - dlat, lat + dlat),
+        ).values_list('id', 'latitude', 'longitude')
+        found = sorted(
+            (d, pk) for pk, la, lo in rows.iterator(chunk_size=2000)
+            if (d := geo.distance_km(lat, lng, la, lo)) <= radius_km
+        )
+        return found[:limit]
+
+    def _report(self, name, points, run):
+        timings, found = [], 0
+        for lat, lng in points:
+            t0 = time.perf_counter()
+            found += len(run(lat, lng))
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        p95 = percentile(timings, 95)
+        self.stdout.write(
+            f"{name:>18}: median {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms   "
+            f"max {timings[-1]:8.2f} ms   avg hits {found / len(points):6.1f}"
+        )
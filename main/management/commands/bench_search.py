@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.models import Location, Post
+from main.search import IcontainsBackend, get_backend
+
+from .bench_views import percentile
+from .seed_data import CITIES, WORDS
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway dataset and compare the full-text search backend "
+        "against the old icontains scan. All seeded rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--locations', type=int, default=500)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=12)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._run(**opts)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _words(self, rng, n):
+        return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+    def _run(self, posts, locations, queries, page_size, seed, **options):
+        rng = random.Random(seed)
+        cities = list(CITIES)
+        user = User.objects.create(username=f"bench-search-{seed}")
+
+        started = time.perf_counter()
+        locs = Location.objects.bulk_create(
+            Location(name=self._words(rng, 2).title(), city=rng.choice(cities))
+            for _ in range(locations)
+        )
+        Post.objects.bulk_create(
+            (
+                Post(
+                    uploader=user,
+                    title=self._words(rng, 4).capitalize(),
+                    # one rare tag per post so selective queries exist too
+                    description=f"{self._words(rng, 30)} spot{rng.randrange(posts)}",
+                    location=rng.choice(locs),
+                )
+                for _ in range(posts)
+            ),
+            batch_size=1000,
+        )
+        backend = get_backend()
+        backend.rebuild()
+        self.stdout.write(f"Seeded {posts} posts / {locations} locations in {time.perf_counter() - started:.1f}s")
+
+        # Mix of broad terms, selective terms and misses.
+        mixes = {
+            "common": [rng.choice(WORDS + [c.lower() for c in cities]) for _ in range(queries)],
+            "rare": [f"spot{rng.randrange(posts)}" for _ in range(queries)],
+            "miss": [f"nowhere{i}" for i in range(queries)],
+        }
+        candidates = (("icontains", IcontainsBackend()), (type(backend).__name__, backend))
+        for mix, terms in mixes.items():
+            for name, candidate in candidates:
+                timings = []
+                for term in terms:
+                    t0 = time.perf_counter()
+                    candidate.search(term, 0, page_size)
+                    timings.append((time.perf_counter() - t0) * 1000)
+                timings.sort()
+                p95 = percentile(timings, 95)
+                self.stdout.write(
+                    f"{mix:>7} {name:>18}: median {statistics.median(timings):7.2f} ms   "
+                    f"p95 {p95:7.2f} ms   max {timings[-1]:7.2f} ms"
+                )
@@ -0,0 +1,180 @@
+import json
+import math
+import os
+import statistics
+import subprocess
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from main.models import Comment, Like, Location, PhotographerProfile, Post
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the key views through the test client against the current "
+        "database (see `manage.py seed_data`): p50/p95/p99 latency and query "
+        "counts per view, saved as JSON. Pass --compare to diff against an "
+        "earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Timed requests per view.")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per view first.")
+        parser.add_argument('--only', nargs='+', metavar='VIEW', help="Run just these scenarios.")
+        parser.add_argument('--output', help="Where to write the JSON (default bench/views-<time>.json).")
+        parser.add_argument('--compare', metavar='JSON', help="An earlier run to compare against.")
+
+    def handle(self, *args, requests, warmup, only, output, compare, **options):
+        scenarios = self._scenarios()
+        if only:
+            unknown = set(only) - {name for name, *_ in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+            scenarios = [s for s in scenarios if s[0] in only]
+
+        results = {}
+        for name, client, request in scenarios:
+            for i in range(warmup):
+                request(client, i)
+            results[name] = self._measure(client, request, requests)
+            self._print(name, results[name])
+
+        run = {
+            'finished_at': timezone.now().isoformat(),
+            'git_commit': self._git_commit(),
+            'database': connection.vendor,
+            'dataset': {
+                model.__name__: model.objects.count()
+                for model in (User, PhotographerProfile, Location, Post, Like, Comment)
+            },
+            'requests': requests,
+            'warmup': warmup,
+            'views': results,
+        }
+        output = output or os.path.join(
+            settings.BASE_DIR, 'bench', f"views-{timezone.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(run, f, indent=2)
+        self.stdout.write(f"Saved {output}")
+
+        if compare:
+            with open(compare) as f:
+                self._compare(json.load(f), run)
+
+    # ----- scenarios -----
+
+    def _scenarios(self):
+        post = Post.objects.order_by('-like_count', '-id').first()
+        profile = PhotographerProfile.objects.select_related('user').order_by('-id').first()
+        location = Location.objects.exclude(latitude=None).exclude(longitude=None).first()
+        viewer = User.objects.filter(photographerprofile=None, is_staff=False).order_by('id').first()
+        if not (post and profile and location and viewer):
+            raise CommandError("Not enough data to benchmark; run `manage.py seed_data` first.")
+
+        anon, member = Client(), Client()
+        member.force_login(viewer)
+        ids = ','.join(str(pk) for pk in Post.objects.order_by('-created_at').values_list('id', flat=True)[:12])
+        cursor = member.get(reverse('explore_page')).json()['next_cursor'] or ''
+        lat, lng = float(location.latitude), float(location.longitude)
+        prefix = location.name.split()[0][:3]
+
+        def get(path, **params):
+            return lambda client, i: client.get(path, params)
+
+        def toggle_like(client, i):
+            ops = [{'post_id': post.pk, 'action': 'like' if i % 2 == 0 else 'unlike'}]
+            return client.post(reverse('post_engagement'), json.dumps({'ops': ops}), content_type='application/json')
+
+        return [
+            ('explore (anonymous)', anon, get(reverse('explore'))),
+            ('explore', member, get(reverse('explore'))),
+            ('explore_page', member, get(reverse('explore_page'), cursor=cursor)),
+            ('explore search', member, get(reverse('explore'), q=prefix)),
+            ('post_detail', member, get(reverse('post_detail', args=[post.pk]))),
+            ('profile (anonymous)', anon, get(reverse('profile', args=[profile.user.username]))),
+            ('profile', member, get(reverse('profile', args=[profile.user.username]))),
+            ('get_comments', member, get(reverse('get_comments', args=[post.pk]))),
+            ('post_engagement GET', member, get(reverse('post_engagement'), ids=ids)),
+            ('post_engagement POST', member, toggle_like),
+            ('nearby_spots', anon, get(reverse('nearby_spots'), lat=lat, lng=lng, radius_km=5)),
+            ('map_clusters', anon, get(reverse('map_clusters'), bbox=f'{lng - 1},{lat - 1},{lng + 1},{lat + 1}', zoom=9)),
+            ('location_autocomplete', member, get(reverse('location_autocomplete'), q=prefix)),
+        ]
+
+    # ----- measuring -----
+
+    def _measure(self, client, request, count):
+        timings, queries, statuses, cache = [], [], Counter(), Counter()
+        for i in range(count):
+            with CaptureQueriesContext(connection) as captured:
+                t0 = time.perf_counter()
+                response = request(client, i)
+                timings.append((time.perf_counter() - t0) * 1000)
+            queries.append(len(captured))
+            statuses[str(response.status_code)] += 1
+            if response.has_header('X-Cache'):
+                cache[response['X-Cache']] += 1
+        timings.sort()
+        queries.sort()
+        return {
+            'status': dict(statuses),
+            'page_cache': dict(cache),
+            'latency_ms': {
+                'p50': round(percentile(timings, 50), 3),
+                'p95': round(percentile(timings, 95), 3),
+                'p99': round(percentile(timings, 99), 3),
+                'mean': round(statistics.fmean(timings), 3),
+                'max': round(timings[-1], 3),
+            },
+            'queries': {'p50': percentile(queries, 50), 'max': queries[-1], 'mean': round(statistics.fmean(queries), 2)},
+        }
+
+    def _print(self, name, result):
+        latency, queries = result['latency_ms'], result['queries']
+        statuses = ' '.join(f"{code}x{n}" for code, n in sorted(result['status'].items()))
+        self.stdout.write(
+            f"{name:>22}: p50 {latency['p50']:8.2f} ms  p95 {latency['p95']:8.2f} ms  p99 {latency['p99']:8.2f} ms  "
+            f"queries {queries['p50']:3d} (max {queries['max']:3d})  [{statuses}]"
+        )
+
+    def _compare(self, before, after):
+        self.stdout.write(f"\nCompared with {before.get('git_commit') or 'unknown commit'} ({before.get('finished_at')}):")
+        for name, now in after['views'].items():
+            then = before['views'].get(name)
+            if not then:
+                self.stdout.write(f"{name:>22}: new")
+                continue
+            changes = []
+            for pct in ('p50', 'p95', 'p99'):
+                old, new = then['latency_ms'][pct], now['latency_ms'][pct]
+                changes.append(f"{pct} {(new - old) / old * 100 if old else 0:+6.1f}%")
+            queries = now['queries']['p50'] - then['queries']['p50']
+            self.stdout.write(f"{name:>22}: {'  '.join(changes)}  queries {queries:+d}")
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
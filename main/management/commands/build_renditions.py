@@ -0,0 +1,66 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from main import renditions
+from main.models import PhotographerProfile, Post
+
+TARGETS = (
+    (Post, 'image'),
+    (PhotographerProfile, 'profile_pic'),
+)
+
+
+def _render(name, widths):
+    # Runs in a worker process; storage only, no database access.
+    return renditions.render(name, widths)
+
+
+class Command(BaseCommand):
+    help = "Build missing or stale image renditions for existing posts and profile pictures."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--force', action='store_true', help="Rebuild even if renditions look current.")
+
+    def handle(self, *args, workers, force, **options):
+        # One job per stored file: rows sharing a blob share its renditions.
+        jobs = defaultdict(list)
+        for model, field_name in TARGETS:
+            attr = renditions.metadata_attr(field_name)
+            rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for obj in rows.only('pk', field_name, attr).iterator():
+                fieldfile = getattr(obj, field_name)
+                if force or not renditions.is_current(fieldfile):
+                    jobs[(field_name, fieldfile.name)].append((model, obj.pk))
+
+        self.stdout.write(f"{len(jobs)} images to process with {workers} workers")
+        started = time.perf_counter()
+        done = failed = 0
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_render, name, renditions.widths_for(field_name)): (field_name, name)
+                for field_name, name in jobs
+            }
+            for future in as_completed(futures):
+                field_name, name = futures[future]
+                try:
+                    meta = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"  {name}: {exc}")
+                    continue
+                # Only the parent process writes to the database.
+                for model, pk in jobs[(field_name, name)]:
+                    renditions.save(model, pk, field_name, meta)
+                done += 1
+
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Built renditions for {done} images ({failed} failed) in {elapsed:.1f}s, {rate:.1f} images/s"
+        ))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.models import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = "Delete resumable uploads that have been idle longer than CHUNKED_UPLOAD_EXPIRY_HOURS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+
+    def handle(self, *args, hours, **options):
+        cutoff = timezone.now() - timedelta(hours=hours)
+        stale = ChunkedUpload.objects.filter(updated_at__lt=cutoff)
+        count = 0
+        for upload in stale.iterator():
+            # Finalized uploads no longer own a file; discard() tolerates that.
+            upload.discard()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Removed {count} stale uploads."))
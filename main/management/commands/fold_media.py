@@ -0,0 +1,98 @@
+import os
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from main import renditions
+from main.models import Blob, PhotographerProfile, Post
+from main.storage import blob_name, file_digest, get_storage, is_blob
+
+FIELDS = (
+    (Post, 'image'),
+    (Post, 'video'),
+    (PhotographerProfile, 'profile_pic'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move existing media into content-addressed storage, folding byte-identical "
+        "files into one blob, then recount blob references and drop unreferenced blobs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be folded without changing anything.")
+        parser.add_argument('--keep-originals', action='store_true', help="Don't delete the old files after moving.")
+
+    def handle(self, *args, dry_run, keep_originals, **options):
+        storage = get_storage()
+        moved = {}   # old name -> blob name
+        targets = set()
+        before = after = 0
+
+        for model, field in FIELDS:
+            rows = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            for pk, name in rows.values_list('pk', field).iterator():
+                if is_blob(name):
+                    continue
+                if name not in moved:
+                    if not storage.exists(name):
+                        self.stderr.write(f"  missing: {name}")
+                        continue
+                    before += storage.size(name)
+                    with storage.open(name, 'rb') as fh:
+                        fh.sha256 = file_digest(fh)
+                        target = blob_name(fh.sha256, os.path.splitext(name)[1])
+                        if target not in targets and not storage.exists(target):
+                            after += storage.size(name)
+                            if not dry_run:
+                                storage.save(name, fh)
+                    moved[name] = target
+                    targets.add(target)
+                if not dry_run:
+                    self._repoint(model, pk, field, name, moved[name])
+
+        folded = len(moved) - len(targets)
+        self.stdout.write(
+            f"{len(moved)} files -> {len(targets)} blobs ({folded} duplicates folded), "
+            f"{filesizeformat(before)} -> {filesizeformat(after)} new blob data"
+        )
+        if dry_run:
+            return
+
+        self._recount()
+        if not keep_originals:
+            for name in moved:
+                storage.delete(name)
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _repoint(self, model, pk, field, old, new):
+        updates = {field: new, 'updated_at': timezone.now()}
+        attr = renditions.metadata_attr(field)
+        if hasattr(model, attr):
+            meta = model.objects.filter(pk=pk).values_list(attr, flat=True).first() or {}
+            if meta.get('source') == old:
+                # Same bytes, so the renditions are still valid for the blob.
+                updates[attr] = dict(meta, source=new)
+        model.objects.filter(pk=pk).update(**updates)
+
+    @transaction.atomic
+    def _recount(self):
+        storage = get_storage()
+        refs = Counter()
+        for model, field in FIELDS:
+            refs.update(
+                name for name in model.objects.values_list(field, flat=True) if is_blob(name)
+            )
+
+        for name, count in refs.items():
+            Blob.objects.update_or_create(
+                name=name, defaults={'refcount': count, 'size': storage.size(name)}
+            )
+        for blob in Blob.objects.exclude(name__in=list(refs)):
+            blob.delete()
+            storage.delete(blob.name)
+            renditions.delete(blob.name)
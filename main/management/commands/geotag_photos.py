@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import geotag
+from main.models import GeotagJob, Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Read EXIF GPS from queued post images and use it to fill in locations "
+        "(see main/geotag.py). `manage.py media_worker` drains the queue as it "
+        "goes; run this with --backfill to queue older posts, on the machine "
+        "that holds MEDIA_ROOT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', type=int, metavar='SECONDS', default=0,
+                            help="Keep running, polling every SECONDS when the queue is empty.")
+        parser.add_argument('--backfill', action='store_true',
+                            help="First queue every post with an image and no recorded photo position.")
+
+    def handle(self, *args, batch_size, loop, backfill, **options):
+        if backfill:
+            posts = Post.objects.exclude(image='').exclude(image=None).filter(photo_latitude=None, geotag_job=None)
+            geotag.enqueue(posts.only('pk').iterator(chunk_size=2000))
+            self.stdout.write(f"Queued; {GeotagJob.objects.count()} posts waiting.")
+        while True:
+            outcomes = geotag.run_batch(batch_size=batch_size)
+            if outcomes:
+                self.stdout.write("Geotag: " + ", ".join(f"{n} {name}" for name, n in sorted(outcomes.items())))
+            if sum(outcomes.values()) == batch_size:
+                # Full batch: there may be more waiting.
+                continue
+            if not loop:
+                break
+            time.sleep(loop)
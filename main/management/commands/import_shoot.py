@@ -0,0 +1,246 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+
+from main import clusters, exif, geo, pagecache, renditions
+from main.models import Blob, Location, Post
+from main.search import get_backend
+from main.storage import file_digest, get_storage
+from main.uploads import DEFAULT_MAX_SIZES, SNIFF_BYTES, family, sniff
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.heic', '.heif', '.avif'}
+
+
+def _inspect(path, max_size):
+    """
+    Validate, hash, read the metadata of and store one image. Runs in a
+    worker process: files and storage only, no database access.
+    """
+    try:
+        size = os.path.getsize(path)
+        if size > max_size:
+            return {'path': path, 'error': f"too large ({filesizeformat(size)}, limit {filesizeformat(max_size)})"}
+        with open(path, 'rb') as fh:
+            mime = sniff(fh.read(SNIFF_BYTES))
+            if family(mime) != 'image':
+                return {'path': path, 'error': f"not an image ({mime})"}
+            fh.seek(0)
+            meta = exif.read(fh)
+            content = File(fh, name=os.path.basename(path))
+            content.sha256 = file_digest(content)
+            # Content-addressed: storing a file that is already there is a no-op.
+            name = get_storage().save(f'posts/{content.name}', content)
+    except Exception as exc:
+        # Decoders raise all sorts on malformed files; one must not stop the import.
+        return {'path': path, 'error': str(exc) or type(exc).__name__}
+    return {'path': path, 'name': name, 'size': size, **meta}
+
+
+def _render(name, widths):
+    # Runs in a worker process; storage only, no database access.
+    return renditions.render(name, widths)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a directory of photos from one shoot as posts by one user. "
+        "Images are validated, hashed, measured and stored in parallel worker "
+        "processes; posts (and locations, from EXIF GPS) are then created in "
+        "batches. Re-running on the same directory skips photos already "
+        "imported, so an interrupted import can simply be started again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--user', required=True, help="Username the posts are uploaded as.")
+        parser.add_argument('--title', help="Title for every post (default: the directory name).")
+        parser.add_argument('--description', default='')
+        parser.add_argument('--location-name', help="Name for new locations (default: the title).")
+        parser.add_argument('--snap-km', type=float, default=0.25,
+                            help="Use an existing location this close to a photo's GPS position.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--no-renditions', action='store_true',
+                            help="Leave resized copies to `manage.py build_renditions`.")
+
+    def handle(self, *args, directory, user, title, description, location_name, snap_km, workers,
+               batch_size, no_renditions, **options):
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory.")
+        try:
+            self.user = User.objects.get(username=user)
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {user}.")
+        self.title = title or os.path.basename(os.path.abspath(directory))
+        self.description = description
+        self.location_name = location_name or self.title
+        self.snap_km = snap_km
+        self.new_locations = []   # (latitude, longitude, pk) created by this run
+        self.seen = set()
+        self.stats = Counter()
+
+        paths = self._walk(directory)
+        max_size = getattr(settings, 'UPLOAD_MAX_SIZES', DEFAULT_MAX_SIZES)['image']
+        self.stdout.write(f"{len(paths)} images in {directory}, {workers} workers")
+        started = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            batch, jobs = [], []
+            for result in pool.map(_inspect, paths, repeat(max_size), chunksize=4):
+                if 'error' in result:
+                    self.stats['invalid'] += 1
+                    self.stderr.write(f"  {result['path']}: {result['error']}")
+                    continue
+                self.stats['bytes'] += result['size']
+                batch.append(result)
+                if len(batch) >= batch_size:
+                    jobs += self._import(batch, pool, no_renditions, started)
+                    batch = []
+            if batch:
+                jobs += self._import(batch, pool, no_renditions, started)
+            imported = time.perf_counter()
+
+            for future, name, pks in jobs:
+                try:
+                    meta = future.result()
+                except Exception as exc:
+                    self.stderr.write(f"  renditions for {name}: {exc}")
+                    continue
+                # Only the parent process writes to the database.
+                for pk in pks:
+                    renditions.save(Post, pk, 'image', meta)
+                self.stats['rendered'] += 1
+
+        pagecache.invalidate(pagecache.FEED, pagecache.profile_scope(self.user.pk))
+        self._report(len(paths), imported - started, time.perf_counter() - imported)
+
+    def _walk(self, directory):
+        paths = []
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            paths += [
+                os.path.join(root, name) for name in sorted(files)
+                if not name.startswith('.') and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+            ]
+        return paths
+
+    # ----- importing -----
+
+    def _import(self, batch, pool, no_renditions, started):
+        """
+        Create the posts for one batch of inspected images in one
+        transaction, and queue their renditions. Returns the rendition jobs.
+        """
+        names = [result['name'] for result in batch]
+        done = set(Post.objects.filter(uploader=self.user, image__in=names).values_list('image', flat=True))
+        fresh = []
+        for result in batch:
+            if result['name'] in self.seen:
+                self.stats['duplicates'] += 1
+            elif result['name'] in done:
+                self.stats['skipped'] += 1
+            else:
+                fresh.append(result)
+            self.seen.add(result['name'])
+
+        with transaction.atomic():
+            location_ids = self._locations(fresh)
+            posts = Post.objects.bulk_create([
+                Post(uploader=self.user, title=self.title, description=self.description,
+                     location_id=location_id, image=result['name'],
+                     photo_latitude=result['latitude'], photo_longitude=result['longitude'])
+                for result, location_id in zip(fresh, location_ids)
+            ])
+            # bulk_create sends no signals: do what the post_save handlers would.
+            Blob.acquire_many(post.image.name for post in posts)
+            get_backend().index([post.pk for post in posts])
+            clusters.touch_locations(set(location_ids))
+        self.stats['imported'] += len(posts)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"  {self.stats['imported']} imported, {self.stats['skipped']} already there "
+            f"({sum(self.stats[k] for k in ('imported', 'skipped', 'duplicates', 'invalid')) / elapsed:.1f} images/s)"
+        )
+        if no_renditions:
+            return []
+        return self._queue_renditions(pool, names)
+
+    def _locations(self, results):
+        """
+        A location id (or None) per result: the nearest location within
+        snap_km of the photo's GPS position, else a new one. New locations
+        are bulk created.
+        """
+        ids, pending = [], []   # pending: [latitude, longitude, Location]
+        for result in results:
+            lat, lng = result['latitude'], result['longitude']
+            if lat is None:
+                ids.append(None)
+                continue
+            match = self._nearest_new(lat, lng, pending) or self._nearest_existing(lat, lng)
+            if match is None:
+                match = Location(
+                    name=self._new_location_name(len(pending)), latitude=lat, longitude=lng,
+                    geohash=geo.encode(lat, lng),
+                )
+                pending.append((lat, lng, match))
+            ids.append(match)
+
+        created = Location.objects.bulk_create([location for _, _, location in pending])
+        self.new_locations += [(lat, lng, location.pk) for (lat, lng, _), location in zip(pending, created)]
+        self.stats['new_locations'] += len(created)
+        self.stats['located'] += sum(1 for match in ids if match is not None)
+        return [match.pk if isinstance(match, Location) else match for match in ids]
+
+    def _nearest_new(self, lat, lng, pending):
+        candidates = [(geo.distance_km(lat, lng, la, ln), location) for la, ln, location in pending]
+        candidates += [(geo.distance_km(lat, lng, la, ln), pk) for la, ln, pk in self.new_locations]
+        candidates = [c for c in candidates if c[0] <= self.snap_km]
+        return min(candidates, key=lambda c: c[0])[1] if candidates else None
+
+    def _nearest_existing(self, lat, lng):
+        found = geo.nearby(lat, lng, self.snap_km, 1)
+        return found[0][1].pk if found else None
+
+    def _new_location_name(self, pending):
+        n = len(self.new_locations) + pending + 1
+        return self.location_name if n == 1 else f"{self.location_name} {n}"
+
+    def _queue_renditions(self, pool, names):
+        by_name = {}
+        rows = Post.objects.filter(uploader=self.user, image__in=names, image_renditions={})
+        for pk, name in rows.values_list('pk', 'image'):
+            by_name.setdefault(name, []).append(pk)
+        jobs = []
+        for name, pks in by_name.items():
+            meta = renditions.reusable(Post, 'image', name)
+            if meta:
+                for pk in pks:
+                    renditions.save(Post, pk, 'image', meta)
+                continue
+            jobs.append((pool.submit(_render, name, renditions.widths_for('image')), name, pks))
+        return jobs
+
+    def _report(self, total, import_seconds, render_seconds):
+        s = self.stats
+        self.stdout.write(
+            f"{s['imported']} posts created, {s['skipped']} already imported, {s['duplicates']} duplicates, "
+            f"{s['invalid']} invalid; {s['located']} placed by GPS ({s['new_locations']} new locations)"
+        )
+        if s['rendered']:
+            self.stdout.write(f"Renditions for {s['rendered']} images finished {render_seconds:.1f}s after the last post")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {total} images, {filesizeformat(s['bytes'])} in {import_seconds:.1f}s: "
+            f"{total / import_seconds if import_seconds else 0:.1f} images/s, "
+            f"{s['bytes'] / import_seconds / 1024 / 1024 if import_seconds else 0:.1f} MB/s"
+        ))
@@ -0,0 +1,55 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from main import geotag, renditions
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Build queued image renditions (see main/renditions.py) and read queued "
+        "photos' GPS (main/geotag.py). Needs the media files and the web "
+        "process's cache, so it runs next to the web process: gunicorn.conf.py "
+        "starts one with --loop. Run it by hand (or from cron) when serving "
+        "with runserver."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--geotag-batch-size', type=int, default=50)
+        parser.add_argument('--loop', type=int, metavar='SECONDS', default=0,
+                            help="Keep running, polling every SECONDS when the queues are empty.")
+
+    def handle(self, *args, batch_size, geotag_batch_size, loop, **options):
+        queues = [
+            ("Renditions", renditions.run_batch, batch_size),
+            ("Geotag", geotag.run_batch, geotag_batch_size),
+        ]
+        while True:
+            try:
+                more = [self.run(*queue) for queue in queues]
+            except DatabaseError:
+                if not loop:
+                    raise
+                # A database restart must not take the worker down with it.
+                logger.exception("media_worker batch failed")
+                time.sleep(loop)
+                continue
+            if any(more):
+                continue
+            if not loop:
+                break
+            time.sleep(loop)
+
+    def run(self, label, run_batch, batch_size):
+        """
+        Run one batch; True if it was full and there may be more waiting.
+        """
+        outcomes = run_batch(batch_size=batch_size)
+        if outcomes:
+            self.stdout.write(f"{label}: " + ", ".join(f"{n} {name}" for name, n in sorted(outcomes.items())))
+        return sum(outcomes.values()) == batch_size
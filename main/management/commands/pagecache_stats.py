@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from main import pagecache
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the anonymous page cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after printing them.")
+
+    def handle(self, *args, reset, **options):
+        stats = pagecache.stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0
+        self.stdout.write(f"hits: {stats['hits']}  misses: {stats['misses']}  hit ratio: {ratio:.1%}")
+        if reset:
+            pagecache.reset_stats()
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from main.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for every post."
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt ({type(backend).__name__})."))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import pagecache, trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold new likes and comments into the trending table. "
+        "Run periodically (e.g. every few minutes from cron), or with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--loop', type=int, metavar='SECONDS', default=0,
+                            help="Keep running, refreshing every SECONDS.")
+
+    def handle(self, *args, batch_size, loop, **options):
+        while True:
+            changed = trending.refresh(batch_size=batch_size)
+            if changed:
+                pagecache.invalidate(pagecache.FEED)
+            self.stdout.write(f"Trending refreshed: {changed} posts updated.")
+            if not loop:
+                break
+            time.sleep(loop)
@@ -0,0 +1,189 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from main import geo, pagecache, trending
+from main.models import Comment, Like, Location, PhotographerProfile, Post
+from main.search import get_backend
+
+WORDS = (
+    "sunset beach temple fort lake hills waterfall market street bridge garden "
+    "palace river forest desert harbour lighthouse valley island canyon rooftop "
+    "wedding portrait monsoon festival night golden hour skyline village tea "
+    "heritage mural cafe station museum sunrise mist snow meadow cliff"
+).split()
+CITIES = {
+    "Hyderabad": (17.385, 78.487), "Mumbai": (19.076, 72.878), "Goa": (15.300, 74.124),
+    "Jaipur": (26.912, 75.787), "Chennai": (13.083, 80.270), "Delhi": (28.704, 77.103),
+    "Kochi": (9.931, 76.267), "Pune": (18.520, 73.857), "Udaipur": (24.585, 73.713), "Shimla": (31.105, 77.173),
+}
+COMMENTS = ["Stunning!", "What lens did you use?", "Love the light here.", "Adding this to my list.",
+            "Beautiful colours.", "Was it crowded?", "Great composition.", "Best time to visit?"]
+
+
+@contextmanager
+def backdated(model, *fields):
+    """
+    Let bulk_create keep the created_at values we generate.
+    """
+    fields = [model._meta.get_field(name) for name in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def zipf_weights(n, exponent):
+    """
+    Cumulative weights for picking rank r with probability ~ 1 / r**exponent.
+    """
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset for local load testing: users, photographer "
+        "profiles, locations, posts, likes and comments, with power-law "
+        "engagement (a few popular photographers, spots and posts get most "
+        "of the activity). Rows are bulk inserted and kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--profiles', type=int, default=500,
+                            help="How many of the users are photographers (they upload all the posts).")
+        parser.add_argument('--locations', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--likes', type=int, default=200000,
+                            help="Likes to draw; repeats of a user/post pair are dropped, so fewer are stored.")
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--days', type=int, default=90, help="Spread activity over this many past days.")
+        parser.add_argument('--exponent', type=float, default=1.1, help="Zipf exponent of the engagement skew.")
+        parser.add_argument('--prefix', default='seed', help="Username prefix; must not be in use yet.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **opts):
+        if opts['profiles'] > opts['users']:
+            raise CommandError("--profiles cannot exceed --users.")
+        if User.objects.filter(username__startswith=f"{opts['prefix']}-").exists():
+            raise CommandError(f"Users named {opts['prefix']}-* already exist; pick another --prefix.")
+        self.rng = random.Random(opts['seed'])
+        self.now = timezone.now()
+        self.batch_size = opts['batch_size']
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            users = self._step("users", self._users, opts['prefix'], opts['users'])
+            profiles = self._step("profiles", self._profiles, users[:opts['profiles']])
+            locations = self._step("locations", self._locations, opts['locations'])
+            # Engagement is decided before anything is inserted, so posts go
+            # in with their final like_count/comment_count.
+            posts = self._posts(profiles, locations, opts['posts'], opts['days'], opts['exponent'])
+            likes = self._likes(users, posts, opts['likes'], opts['exponent'])
+            comments = self._comments(users, posts, opts['comments'], opts['exponent'])
+            self._step("posts", self._insert, Post, posts)
+            self._step("likes", self._insert, Like, likes)
+            self._step("comments", self._insert, Comment, comments)
+            # Bulk inserts send no signals.
+            pagecache.invalidate(pagecache.FEED)
+
+        self._step("search index", lambda: get_backend().rebuild())
+        self._step("trending scores", trending.refresh)
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {time.perf_counter() - started:.1f}s"))
+
+    def _step(self, name, fn, *args):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        count = f"{len(result)} " if isinstance(result, list) else ""
+        self.stdout.write(f"  {count}{name} in {time.perf_counter() - t0:.1f}s")
+        return result
+
+    def _words(self, n):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(n))
+
+    def _ago(self, days):
+        return self.now - timedelta(seconds=self.rng.uniform(0, days * 86400))
+
+    def _users(self, prefix, count):
+        # Hashing is deliberately slow; every seeded user shares one hash.
+        password = make_password('photospot')
+        User.objects.bulk_create(
+            (User(username=f"{prefix}-{i}", email=f"{prefix}-{i}@example.com", password=password)
+             for i in range(count)),
+            batch_size=self.batch_size,
+        )
+        return list(User.objects.filter(username__startswith=f"{prefix}-").order_by('id'))
+
+    def _profiles(self, users):
+        return PhotographerProfile.objects.bulk_create(
+            (PhotographerProfile(user=user, bio=self._words(12).capitalize(), contact=f"+91 9{i:09d}")
+             for i, user in enumerate(users)),
+            batch_size=self.batch_size,
+        )
+
+    def _locations(self, count):
+        cities = list(CITIES.items())
+        rows = []
+        for _ in range(count):
+            city, (lat, lng) = self.rng.choice(cities)
+            lat, lng = round(lat + self.rng.gauss(0, 0.15), 6), round(lng + self.rng.gauss(0, 0.15), 6)
+            rows.append(Location(name=self._words(2).title(), city=city, latitude=lat, longitude=lng,
+                                 geohash=geo.encode(lat, lng)))
+        return Location.objects.bulk_create(rows, batch_size=self.batch_size)
+
+    def _insert(self, model, rows):
+        with backdated(model, 'created_at'):
+            return model.objects.bulk_create(rows, batch_size=self.batch_size)
+
+    def _posts(self, profiles, locations, count, days, exponent):
+        uploaders = [profile.user for profile in profiles]
+        uploader_weights = zipf_weights(len(uploaders), exponent)
+        location_weights = zipf_weights(len(locations), exponent)
+        return [
+            Post(
+                uploader=self.rng.choices(uploaders, cum_weights=uploader_weights)[0],
+                location=self.rng.choices(locations, cum_weights=location_weights)[0],
+                title=self._words(4).capitalize(),
+                description=self._words(25),
+                created_at=self._ago(days),
+            )
+            for _ in range(count)
+        ]
+
+    def _engagement_targets(self, posts, count, exponent):
+        # Popularity is independent of age: shuffle before ranking.
+        ranked = self.rng.sample(posts, len(posts))
+        return self.rng.choices(ranked, cum_weights=zipf_weights(len(ranked), exponent), k=count)
+
+    def _after(self, created_at):
+        return created_at + (self.now - created_at) * self.rng.random()
+
+    def _likes(self, users, posts, count, exponent):
+        likes = {}
+        for post in self._engagement_targets(posts, count, exponent):
+            user = self.rng.choice(users)
+            # One like per user and post; repeats are dropped.
+            if (user.pk, id(post)) not in likes:
+                likes[user.pk, id(post)] = Like(user=user, post=post, created_at=self._after(post.created_at))
+                post.like_count += 1
+        return list(likes.values())
+
+    def _comments(self, users, posts, count, exponent):
+        comments = []
+        for post in self._engagement_targets(posts, count, exponent):
+            comments.append(Comment(user=self.rng.choice(users), post=post, text=self.rng.choice(COMMENTS),
+                                    created_at=self._after(post.created_at)))
+            post.comment_count += 1
+        return comments
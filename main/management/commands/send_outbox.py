@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued emails from the outbox in batches over one SMTP connection. "
+        "gunicorn.conf.py starts one with --loop; run it by hand (or from cron) "
+        "when serving with runserver."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', type=int, metavar='SECONDS', default=0,
+                            help="Keep running, polling every SECONDS when the outbox is empty.")
+
+    def handle(self, *args, batch_size, loop, **options):
+        while True:
+            sent, retried, dead = outbox.send_batch(batch_size=batch_size)
+            if sent or retried or dead:
+                self.stdout.write(f"Outbox: {sent} sent, {retried} to retry, {dead} dead.")
+            if sent + retried + dead == batch_size:
+                # Full batch: there may be more waiting.
+                continue
+            if not loop:
+                break
+            time.sleep(loop)
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from main.models import Post, Like, Comment
+
+
+def _counted(model):
+    rows = model.objects.filter(post=OuterRef('pk')).values('post').annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(rows), 0)
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.like_count / Post.comment_count from Like and Comment rows and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        fixed = checked = 0
+        last_id = 0
+
+        # Walk the table in primary-key batches so no single statement holds
+        # locks on the whole Post table.
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    Post.objects
+                    .filter(id__gt=last_id)
+                    .order_by('id')
+                    .annotate(real_likes=_counted(Like), real_comments=_counted(Comment))
+                    .only('id', 'like_count', 'comment_count')[:batch_size]
+                )
+                if not batch:
+                    break
+
+                drifted = [
+                    post.id for post in batch
+                    if post.like_count != post.real_likes or post.comment_count != post.real_comments
+                ]
+
+                # Recount inside the UPDATE itself rather than writing the values
+                # read above, so likes landing in between are not lost.
+                if drifted and not dry_run:
+                    Post.objects.filter(id__in=drifted).update(
+                        like_count=_counted(Like), comment_count=_counted(Comment), updated_at=timezone.now(),
+                    )
+
+            checked += len(batch)
+            fixed += len(drifted)
+            last_id = batch[-1].id
+
+        verb = "would fix" if dry_run else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} posts, {verb} {fixed}."))
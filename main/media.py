@@ -0,0 +1,164 @@
+"""
+Media file serving for production.
+
+Replaces django.views.static.serve (DEBUG only) with a view that handles
+what browsers and proxies need for photos and videos:
+
+- single byte ranges (206 / 416) so <video> can seek,
+- strong ETags plus If-None-Match / If-Modified-Since / If-Range,
+- `immutable` year-long caching for content-addressed blobs,
+- zero-copy delivery: either hand the file to the front-end server with
+  X-Accel-Redirect / X-Sendfile (settings.MEDIA_SENDFILE_HEADER), or return a
+  FileResponse so gunicorn can use sendfile(2) via wsgi.file_wrapper.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .storage import is_blob
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def is_immutable(name):
+    """
+    Blobs are named by their content hash and their renditions by the blob's,
+    so neither can ever change under the same URL.
+    """
+    if name.startswith('renditions/'):
+        name = name[len('renditions/'):]
+    return is_blob(name)
+
+
+class RangeFile:
+    """
+    Read-only view of `length` bytes of an open file starting at `start`.
+    Keeps fileno() so wsgi.file_wrapper can still sendfile() the range
+    (gunicorn limits it to Content-Length).
+    """
+    def __init__(self, fh, start, length):
+        fh.seek(start)
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fh.fileno()
+
+    def close(self):
+        self.fh.close()
+
+
+def _etag(name, stat):
+    if is_blob(name):
+        # blobs/aa/bb/<sha256>.ext: the name is the content hash
+        return '"%s"' % os.path.splitext(os.path.basename(name))[0]
+    return '"%x-%x"' % (stat.st_size, stat.st_mtime_ns)
+
+
+def _parse_range(header, size):
+    """
+    (start, end) inclusive for a single satisfiable range, None to ignore the
+    header, or False if it cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or size == 0:
+        return False
+    return start, end
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(mtime) <= since
+
+
+@require_safe
+def serve(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    size = stat.st_size
+    etag = _etag(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': IMMUTABLE if is_immutable(path) else 'public, max-age=%d' % settings.MEDIA_CACHE_MAX_AGE,
+    }
+
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    sendfile_header = getattr(settings, 'MEDIA_SENDFILE_HEADER', None)
+    if sendfile_header:
+        # The front-end server streams the file (and handles Range) itself.
+        response = HttpResponse(content_type=content_type)
+        target = full_path if sendfile_header == 'X-Sendfile' else settings.MEDIA_ACCEL_PREFIX + path
+        response[sendfile_header] = target
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range.strip() in (etag, headers['Last-Modified'])):
+        byte_range = _parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % size
+        return response
+
+    fh = open(full_path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(RangeFile(fh, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(fh, content_type=content_type)
+        response['Content-Length'] = str(size)
+
+    for name, value in headers.items():
+        response[name] = value
+    return response
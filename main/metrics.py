@@ -0,0 +1,156 @@
+"""
+Request metrics in Prometheus format.
+
+MetricsMiddleware records, per route (the URL name, e.g. 'explore' or
+'post_create'): latency, response status, response size, the number of DB
+queries and the time spent in them, and bytes uploaded (multipart posts and
+resumable upload chunks). outbox.send_batch() records SMTP send time: it
+runs in `manage.py send_outbox --loop`, which gunicorn.conf.py starts beside
+the workers so its samples land with theirs (a cron job's would not).
+
+Under gunicorn every worker is its own process, so metrics are kept with
+prometheus_client's multiprocess mode: gunicorn.conf.py points
+PROMETHEUS_MULTIPROC_DIR at a shared directory, each process writes its
+samples there, and the /metrics view sums them. Without the variable (e.g.
+runserver) the process's own registry is served.
+
+/metrics is for staff users, or scrapers sending
+`Authorization: Bearer <METRICS_TOKEN>`.
+"""
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+UNMATCHED = '<unmatched>'
+UPLOAD_CONTENT_TYPES = ('multipart/form-data', 'application/offset+octet-stream')
+
+REQUEST_SECONDS = Histogram(
+    'photoshoot_http_request_duration_seconds', "Time spent producing a response.", ['view', 'method'],
+)
+RESPONSES = Counter(
+    'photoshoot_http_responses_total', "Responses by status code.", ['view', 'method', 'status'],
+)
+RESPONSE_BYTES = Histogram(
+    'photoshoot_http_response_size_bytes', "Response body size.", ['view'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864),
+)
+DB_QUERIES = Histogram(
+    'photoshoot_db_queries_per_request', "Database queries run while handling a request.", ['view'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+)
+DB_SECONDS = Histogram(
+    'photoshoot_db_time_seconds', "Time spent in database queries while handling a request.", ['view'],
+)
+UPLOAD_BYTES = Counter(
+    'photoshoot_upload_bytes_total', "Request body bytes received by file uploads.", ['view'],
+)
+SMTP_SECONDS = Histogram(
+    'photoshoot_smtp_send_seconds', "Time to hand one outbox message to the mail server.", ['result'],
+)
+
+
+class QueryTimer:
+    """
+    A connection.execute_wrapper() that counts queries and their time.
+    """
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+    def install(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self):
+        for connection in connections.all():
+            connection.execute_wrappers.remove(self)
+
+
+class MetricsMiddleware:
+    """
+    Goes first in MIDDLEWARE so the timings include the other middleware.
+    Streaming responses are timed up to the point their body starts.
+    Works in both sync (WSGI) and async (ASGI) request stacks.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started, timer = time.perf_counter(), QueryTimer()
+        timer.install()
+        try:
+            response = self.get_response(request)
+        finally:
+            timer.uninstall()
+        self.record(request, response, timer, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        # Connections are per thread, and the async ORM (like any sync code
+        # in the request) runs its queries on the request's sync thread, so
+        # the timer goes on that thread's connections.
+        started, timer = time.perf_counter(), QueryTimer()
+        await sync_to_async(timer.install)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(timer.uninstall)()
+        self.record(request, response, timer, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, timer, elapsed):
+        match = request.resolver_match
+        view = (match.view_name if match else None) or UNMATCHED
+        REQUEST_SECONDS.labels(view, request.method).observe(elapsed)
+        RESPONSES.labels(view, request.method, str(response.status_code)).inc()
+        DB_QUERIES.labels(view).observe(timer.count)
+        DB_SECONDS.labels(view).observe(timer.seconds)
+
+        size = response.get('Content-Length') if response.streaming else len(response.content)
+        if size is not None:
+            RESPONSE_BYTES.labels(view).observe(int(size))
+        if request.content_type in UPLOAD_CONTENT_TYPES:
+            UPLOAD_BYTES.labels(view).inc(int(request.META.get('CONTENT_LENGTH') or 0))
+
+
+def registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        combined = CollectorRegistry()
+        multiprocess.MultiProcessCollector(combined)
+        return combined
+    return REGISTRY
+
+
+def allowed(request):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return bool(settings.METRICS_TOKEN) and scheme.lower() == 'bearer' and constant_time_compare(token, settings.METRICS_TOKEN)
+
+
+def metrics_view(request):
+    if not allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-17 00:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('main', 'Post')
+    Like = apps.get_model('main', 'Like')
+    Comment = apps.get_model('main', 'Comment')
+
+    def counted(model):
+        rows = model.objects.filter(post=OuterRef('pk')).values('post').annotate(n=Count('pk')).values('n')
+        return Coalesce(Subquery(rows), 0)
+
+    Post.objects.update(like_count=counted(Like), comment_count=counted(Comment))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_post_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# The schema and backfill as of this migration, written out rather than
+# taken from main.search, so later changes to the app can't change (or
+# break) what this migration does. Other databases use main.search's
+# unindexed fallback and get no table.
+SQL = {
+    'postgresql': [
+        "CREATE TABLE main_postsearch ("
+        " post_id bigint PRIMARY KEY REFERENCES main_post(id) ON DELETE CASCADE,"
+        " document tsvector NOT NULL)",
+        "CREATE INDEX main_postsearch_document_gin ON main_postsearch USING gin(document)",
+        "INSERT INTO main_postsearch (post_id, document) "
+        "SELECT p.id, "
+        " setweight(to_tsvector('english', coalesce(p.title, '')), 'A') ||"
+        " setweight(to_tsvector('english', coalesce(l.name, '') || ' ' || coalesce(l.city, '')), 'B') ||"
+        " setweight(to_tsvector('english', coalesce(p.description, '')), 'C') "
+        "FROM main_post p LEFT JOIN main_location l ON l.id = p.location_id",
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE main_postsearch USING fts5("
+        "title, place, description, tokenize='porter unicode61')",
+        "INSERT INTO main_postsearch (rowid, title, place, description) "
+        "SELECT p.id, p.title, coalesce(l.name, '') || ' ' || coalesce(l.city, ''), p.description "
+        "FROM main_post p LEFT JOIN main_location l ON l.id = p.location_id",
+    ],
+}
+
+
+def create_index(apps, schema_editor):
+    for statement in SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in SQL:
+        schema_editor.execute("DROP TABLE IF EXISTS main_postsearch")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_trending'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photographerprofile',
+            name='profile_pic_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
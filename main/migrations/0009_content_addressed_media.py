@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-17 01:03
+
+import main.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_chunked_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='photographerprofile',
+            name='profile_pic',
+            field=models.ImageField(blank=True, null=True, storage=main.storage.get_storage, upload_to='profiles/'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=main.storage.get_storage, upload_to='posts/'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='video',
+            field=models.FileField(blank=True, null=True, storage=main.storage.get_storage, upload_to='videos/'),
+        ),
+    ]
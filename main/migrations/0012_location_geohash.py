@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-17 01:16
+
+from django.db import migrations, models
+
+from main.geo import encode
+
+
+def backfill_geohash(apps, schema_editor):
+    Location = apps.get_model('main', 'Location')
+    rows = Location.objects.exclude(latitude=None).exclude(longitude=None)
+    batch = []
+    for location in rows.iterator():
+        location.geohash = encode(location.latitude, location.longitude)
+        batch.append(location)
+        if len(batch) == 1000:
+            Location.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    Location.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_comment_post_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['geohash', 'latitude', 'longitude'], name='location_geohash_idx'),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
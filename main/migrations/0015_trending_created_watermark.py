@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-17 02:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def carry_over_watermark(apps, schema_editor):
+    # Everything created before the last refresh has been counted (give or
+    # take rows that committed late, which is what the id watermark missed).
+    TrendingState = apps.get_model('main', 'TrendingState')
+    TrendingState.objects.update(counted_until=models.F('refreshed_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_post_photo_position_geotagjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trendingstate',
+            name='counted_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(carry_over_watermark, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='trendingstate',
+            name='last_comment_id',
+        ),
+        migrations.RemoveField(
+            model_name='trendingstate',
+            name='last_like_id',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['created_at', 'id'], name='like_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_rendition_job_claimed_until'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geotagjob',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
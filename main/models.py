@@ -1,52 +1,351 @@
-from django.db import models
+import os
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import geo, renditions
+from .storage import get_storage, is_blob
 
 class Location(models.Model):
     name = models.CharField(max_length=200)
     city = models.CharField(max_length=100, blank=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Derived from latitude/longitude on save, for proximity search (main/geo.py)
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
+    # Also touched when the location's posts come and go, so the map
+    # cluster index (main/clusters.py) can pick up just what changed.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # geohash prefix ranges; the coordinates ride along so the
+            # bounding-box check needs no table lookups
+            models.Index(fields=['geohash', 'latitude', 'longitude'], name='location_geohash_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
-class PhotographerProfile(models.Model):
+    def save(self, *args, **kwargs):
+        self.geohash = self.compute_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            extra = {'geohash'} if {'latitude', 'longitude'} & set(update_fields) else set()
+            kwargs['update_fields'] = set(update_fields) | extra | {'updated_at'}
+        super().save(*args, **kwargs)
+
+    def compute_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            return ''
+        return geo.encode(self.latitude, self.longitude)
+
+class StoredMedia(models.Model):
+    """
+    A model with content-addressed media fields (main/storage.py). Saving is
+    one transaction, so the Blob rows locked before the files are written
+    (main/signals.py) stay locked until the new references are counted.
+    """
+    # Queryset updates that change what a page shows (counters, renditions)
+    # set it too; the profile page's ETag is built from it.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+class PhotographerProfile(StoredMedia):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(blank=True)
     contact = models.CharField(max_length=30, blank=True)
     portfolio_link = models.URLField(blank=True)
-    profile_pic = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    profile_pic = models.ImageField(upload_to='profiles/', storage=get_storage, blank=True, null=True)
+    # resized copies of profile_pic, see main/renditions.py
+    profile_pic_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
-class Post(models.Model):
+class Post(StoredMedia):
     uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)
-    image = models.ImageField(upload_to='posts/',  blank=True, null=True)
-    video = models.FileField(upload_to='videos/', blank=True, null=True)
+    image = models.ImageField(upload_to='posts/', storage=get_storage, blank=True, null=True)
+    video = models.FileField(upload_to='videos/', storage=get_storage, blank=True, null=True)
+    # resized copies of image, see main/renditions.py
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Where the image was taken, from its EXIF GPS (main/geotag.py); kept as
+    # a suggestion when it could not be matched to a location.
+    photo_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    photo_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    # Denormalized engagement counters, kept in step by the Like/Comment
+    # signal handlers (main/signals.py).
+    # Run `manage.py sync_counters` to repair drift.
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # keyset pagination on the explore feed walks this index
+            models.Index(fields=['-created_at', '-id'], name='post_feed_idx'),
+        ]
+
+    @classmethod
+    def bump(cls, pk, **deltas):
+        """
+        Atomically add deltas to counter columns, e.g. bump(pk, like_count=1).
+        `pk` may also be a list of pks. Counters never go below zero even if
+        they have drifted.
+        """
+        lookup = {'pk__in': pk} if isinstance(pk, (list, tuple, set)) else {'pk': pk}
+        cls.objects.filter(**lookup).update(
+            updated_at=timezone.now(),
+            **{name: Greatest(F(name) + delta, 0) for name, delta in deltas.items()}
+        )
+
+class CountedOnPost(models.Model):
+    """
+    A row counted in one of Post's counter columns. The counters move in the
+    post_save/post_delete receivers in main/signals.py, which also fire for
+    cascades (deleting a user deletes their likes and comments).
+    """
+    class Meta:
+        abstract = True
 
-    def like_count(self):
-        return self.likes.count()
+    def save(self, *args, **kwargs):
+        # One transaction with the post_save counter bump.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
-    def comment_count(self):
-        return self.comments.count()
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # post_delete is sent whether or not a row went. Of two deletes of
+            # the same row (a double-clicked unlike racing itself) only the
+            # one that gets the lock while the row still exists goes ahead.
+            if not type(self)._base_manager.select_for_update().filter(pk=self.pk).exists():
+                return 0, {}
+            return super().delete(*args, **kwargs)
 
-class Like(models.Model):
+class Like(CountedOnPost):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, related_name='likes', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     class Meta:
         unique_together = ('user', 'post')
+        indexes = [
+            # the trending refresh reads new likes by creation time
+            models.Index(fields=['created_at', 'id'], name='like_created_idx'),
+        ]
 
-class Comment(models.Model):
+class Comment(CountedOnPost):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, related_name='comments', on_delete=models.CASCADE)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # get_comments pages through a post's comments by (created_at, id)
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_idx'),
+            # the trending refresh reads new comments by creation time
+            models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+        ]
+
+
+
+
+
+
+
+
+class TrendingScore(models.Model):
+    """
+    Materialized trending score per post, maintained by main.trending.refresh().
+    `score` is stored relative to TrendingState.epoch so rows never need to be
+    decayed one by one; ordering by it is the same as ordering by decayed score.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    score = models.FloatField(default=0, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class TrendingState(models.Model):
+    """
+    Single-row watermark for the incremental trending refresh: likes and
+    comments created up to `counted_until` are in the scores.
+    """
+    epoch = models.DateTimeField()
+    counted_until = models.DateTimeField(null=True, blank=True)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+class ChunkedUpload(models.Model):
+    """
+    A resumable (tus-style) video upload in progress. Bytes are appended to
+    `path` on local disk chunk by chunk; `offset` is how many have arrived.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    length = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    post = models.OneToOneField(Post, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{self.id}.part')
+
+    @property
+    def is_complete(self):
+        return self.offset == self.length
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.delete()
+
+class Blob(models.Model):
+    """
+    A content-addressed media file (see main/storage.py) and how many
+    Post/PhotographerProfile fields point at it. A row whose count drops to
+    zero is kept, locked, until its file is deleted after the commit.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def lock(cls, names):
+        """
+        Row-lock the existing blobs among `names` until the transaction ends,
+        so their files can't be deleted while a save is reusing them.
+        """
+        list(cls.objects.select_for_update().filter(name__in=[name for name in names if is_blob(name)]))
+
+    @classmethod
+    def acquire(cls, name):
+        if not is_blob(name):
+            return
+        with transaction.atomic():
+            blob, created = cls.objects.select_for_update().get_or_create(
+                name=name, defaults={'size': lambda: get_storage().size(name), 'refcount': 1}
+            )
+            if not created:
+                cls.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+
+    @classmethod
+    def acquire_many(cls, names):
+        """
+        acquire() for every name in `names` (repeats count), for bulk-created
+        rows: one update per distinct existing blob and one insert for the rest.
+        """
+        counts = Counter(name for name in names if is_blob(name))
+        with transaction.atomic():
+            existing = set(cls.objects.select_for_update().filter(name__in=counts).values_list('name', flat=True))
+            for name in existing:
+                cls.objects.filter(name=name).update(refcount=F('refcount') + counts[name])
+            storage = get_storage()
+            cls.objects.bulk_create([
+                cls(name=name, size=storage.size(name), refcount=count)
+                for name, count in counts.items() if name not in existing
+            ])
+
+    @classmethod
+    def release(cls, name):
+        """
+        Drop one reference; the file is deleted once nothing points at it.
+        """
+        if not is_blob(name):
+            return
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(name=name).first()
+            if blob is None or blob.refcount == 0:
+                return
+            cls.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+        if blob.refcount == 1:
+            transaction.on_commit(lambda: cls._delete_if_unused(name))
+
+    @classmethod
+    def _delete_if_unused(cls, name):
+        # Re-checked under the row lock: the same content may have been
+        # uploaded again since the last reference went away, and a save
+        # reusing the file holds the lock until its reference is counted.
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(name=name).first()
+            if blob is None or blob.refcount:
+                return
+            get_storage().delete(name)
+            renditions.delete(name)
+            blob.delete()
+
+class GeotagJob(models.Model):
+    """
+    A post image waiting for `manage.py media_worker` to read its EXIF GPS
+    (main/geotag.py). Queued when a post's image is saved; deleted once read.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='geotag_job')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Leased to a worker until then (geotag.claim).
+    claimed_until = models.DateTimeField(null=True, blank=True)
 
+class RenditionJob(models.Model):
+    """
+    A stored image waiting for `manage.py media_worker` to build its
+    renditions (main/renditions.py). One job per file and field: rows
+    sharing a blob share its renditions.
+    """
+    field_name = models.CharField(max_length=50)
+    name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Leased to a worker until then (renditions.claim).
+    claimed_until = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        unique_together = ('field_name', 'name')
 
+class OutboundEmail(models.Model):
+    """
+    An email waiting to be sent (or sent, or given up on) by
+    `manage.py send_outbox`. Views enqueue with main.outbox.enqueue() instead
+    of talking to SMTP inside the request.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent'), (DEAD, 'Dead')]
 
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # the worker polls pending rows that are due
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
 
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.to)} ({self.status})'
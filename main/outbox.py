@@ -0,0 +1,108 @@
+"""
+Persistent email outbox.
+
+enqueue() stores a message in OutboundEmail and returns immediately;
+`manage.py send_outbox` drains due messages in batches over a single backend
+connection; gunicorn.conf.py keeps one running with --loop. Failed sends are retried with exponential backoff
+(OUTBOX_BACKOFF_SECONDS * 2**(attempts-1), capped at OUTBOX_BACKOFF_MAX_SECONDS)
+and dead-lettered after OUTBOX_MAX_ATTEMPTS.
+
+Rows are claimed by pushing next_attempt_at OUTBOX_LEASE_SECONDS into the
+future, so several workers can run at once and a worker that dies mid-batch
+only delays its messages (delivery is at-least-once).
+"""
+import time
+from contextlib import suppress
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import SMTP_SECONDS
+from .models import OutboundEmail
+
+
+def enqueue(subject, body, to, from_email=None, reply_to=()):
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        reply_to=list(reply_to),
+    )
+
+
+def backoff(attempts):
+    delay = settings.OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.OUTBOX_BACKOFF_MAX_SECONDS))
+
+
+def claim(batch_size, now):
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        OutboundEmail.objects.filter(id__in=ids).update(
+            next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+        )
+    return list(OutboundEmail.objects.filter(id__in=ids).order_by('id'))
+
+
+def send_batch(batch_size=50, connection=None, now=None):
+    """
+    Send up to batch_size due messages over one connection.
+    Returns (sent, retried, dead) counts.
+    """
+    now = now or timezone.now()
+    batch = claim(batch_size, now)
+    if not batch:
+        return 0, 0, 0
+
+    connection = connection or get_connection()
+    sent = retried = dead = 0
+    try:
+        for email in batch:
+            message = EmailMessage(
+                email.subject, email.body, email.from_email, email.to,
+                reply_to=email.reply_to or None, connection=connection,
+            )
+            started = time.perf_counter()
+            try:
+                # No-op while the connection is up; reconnects after a failure.
+                connection.open()
+                message.send()
+            except Exception as exc:
+                SMTP_SECONDS.labels('failed').observe(time.perf_counter() - started)
+                attempts = email.attempts + 1
+                if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                    status, dead = OutboundEmail.DEAD, dead + 1
+                else:
+                    status, retried = OutboundEmail.PENDING, retried + 1
+                OutboundEmail.objects.filter(pk=email.pk).update(
+                    status=status,
+                    attempts=F('attempts') + 1,
+                    next_attempt_at=now + backoff(attempts),
+                    last_error=f'{type(exc).__name__}: {exc}',
+                )
+                # The connection may be in a bad state; start a fresh one.
+                with suppress(Exception):
+                    connection.close()
+            else:
+                SMTP_SECONDS.labels('sent').observe(time.perf_counter() - started)
+                sent += 1
+                OutboundEmail.objects.filter(pk=email.pk).update(
+                    status=OutboundEmail.SENT,
+                    attempts=F('attempts') + 1,
+                    sent_at=timezone.now(),
+                    last_error='',
+                )
+    finally:
+        connection.close()
+    return sent, retried, dead
@@ -0,0 +1,227 @@
+"""
+Full-page cache for anonymous visitors.
+
+Pages are cached under versioned keys: every cached page belongs to a scope
+(the explore feed, or one user's profile) and the scope's current version is
+part of the key. Writes never delete pages; the signal handlers in
+main/signals.py just give the affected scopes a new random version once the
+write commits, and readers stop finding the old pages, which then expire on
+their own (PAGE_CACHE_TIMEOUT). A page is therefore never stale by more than
+the write that is committing right now.
+
+Scopes:
+    feed            explore page and its infinite-scroll fragments
+    profile:<id>    a user's profile page
+
+The same versions key the per-post card fragments (main/templatetags/cards.py):
+    post:<id>       a post's own fields, media and location
+    user:<id>       what a card shows about its uploader
+
+Hits and misses are counted in the cache (see stats() and
+`manage.py pagecache_stats`); responses carry X-Cache: HIT/MISS.
+
+Versions only work in a cache every writer shares, so all of this is off
+(pages render uncached, nothing is invalidated) unless PAGE_CACHE_ENABLED.
+"""
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+
+from . import replicas
+
+FEED = 'feed'
+COUNTERS = ('hits', 'misses')
+
+
+def profile_scope(user_id):
+    return f'profile:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def _version_key(scope):
+    return f'pagecache:v:{scope}'
+
+
+def version(scope):
+    key = _version_key(scope)
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        current = cache.get(key)
+    return current
+
+
+def versions(*scopes):
+    """
+    Current versions of several scopes in one cache round trip.
+    """
+    keys = [_version_key(s) for s in scopes]
+    found = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in found}
+    for key, value in missing.items():
+        if not cache.add(key, value, None):
+            value = cache.get(key)
+        found[key] = value
+    return [found[key] for key in keys]
+
+
+def card_version(post):
+    if not settings.PAGE_CACHE_ENABLED:
+        return ''
+    return '.'.join(versions(post_scope(post.pk), user_scope(post.uploader_id)))
+
+
+def invalidate(*scopes):
+    """
+    Move the scopes to new versions once the current transaction commits.
+    Random versions (rather than counters) mean concurrent invalidations
+    can never collapse into one.
+    """
+    scopes = set(scopes)
+    if scopes and settings.PAGE_CACHE_ENABLED:
+        transaction.on_commit(
+            lambda: cache.set_many({_version_key(s): uuid.uuid4().hex for s in scopes}, None)
+        )
+
+
+def invalidate_posts(post_ids):
+    """
+    Invalidate the pages showing these posts: the feed and their uploaders' profiles.
+    """
+    from .models import Post
+
+    uploader_ids = Post.objects.filter(pk__in=list(post_ids)).values_list('uploader_id', flat=True)
+    invalidate(FEED, *(profile_scope(pk) for pk in uploader_ids))
+
+
+def invalidate_cards(post_ids):
+    """
+    The posts' card fragments changed too (their fields, media or location),
+    not just their counters.
+    """
+    invalidate(*(post_scope(pk) for pk in post_ids))
+
+
+def invalidate_rows(model, pks):
+    """
+    For writes that bypass signals (queryset updates) on Post or PhotographerProfile.
+    """
+    from .models import PhotographerProfile, Post
+
+    if model is Post:
+        invalidate_posts(pks)
+        invalidate_cards(pks)
+    elif model is PhotographerProfile:
+        user_ids = PhotographerProfile.objects.filter(pk__in=list(pks)).values_list('user_id', flat=True)
+        invalidate(*(profile_scope(pk) for pk in user_ids), *(user_scope(pk) for pk in user_ids))
+
+
+def _count(name):
+    key = f'pagecache:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def stats():
+    return {name: cache.get(f'pagecache:{name}', 0) for name in COUNTERS}
+
+
+def reset_stats():
+    cache.delete_many([f'pagecache:{name}' for name in COUNTERS])
+
+
+def has_pending_messages(request):
+    # Flash messages are per visitor and are rendered into the page.
+    return bool(request.COOKIES.get('messages') or request.session.get('_messages'))
+
+
+def _cacheable(request):
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return False
+    return not has_pending_messages(request)
+
+
+def _patch_headers(response, public):
+    patch_vary_headers(response, ('Cookie',))
+    if not public:
+        patch_cache_control(response, private=True, no_cache=True)
+    elif settings.PAGE_CACHE_SHARED_MAX_AGE:
+        patch_cache_control(response, public=True, max_age=0, s_maxage=settings.PAGE_CACHE_SHARED_MAX_AGE)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def cache_anonymous_page(scopes):
+    """
+    Cache the view's page for anonymous visitors. `scopes(request, *args,
+    **kwargs)` returns the scopes the page depends on, or None if the page
+    should not be cached (e.g. it is about to 404).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.PAGE_CACHE_ENABLED:
+                return view(request, *args, **kwargs)
+            page_scopes = _cacheable(request) and scopes(request, *args, **kwargs)
+            if not page_scopes:
+                return _patch_headers(view(request, *args, **kwargs), public=False)
+
+            versions = ':'.join(version(s) for s in sorted(page_scopes))
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f'pagecache:page:{view.__name__}:{path}:{versions}'
+
+            page = cache.get(key)
+            if page is not None:
+                _count('hits')
+                if page['etag'] in parse_etags(request.headers.get('If-None-Match', '')):
+                    response = HttpResponseNotModified()
+                else:
+                    response = HttpResponse(page['content'], content_type=page['content_type'])
+                response['ETag'] = page['etag']
+                response['X-Cache'] = 'HIT'
+                return _patch_headers(response, public=True)
+
+            _count('misses')
+            # Stored under the versions just read, so render what the
+            # primary has now, not what a lagging replica still shows.
+            replicas.use_primary()
+            response = view(request, *args, **kwargs)
+            store = (
+                response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                # The page used a CSRF token, which must not be shared.
+                and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            )
+            if not store:
+                return _patch_headers(response, public=False)
+
+            etag = '"%s"' % hashlib.md5(response.content).hexdigest()
+            cache.set(key, {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': etag,
+            }, settings.PAGE_CACHE_TIMEOUT)
+            response['ETag'] = etag
+            response['X-Cache'] = 'MISS'
+            return _patch_headers(response, public=True)
+        return wrapper
+    return decorator
@@ -0,0 +1,101 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    """
+    Turn the (created_at, id) of the last row on a page into an opaque token.
+    """
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Reverse of encode_cursor. Raises InvalidCursor on anything malformed.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created), int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor(token) from exc
+
+
+def get_page_size(value, default=None, limit=None):
+    """
+    Parse a requested page size, falling back to the default and capping it.
+    Defaults to the explore feed's EXPLORE_PAGE_SIZE / EXPLORE_MAX_PAGE_SIZE.
+    """
+    default = default or getattr(settings, 'EXPLORE_PAGE_SIZE', 12)
+    limit = limit or getattr(settings, 'EXPLORE_MAX_PAGE_SIZE', 48)
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, limit))
+
+
+def _before(queryset, cursor):
+    qs = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    return qs
+
+
+def _after(queryset, cursor):
+    created_at, pk = decode_cursor(cursor)
+    return queryset.order_by('created_at', 'id').filter(
+        Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+    )
+
+
+def _page(rows, page_size):
+    # Callers fetch one extra row to know whether there is another page.
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.pk)
+    return rows, next_cursor
+
+
+def keyset_page(queryset, cursor=None, page_size=12):
+    """
+    Return (rows, next_cursor) for a newest-first page of `queryset`.
+
+    Rows are ordered by (-created_at, -id) and only rows strictly after the
+    cursor are read, so every page is a bounded index range scan no matter
+    how deep the user has scrolled.
+    """
+    return _page(list(_before(queryset, cursor)[:page_size + 1]), page_size)
+
+
+def keyset_page_after(queryset, cursor, page_size=12):
+    """
+    Return (rows, next_cursor) for the rows strictly newer than `cursor`,
+    oldest first. next_cursor is set when more than one page is waiting.
+    """
+    return _page(list(_after(queryset, cursor)[:page_size + 1]), page_size)
+
+
+async def akeyset_page(queryset, cursor=None, page_size=12):
+    """
+    keyset_page() for async views.
+    """
+    return _page([row async for row in _before(queryset, cursor)[:page_size + 1]], page_size)
+
+
+async def akeyset_page_after(queryset, cursor, page_size=12):
+    """
+    keyset_page_after() for async views.
+    """
+    return _page([row async for row in _after(queryset, cursor)[:page_size + 1]], page_size)
@@ -0,0 +1,247 @@
+"""
+Resized WebP/JPEG renditions for Post.image and PhotographerProfile.profile_pic.
+
+Renditions are written next to the originals under `renditions/` and the
+result is stored as JSON on the owning row (`image_renditions`,
+`profile_pic_renditions`), e.g.
+
+    {"source": "posts/a.jpg", "width": 1280, "height": 720,
+     "webp": [[320, "renditions/posts/a/320.webp"], ...],
+     "jpeg": [[320, "renditions/posts/a/320.jpg"], ...]}
+
+so templates can emit srcset without any extra queries. `source` records
+which upload the renditions belong to; a row whose source no longer matches
+its file is stale and gets rebuilt.
+
+Saving a row with a new file queues a RenditionJob in the same transaction
+(unless another row already has renditions for that file); resizing happens
+in `manage.py media_worker`, never in the request and never inside a
+transaction: jobs are leased in one and the results written in another.
+Rebuilding overwrites the files in place, and they are deleted with their
+blob (Blob._delete_if_unused).
+"""
+import io
+import logging
+import posixpath
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import pagecache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = {
+    'image': (320, 640, 1080),
+    'profile_pic': (64, 160, 320),
+}
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def widths_for(field_name):
+    return getattr(settings, 'RENDITION_WIDTHS', DEFAULT_WIDTHS).get(field_name, DEFAULT_WIDTHS['image'])
+
+
+def metadata_attr(field_name):
+    return f'{field_name}_renditions'
+
+
+def folder(name):
+    return f'renditions/{posixpath.splitext(name)[0]}'
+
+
+def _store(path, data):
+    # Overwrite rather than let storage pick a free name: a rebuild would
+    # otherwise leave the old files behind under their suffixed names.
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    return default_storage.save(path, ContentFile(data))
+
+
+def render(name, widths):
+    """
+    Build every rendition for the stored file `name` and return its metadata.
+    Only touches storage, never the database, so it is safe to run in a
+    worker process.
+    """
+    with default_storage.open(name, 'rb') as fh:
+        original = ImageOps.exif_transpose(Image.open(fh))
+        original.load()
+
+    if original.mode not in ('RGB', 'L'):
+        original = original.convert('RGB')
+
+    meta = {'source': name, 'width': original.width, 'height': original.height}
+
+    # Never upscale: keep the widths below the original, plus the original width
+    # itself if it falls between two steps.
+    targets = sorted({w for w in widths if w < original.width} | {min(original.width, max(widths))})
+    for fmt, (pil_format, ext, options) in FORMATS.items():
+        meta[fmt] = []
+        for width in targets:
+            height = round(original.height * width / original.width)
+            resized = original.resize((width, height), Image.Resampling.LANCZOS)
+            buf = io.BytesIO()
+            resized.save(buf, pil_format, **options)
+            saved = _store(f'{folder(name)}/{width}.{ext}', buf.getvalue())
+            meta[fmt].append([width, saved])
+    return meta
+
+
+def delete(name):
+    """Remove every rendition of the stored file `name`."""
+    try:
+        _, files = default_storage.listdir(folder(name))
+    except FileNotFoundError:
+        return
+    for filename in files:
+        default_storage.delete(f'{folder(name)}/{filename}')
+
+
+def is_current(fieldfile):
+    """True if the stored renditions match the file (or there is no file)."""
+    meta = getattr(fieldfile.instance, metadata_attr(fieldfile.field.name)) or {}
+    return not fieldfile or meta.get('source') == fieldfile.name
+
+
+def queue(instance, field_name):
+    """
+    Queue renditions for one model field if they are missing or stale, or
+    copy them from another row showing the same file. Call inside the
+    transaction that saves the row.
+    """
+    fieldfile = getattr(instance, field_name)
+    if is_current(fieldfile):
+        return
+    meta = reusable(type(instance), field_name, fieldfile.name)
+    if meta:
+        save(type(instance), instance.pk, field_name, meta)
+        setattr(instance, metadata_attr(field_name), meta)
+        return
+    from .models import RenditionJob
+
+    RenditionJob.objects.get_or_create(field_name=field_name, name=fieldfile.name)
+
+
+def _stale_rows(model, field_name, name):
+    attr = metadata_attr(field_name)
+    rows = model.objects.filter(**{field_name: name}).values_list('pk', attr)
+    return [pk for pk, meta in rows if (meta or {}).get('source') != name]
+
+
+def build(field_name, name):
+    """
+    Render `name` and save the result on every row of `field_name` showing
+    it without current renditions. Returns 'built', 'current' or 'failed'.
+    The image work runs outside any transaction; only the writes are one.
+    """
+    from .models import PhotographerProfile, Post
+
+    model = {'image': Post, 'profile_pic': PhotographerProfile}[field_name]
+    if not _stale_rows(model, field_name, name):
+        # Rebuilt by `manage.py build_renditions`, or the rows moved on.
+        return 'current'
+    try:
+        meta = render(name, widths_for(field_name))
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.exception("Could not build renditions for %s", name)
+        return 'failed'
+    with transaction.atomic():
+        # Looked up again: rows may have started showing the file meanwhile.
+        for pk in _stale_rows(model, field_name, name):
+            save(model, pk, field_name, meta)
+    return 'built'
+
+
+def claim(batch_size):
+    """
+    Lease up to batch_size queued jobs for MEDIA_JOB_LEASE_SECONDS, in a
+    transaction of its own, so several workers can share the queue and a
+    worker that dies only delays its jobs.
+    """
+    from .models import RenditionJob
+
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            RenditionJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(claimed_until=None) | Q(claimed_until__lte=now))
+            .order_by('created_at')[:batch_size]
+        )
+        RenditionJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            claimed_until=now + timedelta(seconds=settings.MEDIA_JOB_LEASE_SECONDS)
+        )
+    return jobs
+
+
+def run_batch(batch_size=10):
+    """
+    Build renditions for up to batch_size queued files. Returns a Counter of
+    outcomes.
+    """
+    from .models import RenditionJob
+
+    outcomes = Counter()
+    for job in claim(batch_size):
+        outcomes[build(job.field_name, job.name)] += 1
+        RenditionJob.objects.filter(pk=job.pk).delete()
+    return outcomes
+
+
+def reusable(model, field_name, name):
+    """
+    Renditions already built for the same stored file by another row. With
+    content-addressed storage identical uploads share a name, so each blob
+    is only ever rendered once.
+    """
+    return (
+        model.objects
+        .filter(**{f'{metadata_attr(field_name)}__source': name})
+        .values_list(metadata_attr(field_name), flat=True)
+        .first()
+    )
+
+
+def save(model, pk, field_name, meta):
+    # Queryset update so post_save (and this pipeline) is not triggered again.
+    model.objects.filter(pk=pk).update(updated_at=timezone.now(), **{metadata_attr(field_name): meta})
+    # Cached pages still point at the original file.
+    pagecache.invalidate_rows(model, [pk])
+
+
+def srcset(fieldfile, fmt='jpeg'):
+    """
+    `url 320w, url 640w, ...` for a FieldFile, or '' if it has no renditions.
+    """
+    if not fieldfile or not is_current(fieldfile):
+        return ''
+    meta = getattr(fieldfile.instance, metadata_attr(fieldfile.field.name))
+    return ', '.join(f'{default_storage.url(name)} {width}w' for width, name in meta.get(fmt, []))
+
+
+def url(fieldfile, width, fmt='jpeg'):
+    """
+    URL of the smallest rendition at least `width` wide, falling back to the
+    largest rendition and then to the original upload.
+    """
+    if not fieldfile:
+        return ''
+    if is_current(fieldfile):
+        meta = getattr(fieldfile.instance, metadata_attr(fieldfile.field.name))
+        options = meta.get(fmt) or []
+        for w, name in options:
+            if w >= width:
+                return default_storage.url(name)
+        if options:
+            return default_storage.url(options[-1][1])
+    return fieldfile.url
@@ -0,0 +1,138 @@
+"""
+Read replicas.
+
+DATABASE_REPLICA_URLS adds read-only aliases (settings.DATABASE_REPLICAS).
+ReplicaRouter sends reads made while handling a GET/HEAD request to one of
+them, picked per request; everything else uses the primary ('default'):
+
+- writes, and any request that is not GET/HEAD;
+- reads later in a request that has written;
+- requests within DATABASE_PIN_SECONDS of a write by the same browser
+  (a cookie), so people always see their own like or comment even if the
+  replicas lag;
+- reads inside a transaction on the primary;
+- anything outside a request (management commands, workers), which
+  keeps select_for_update() claims and the like on the primary;
+- the rest of a request that called use_primary(): what it renders is
+  going to be cached for everyone (main/pagecache.py), and a lagging
+  replica would store old data under a version that is already new.
+"""
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_pin'
+
+
+@dataclass
+class RequestState:
+    replica: str
+    pinned: bool = False
+    wrote: bool = False
+
+
+_state = ContextVar('replica_state', default=None)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.pinned or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication.
+        return db not in settings.DATABASE_REPLICAS
+
+
+def use_primary():
+    """
+    Send the rest of this request's reads to the primary.
+    """
+    state = _state.get()
+    if state is not None:
+        state.pinned = True
+
+
+def reads_from_primary():
+    state = _state.get()
+    return state is None or state.pinned
+
+
+def _pinned_by_cookie(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaMiddleware:
+    """
+    Goes before anything that reads the database (sessions, auth). Works in
+    both sync and async request stacks; the request's state lives in a
+    context variable, which the async ORM's worker threads inherit.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        state = RequestState(
+            replica=random.choice(settings.DATABASE_REPLICAS),
+            pinned=request.method not in ('GET', 'HEAD') or _pinned_by_cookie(request),
+        )
+        return state, _state.set(state)
+
+    def finish(self, state, response):
+        if state.wrote:
+            seconds = settings.DATABASE_PIN_SECONDS
+            response.set_cookie(
+                PIN_COOKIE, str(int(time.time()) + seconds), max_age=seconds, httponly=True, samesite='Lax',
+            )
+        return response
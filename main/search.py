@@ -0,0 +1,185 @@
+"""
+Full-text search over posts.
+
+Each backend keeps a side table `main_postsearch` (created by migration
+0006) holding one document per post (title, location name + city,
+description) and answers ranked queries from it:
+
+- PostgresBackend: tsvector column with a GIN index, ranked by ts_rank_cd.
+- SQLiteBackend:   FTS5 virtual table, ranked by bm25.
+- IcontainsBackend: the old OR'd icontains scan, used on any other database
+  and as the baseline in `manage.py bench_search`.
+
+Pick one explicitly with settings.SEARCH_BACKEND (a dotted path), otherwise
+it is chosen from the database vendor. The index is kept in sync by the
+signal handlers in main/signals.py.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .pagination import InvalidCursor
+
+TABLE = 'main_postsearch'
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _terms(q):
+    # Only word characters survive, so terms are safe to splice into a
+    # tsquery / FTS5 expression.
+    return WORD_RE.findall(q.lower())[:16]
+
+
+def _chunks(ids, size=500):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+class IcontainsBackend:
+    """Unindexed fallback: the original explore search."""
+
+    def index(self, post_ids):
+        pass
+
+    def remove(self, post_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, q, offset, limit):
+        qs = Post.objects.filter(
+            Q(location__name__icontains=q) |
+            Q(location__city__icontains=q) |
+            Q(title__icontains=q) |
+            Q(description__icontains=q)
+        ).order_by('-created_at', '-id')
+        return list(qs.values_list('id', flat=True)[offset:offset + limit])
+
+
+class PostgresBackend:
+    config = 'english'
+
+    def _upsert(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TABLE} (post_id, document) "
+                f"SELECT p.id, "
+                f" setweight(to_tsvector(%s, coalesce(p.title, '')), 'A') ||"
+                f" setweight(to_tsvector(%s, coalesce(l.name, '') || ' ' || coalesce(l.city, '')), 'B') ||"
+                f" setweight(to_tsvector(%s, coalesce(p.description, '')), 'C') "
+                f"FROM main_post p LEFT JOIN main_location l ON l.id = p.location_id "
+                f"WHERE {where} "
+                f"ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document",
+                [self.config] * 3 + params,
+            )
+
+    def index(self, post_ids):
+        for chunk in _chunks(post_ids):
+            self._upsert("p.id = ANY(%s)", [chunk])
+
+    def remove(self, post_ids):
+        # Rows go with the post via ON DELETE CASCADE.
+        pass
+
+    def rebuild(self):
+        self._upsert("TRUE", [])
+
+    def search(self, q, offset, limit):
+        terms = _terms(q)
+        if not terms:
+            return []
+        tsquery = ' & '.join(f"{t}:*" for t in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT post_id FROM {TABLE}, to_tsquery(%s, %s) query "
+                f"WHERE document @@ query "
+                f"ORDER BY ts_rank_cd(document, query) DESC, post_id DESC "
+                f"LIMIT %s OFFSET %s",
+                [self.config, tsquery, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class SQLiteBackend:
+    # bm25 column weights: title, place, description
+    weights = (10.0, 5.0, 1.0)
+
+    def _insert(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, title, place, description) "
+                f"SELECT p.id, p.title, coalesce(l.name, '') || ' ' || coalesce(l.city, ''), p.description "
+                f"FROM main_post p LEFT JOIN main_location l ON l.id = p.location_id "
+                f"WHERE {where}",
+                params,
+            )
+
+    def index(self, post_ids):
+        for chunk in _chunks(post_ids):
+            marks = ', '.join(['%s'] * len(chunk))
+            self.remove(chunk)
+            self._insert(f"p.id IN ({marks})", chunk)
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            for chunk in _chunks(post_ids):
+                marks = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({marks})", chunk)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}")
+        self._insert("1", [])
+
+    def search(self, q, offset, limit):
+        terms = _terms(q)
+        if not terms:
+            return []
+        match = ' AND '.join(f'"{t}"*' for t in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s "
+                f"ORDER BY bm25({TABLE}, %s, %s, %s), rowid DESC LIMIT %s OFFSET %s",
+                [match, *self.weights, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+VENDOR_BACKENDS = {
+    'postgresql': PostgresBackend,
+    'sqlite': SQLiteBackend,
+}
+
+
+def get_backend(vendor=None):
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return VENDOR_BACKENDS.get(vendor or connection.vendor, IcontainsBackend)()
+
+
+def search_page(q, cursor=None, page_size=12, backend=None):
+    """
+    Return (posts, next_cursor) for one page of ranked search results.
+    The cursor is the offset of the next result.
+    """
+    backend = backend or get_backend()
+    try:
+        offset = int(cursor) if cursor else 0
+    except ValueError:
+        raise InvalidCursor(cursor)
+    if offset < 0:
+        raise InvalidCursor(cursor)
+
+    ids = backend.search(q, offset, page_size + 1)
+    next_cursor = str(offset + page_size) if len(ids) > page_size else None
+    ids = ids[:page_size]
+
+    found = Post.objects.select_related('uploader', 'location').in_bulk(ids)
+    return [found[i] for i in ids if i in found], next_cursor
@@ -0,0 +1,244 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+
+from . import autocomplete, clusters, geotag, live, pagecache, renditions
+from .models import Blob, Comment, Like, Location, PhotographerProfile, Post
+from .search import get_backend
+from .storage import content_name, file_digest
+
+
+# -----------------------------
+# Search index sync
+# -----------------------------
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_backend().index([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Location)
+def reindex_location_posts(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and not created:
+        get_backend().index(instance.post_set.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Location)
+def remember_location_posts(sender, instance, **kwargs):
+    # Posts are detached (SET_NULL) with a bulk update, which sends no
+    # signals, so note them now and reindex once the location is gone.
+    instance._post_ids = list(instance.post_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Location)
+def reindex_detached_posts(sender, instance, **kwargs):
+    get_backend().index(getattr(instance, '_post_ids', []))
+
+
+# -----------------------------
+# Engagement counters on Post
+# -----------------------------
+COUNTERS = {Like: 'like_count', Comment: 'comment_count'}
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Comment)
+def count_engagement(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and created:
+        Post.bump(instance.post_id, **{COUNTERS[sender]: 1})
+
+
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Comment)
+def uncount_engagement(sender, instance, origin=None, **kwargs):
+    # Nothing to keep count on when the post itself is being deleted.
+    if not (isinstance(origin, Post) and origin.pk == instance.post_id):
+        Post.bump(instance.post_id, **{COUNTERS[sender]: -1})
+
+
+# -----------------------------
+# Image renditions (built by `manage.py media_worker`)
+# -----------------------------
+@receiver(post_save, sender=Post)
+def queue_post_renditions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        renditions.queue(instance, 'image')
+
+
+@receiver(post_save, sender=PhotographerProfile)
+def queue_profile_renditions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        renditions.queue(instance, 'profile_pic')
+
+
+# -----------------------------
+# Blob reference counts
+# -----------------------------
+MEDIA_FIELDS = {
+    Post: ('image', 'video'),
+    PhotographerProfile: ('profile_pic',),
+}
+
+
+def _file_names(instance):
+    return {field: getattr(instance, field).name or '' for field in MEDIA_FIELDS[type(instance)]}
+
+
+def _pending_blobs(instance):
+    # Blob names of files assigned but not yet written; the digest is kept
+    # on the file so storage doesn't hash it again.
+    names = []
+    for field in MEDIA_FIELDS[type(instance)]:
+        fieldfile = getattr(instance, field)
+        if fieldfile and not fieldfile._committed:
+            fieldfile.file.sha256 = file_digest(fieldfile.file)
+            names.append(content_name(fieldfile.name, fieldfile.file))
+    return names
+
+
+# What the post_save handlers compare against, fetched in one query: the
+# media fields (blob counts, geotagging) and a post's location (map and
+# autocomplete indexes).
+PREVIOUS_FIELDS = {
+    Post: MEDIA_FIELDS[Post] + ('location_id',),
+    PhotographerProfile: MEDIA_FIELDS[PhotographerProfile],
+}
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=PhotographerProfile)
+def remember_previous(sender, instance, raw=False, **kwargs):
+    instance._old_media = {}
+    instance._old_location_id = None
+    if raw:
+        return
+    if instance.pk:
+        old = sender.objects.filter(pk=instance.pk).values(*PREVIOUS_FIELDS[sender]).first() or {}
+        instance._old_location_id = old.pop('location_id', None)
+        instance._old_media = old
+    # Storage reuses a blob file that already exists; hold its row until
+    # count_media has counted the reference (StoredMedia.save is atomic).
+    Blob.lock(_pending_blobs(instance))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=PhotographerProfile)
+def count_media(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_old_media', {})
+    for field, name in _file_names(instance).items():
+        previous = old.get(field) or ''
+        if name != previous:
+            Blob.acquire(name)
+            Blob.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=PhotographerProfile)
+def release_media(sender, instance, **kwargs):
+    for name in _file_names(instance).values():
+        Blob.release(name)
+
+
+# -----------------------------
+# Photo geotagging (read later by `manage.py media_worker`)
+# -----------------------------
+@receiver(post_save, sender=Post)
+def queue_geotag(sender, instance, raw=False, **kwargs):
+    # remember_previous() has noted the previous image name.
+    if not raw and instance.image and instance.image.name != getattr(instance, '_old_media', {}).get('image'):
+        transaction.on_commit(lambda: geotag.enqueue([instance]))
+
+
+# -----------------------------
+# Anonymous page cache
+# -----------------------------
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    pagecache.invalidate(
+        pagecache.FEED, pagecache.profile_scope(instance.uploader_id), pagecache.post_scope(instance.pk)
+    )
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_engagement_pages(sender, instance, **kwargs):
+    pagecache.invalidate_posts([instance.post_id])
+
+
+@receiver(post_save, sender=PhotographerProfile)
+@receiver(post_delete, sender=PhotographerProfile)
+def invalidate_profile_page(sender, instance, **kwargs):
+    pagecache.invalidate(pagecache.profile_scope(instance.user_id), pagecache.user_scope(instance.user_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_pages(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    # Logging in saves last_login, which no page shows.
+    if not raw and not created and update_fields != frozenset(['last_login']):
+        pagecache.invalidate(pagecache.profile_scope(instance.pk), pagecache.user_scope(instance.pk))
+
+
+@receiver(post_save, sender=Location)
+def invalidate_location_pages(sender, instance, raw=False, created=False, **kwargs):
+    pagecache.invalidate(pagecache.FEED)
+    if not raw and not created:
+        pagecache.invalidate_cards(instance.post_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Location)
+def invalidate_deleted_location_pages(sender, instance, **kwargs):
+    pagecache.invalidate(pagecache.FEED)
+    pagecache.invalidate_cards(getattr(instance, '_post_ids', []))
+
+
+# -----------------------------
+# Live updates (Server-Sent Events)
+# -----------------------------
+@receiver(post_save, sender=Comment)
+def push_comment(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and created:
+        live.comment_added(instance)
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Comment)
+def push_counts(sender, instance, raw=False, **kwargs):
+    if not raw:
+        live.counts_changed([instance.post_id])
+
+
+# -----------------------------
+# In-memory location indexes (map clusters, autocomplete)
+# -----------------------------
+@receiver(post_save, sender=Post)
+def touch_post_locations(sender, instance, raw=False, created=False, **kwargs):
+    # A location's post count decides whether (and how heavily) it is on the
+    # map, and ranks it in autocomplete. remember_previous() has noted the
+    # old location.
+    old = getattr(instance, '_old_location_id', None)
+    if not raw and (created or old != instance.location_id):
+        clusters.touch_locations([old, instance.location_id])
+
+
+@receiver(post_delete, sender=Post)
+def touch_deleted_post_location(sender, instance, **kwargs):
+    clusters.touch_locations([instance.location_id])
+
+
+@receiver(post_delete, sender=Location)
+def rebuild_location_indexes(sender, instance, **kwargs):
+    # Deleted rows leave no updated_at to find; start over.
+    clusters.invalidate()
+    autocomplete.invalidate()
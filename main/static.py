@@ -0,0 +1,47 @@
+"""
+Static files under both WSGI and ASGI.
+
+WhiteNoise's middleware is sync-only: in an ASGI stack Django would run it,
+and so everything below it, async views included, in a worker thread.
+StaticFilesMiddleware is the same middleware (same settings, same headers,
+compression and caching) made able to run in either stack. Under ASGI files
+are looked up on the event loop and only the disk reads go to a thread.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+_DONE = object()
+
+
+async def _read_in_thread(iterator):
+    # FileResponse reads its file synchronously, a block at a time.
+    read = sync_to_async(next, thread_sensitive=False)
+    while (block := await read(iterator, _DONE)) is not _DONE:
+        yield block
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Stats the filesystem: development only (DEBUG).
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+        response = await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        response.streaming_content = _read_in_thread(iter(response.streaming_content))
+        return response
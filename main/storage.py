@@ -0,0 +1,74 @@
+"""
+Content-addressed media storage.
+
+Uploads are stored once per distinct content under
+`blobs/<aa>/<bb>/<sha256><ext>`, so the same photo uploaded five times takes
+the space of one. Which rows point at a blob is tracked by main.models.Blob
+(reference counts kept by the signal handlers in main/signals.py); a blob's
+file is deleted when its last reference goes away.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+PREFIX = 'blobs/'
+
+
+def blob_name(digest, ext=''):
+    return f'{PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(PREFIX)
+
+
+def file_digest(content):
+    """
+    SHA-256 of a Django File. Uses the hash computed while streaming the
+    upload (main.uploads.StreamedUploadedFile) when there is one.
+    """
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    h = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        h.update(chunk)
+    content.seek(0)
+    return h.hexdigest()
+
+
+def content_name(name, content):
+    """The blob name `content` is stored under when saved as `name`."""
+    return blob_name(file_digest(content), os.path.splitext(name)[1])
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save(), so the
+        # upload_to name is never renamed. Blob names only get here when two
+        # identical uploads race (see _save).
+        if is_blob(name):
+            return super().get_available_name(name, max_length)
+        return name
+
+    def _save(self, name, content):
+        target = content_name(name, content)
+        if self.exists(target):
+            return target
+        saved = super()._save(target, content)
+        if saved != target:
+            # An identical upload landed first; keep that copy.
+            self.delete(saved)
+        return target
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def get_storage():
+    return content_addressed_storage
@@ -0,0 +1,26 @@
+from django import template
+from django.conf import settings
+
+from main import pagecache, replicas
+
+register = template.Library()
+
+
+@register.inclusion_tag('main/post_card.html', takes_context=True)
+def post_card(context, post, byline=True):
+    """
+    {% post_card post %} -> a feed card. Everything but the like button is
+    cached per post under pagecache.card_version(post) in the 'cards' cache
+    (a dummy one unless PAGE_CACHE_ENABLED); the like button is rendered
+    live, liked or not according to `liked_ids` in the context. Cards read
+    from a replica are not stored: it may not have the write that moved
+    the version yet.
+    """
+    return {
+        'p': post,
+        'byline': byline,
+        'liked': post.pk in context.get('liked_ids', ()),
+        'card_version': pagecache.card_version(post),
+        'card_cache': 'cards' if replicas.reads_from_primary() else 'uncached',
+        'card_timeout': settings.CARD_CACHE_TIMEOUT,
+    }
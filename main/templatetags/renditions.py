@@ -0,0 +1,22 @@
+from django import template
+
+from main import renditions
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(fieldfile, fmt='jpeg'):
+    """
+    {% srcset post.image 'webp' %} -> "…/320.webp 320w, …/640.webp 640w"
+    """
+    return renditions.srcset(fieldfile, fmt)
+
+
+@register.simple_tag
+def rendition(fieldfile, width, fmt='jpeg'):
+    """
+    {% rendition profile.profile_pic 160 %} -> URL of the closest rendition
+    at least 160px wide (or the original if none exist yet).
+    """
+    return renditions.url(fieldfile, int(width), fmt)
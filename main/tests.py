@@ -1,3 +1,1518 @@
-from django.test import TestCase
+import fcntl
+import os
+import random
+import re
+import runpy
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPServerDisconnected
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import mail
+from django.core.cache import CacheHandler, caches
+from django.core.cache.backends.redis import RedisCache
+from django.core.files import File
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+import numpy as np
+from PIL import Image
+from PIL.ExifTags import IFD
+
+from . import autocomplete, clusters, geo, geotag, live, outbox, pagecache, renditions, replicas, search, static, trending
+from .models import (
+    Blob, ChunkedUpload, Comment, GeotagJob, Like, Location, OutboundEmail, PhotographerProfile, Post,
+    RenditionJob, TrendingScore, TrendingState,
+)
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+class ExploreFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        cls.posts = [Post.objects.create(uploader=cls.user, title=f'Post {i}') for i in range(7)]
+        # Two posts share a timestamp, so the id has to break the tie.
+        Post.objects.filter(pk__in=[p.pk for p in cls.posts[2:4]]).update(created_at=cls.posts[2].created_at)
+
+    def test_cursor_round_trip(self):
+        post = self.posts[0]
+        self.assertEqual(decode_cursor(encode_cursor(post.created_at, post.pk)), (post.created_at, post.pk))
+        for token in ('', 'not-a-cursor', encode_cursor(post.created_at, post.pk)[:-3]):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(token)
+
+    def test_pages_walk_the_feed_once_newest_first(self):
+        seen, cursor = [], ''
+        while True:
+            data = self.client.get(reverse('explore_page'), {'cursor': cursor, 'size': 3}).json()
+            seen += [int(pk) for pk in re.findall(r'data-id="(\d+)" data-liked', data['html'])]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        expected = Post.objects.order_by('-created_at', '-id').values_list('pk', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_invalid_cursor_is_a_bad_request(self):
+        response = self.client.get(reverse('explore_page'), {'cursor': 'garbage!'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'invalid cursor'})
+
+
+class CounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        cls.ben = User.objects.create_user('ben', 'ben@example.com', 'pw')
+        cls.post = Post.objects.create(uploader=cls.ana, title='Fort at dusk')
+
+    def counts(self):
+        return Post.objects.filter(pk=self.post.pk).values_list('like_count', 'comment_count').get()
+
+    def test_create_and_delete_move_counters(self):
+        like = Like.objects.create(user=self.ana, post=self.post)
+        Like.objects.create(user=self.ben, post=self.post)
+        comment = Comment.objects.create(user=self.ben, post=self.post, text='Lovely')
+        self.assertEqual(self.counts(), (2, 1))
+        like.delete()
+        comment.delete()
+        self.assertEqual(self.counts(), (1, 0))
+
+    def test_deleting_twice_counts_once(self):
+        Like.objects.create(user=self.ana, post=self.post)
+        Like.objects.create(user=self.ben, post=self.post)
+        Comment.objects.create(user=self.ben, post=self.post, text='Lovely')
+        Comment.objects.create(user=self.ana, post=self.post, text='Thanks')
+        # Two requests that each loaded the same row before either deleted it.
+        for model in (Like, Comment):
+            first, second = model.objects.get(user=self.ben), model.objects.get(user=self.ben)
+            self.assertEqual(first.delete()[0], 1)
+            self.assertEqual(second.delete(), (0, {}))
+        self.assertEqual(self.counts(), (1, 1))
+
+    def test_deleting_a_user_uncounts_their_likes_and_comments(self):
+        Like.objects.create(user=self.ana, post=self.post)
+        Like.objects.create(user=self.ben, post=self.post)
+        Comment.objects.create(user=self.ben, post=self.post, text='Lovely')
+        Comment.objects.create(user=self.ben, post=self.post, text='Really')
+        self.ben.delete()
+        self.assertEqual(self.counts(), (1, 0))
+
+    def test_batch_unlike_and_sync_counters(self):
+        Like.objects.create(user=self.ben, post=self.post)
+        self.client.force_login(self.ben)
+        ops = [{'post_id': self.post.pk, 'action': 'unlike'}]
+        self.client.post(reverse('post_engagement'), {'ops': ops}, content_type='application/json')
+        self.assertEqual(self.counts(), (0, 0))
+
+        Comment.objects.create(user=self.ben, post=self.post, text='Lovely')
+        Post.objects.filter(pk=self.post.pk).update(like_count=5, comment_count=0)
+        out = StringIO()
+        call_command('sync_counters', stdout=out)
+        self.assertIn('fixed 1', out.getvalue())
+        self.assertEqual(self.counts(), (0, 1))
+
+
+@override_settings(TRENDING_HALF_LIFE_HOURS=24, TRENDING_LIKE_WEIGHT=2, TRENDING_COMMENT_WEIGHT=1)
+class TrendingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'u{i}', f'u{i}@example.com', 'pw') for i in range(3)]
+        cls.old = Post.objects.create(uploader=cls.users[0], title='Popular last week')
+        cls.new = Post.objects.create(uploader=cls.users[0], title='Liked just now')
+
+    def like(self, post, user, at):
+        like = Like.objects.create(user=user, post=post)
+        Like.objects.filter(pk=like.pk).update(created_at=at)
+
+    def score(self, post):
+        return TrendingScore.objects.get(post=post).score
+
+    def test_recent_engagement_outranks_decayed_engagement(self):
+        now = timezone.now()
+        for user in self.users:
+            self.like(self.old, user, now - timedelta(days=3))   # 3 likes x 2 / 8
+        self.like(self.new, self.users[0], now - timedelta(minutes=5))   # 1 like x 2
+        self.assertEqual(trending.refresh(now=now), 2)
+        self.assertEqual(trending.top_posts(), [self.new, self.old])
+        self.assertAlmostEqual(self.score(self.old) / self.score(self.new), 0.75 / 2, places=2)
+
+    def test_rows_are_counted_once_after_the_lag(self):
+        now = timezone.now()
+        self.like(self.old, self.users[0], now - timedelta(minutes=5))
+        # Stamped before the refresh, but too recently to be sure it has committed.
+        self.like(self.new, self.users[0], now - timedelta(seconds=10))
+        self.assertEqual(trending.refresh(now=now), 1)
+        self.assertFalse(TrendingScore.objects.filter(post=self.new).exists())
+
+        # A comment stamped inside the lag window, committed after the refresh.
+        Comment.objects.filter(pk=Comment.objects.create(user=self.users[1], post=self.new, text='!').pk).update(
+            created_at=now - timedelta(seconds=30)
+        )
+        self.assertEqual(trending.refresh(now=now + timedelta(minutes=5)), 1)
+        score = self.score(self.new)
+        self.assertEqual(trending.refresh(now=now + timedelta(minutes=10)), 0)
+        self.assertEqual(self.score(self.new), score)
+        self.assertEqual(TrendingState.objects.get().counted_until, now + timedelta(minutes=10) - trending.WATERMARK_LAG)
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        cls.fort = Location.objects.create(name='Golconda Fort', city='Hyderabad')
+        cls.in_description = Post.objects.create(uploader=user, title='Evening walk', description='Sunset over the fort walls')
+        cls.at_place = Post.objects.create(uploader=user, title='Stone steps', location=cls.fort)
+        cls.in_title = Post.objects.create(uploader=user, title='Fort gate')
+        cls.other = Post.objects.create(uploader=user, title='Beach', description='Waves')
+
+    def search(self, q, **kwargs):
+        return search.search_page(q, **kwargs)[0]
+
+    def test_title_beats_place_beats_description(self):
+        self.assertEqual(self.search('fort'), [self.in_title, self.at_place, self.in_description])
+
+    def test_prefixes_stems_and_every_term_must_match(self):
+        self.assertEqual(self.search('golc'), [self.at_place])
+        self.assertEqual(self.search('walls'), [self.in_description])
+        self.assertEqual(self.search('hyderabad steps'), [self.at_place])
+        self.assertEqual(self.search('fort beach'), [])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.fort.name = 'Charminar'
+        self.fort.save()
+        self.assertEqual(self.search('golconda'), [])
+        self.assertEqual(self.search('charminar'), [self.at_place])
+        self.in_title.delete()
+        self.assertEqual(self.search('fort'), [self.in_description])
+
+    def test_pages_by_offset(self):
+        page, cursor = search.search_page('fort', page_size=2)
+        self.assertEqual((page, cursor), ([self.in_title, self.at_place], '2'))
+        self.assertEqual(search.search_page('fort', cursor=cursor, page_size=2), ([self.in_description], None))
+        response = self.client.get(reverse('explore_page'), {'q': 'fort', 'cursor': '-1'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RenditionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.media = os.path.join(tmp.name, 'media')
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+        save_photo(os.path.join(self.tmp, 'red.jpg'), 'red')
+
+    def post(self):
+        with open(os.path.join(self.tmp, 'red.jpg'), 'rb') as f, self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(uploader=self.user, title='Red', image=File(f, name='red.jpg'))
+
+    def files(self, post):
+        folder = os.path.join(self.media, renditions.folder(post.image.name))
+        return sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+    def test_saving_queues_and_the_worker_builds(self):
+        post = self.post()
+        self.assertEqual(post.image_renditions, {})
+        self.assertTrue(RenditionJob.objects.filter(field_name='image', name=post.image.name).exists())
+
+        call_command('media_worker', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.image_renditions['source'], post.image.name)
+        self.assertEqual(self.files(post), ['320.jpg', '320.webp', '400.jpg', '400.webp'])
+        self.assertFalse(RenditionJob.objects.exists())
+
+    def test_jobs_are_leased_before_rendering(self):
+        post = self.post()
+        real_render, seen = renditions.render, []
+
+        def render(name, widths):
+            seen.append(RenditionJob.objects.get().claimed_until > timezone.now())
+            # Another row starts showing the file while the image is resized.
+            Post.objects.filter(pk=other.pk).update(image=name)
+            return real_render(name, widths)
+
+        other = Post.objects.create(uploader=self.user, title='Text only')
+        with mock.patch.object(renditions, 'render', render):
+            self.assertEqual(renditions.run_batch(), {'built': 1})
+        self.assertEqual(seen, [True])
+        self.assertEqual(Post.objects.get(pk=other.pk).image_renditions['source'], post.image.name)
+
+        RenditionJob.objects.create(field_name='image', name=post.image.name,
+                                    claimed_until=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(renditions.run_batch(), {})
+        RenditionJob.objects.update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(renditions.run_batch(), {'current': 1})
+        self.assertFalse(RenditionJob.objects.exists())
+
+    def test_same_bytes_reuse_built_renditions(self):
+        first = self.post()
+        call_command('media_worker', stdout=StringIO())
+        second = self.post()
+        self.assertFalse(RenditionJob.objects.exists())
+        second.refresh_from_db()
+        self.assertEqual(second.image_renditions['source'], first.image.name)
+
+    def test_forced_rebuild_overwrites_in_place(self):
+        post = self.post()
+        call_command('media_worker', stdout=StringIO())
+        before = self.files(post)
+        call_command('build_renditions', force=True, workers=1, stdout=StringIO())
+        self.assertEqual(self.files(post), before)
+
+    def test_renditions_go_with_the_blob(self):
+        post = self.post()
+        call_command('media_worker', stdout=StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertEqual(self.files(post), [])
+        self.assertFalse(os.path.exists(os.path.join(self.media, post.image.name)))
+
+
+class UploadLimitTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        self.client.force_login(self.user)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.enterContext(override_settings(MEDIA_ROOT=os.path.join(tmp.name, 'media')))
+
+    def upload(self, name, content, field='image'):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        with open(path, 'rb') as f:
+            return self.client.post(reverse('post_create'), {'title': 'Test', 'description': '', field: f})
+
+    def photo(self):
+        path = os.path.join(self.tmp, 'photo.jpg')
+        save_photo(path, 'red')
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_accepts_an_image(self):
+        response = self.upload('photo.jpg', self.photo())
+        self.assertRedirects(response, reverse('profile', args=['ravi']), fetch_redirect_response=False)
+        post = Post.objects.get()
+        self.assertEqual(Blob.objects.get(name=post.image.name).refcount, 1)
+
+    def test_rejects_a_file_that_is_not_the_type_it_claims(self):
+        response = self.upload('fake.jpg', b'MZ\x90\x00' + b'\x00' * 64)
+        self.assertIn('Unsupported file type (application/octet-stream).', response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.exists())
+
+    def test_rejects_a_video_in_the_image_field(self):
+        response = self.upload('clip.jpg', b'\x1a\x45\xdf\xa3' + b'\x00' * 64)
+        self.assertIn('Unsupported file type (video/webm).', response.context['form'].errors['image'])
+
+    @override_settings(UPLOAD_MAX_SIZES={'image': 1024, 'video': 1024, 'other': 1024})
+    def test_rejects_an_oversized_file(self):
+        response = self.upload('big.jpg', self.photo() + b'\x00' * 2048)
+        self.assertIn('File is too large (limit 1.0\xa0KB).', response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.exists())
+
+
+class ChunkedUploadTests(TestCase):
+    VIDEO = b'\x1a\x45\xdf\xa3' + bytes(range(256)) * 4
+
+    def setUp(self):
+        self.user = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        self.client.force_login(self.user)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=os.path.join(tmp.name, 'media'), CHUNKED_UPLOAD_DIR=os.path.join(tmp.name, 'parts'),
+        ))
+        response = self.client.post(
+            reverse('upload_create'),
+            headers={'Upload-Length': str(len(self.VIDEO)), 'Upload-Metadata': 'filename Y2xpcC53ZWJt'},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.url = response['Location']
+        self.upload = ChunkedUpload.objects.get()
+
+    def patch(self, offset, data):
+        return self.client.generic(
+            'PATCH', self.url, data, content_type='application/offset+octet-stream',
+            headers={'Upload-Offset': str(offset)},
+        )
+
+    def test_wrong_offset_is_a_conflict(self):
+        self.assertEqual(self.patch(0, self.VIDEO[:100]).status_code, 204)
+        response = self.patch(0, self.VIDEO[:100])
+        self.assertEqual((response.status_code, response['Upload-Offset']), (409, '100'))
+
+    def test_a_chunk_being_written_is_a_conflict(self):
+        os.makedirs(os.path.dirname(self.upload.path))
+        with open(self.upload.path, 'ab') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            response = self.patch(0, self.VIDEO[:100])
+        self.assertEqual((response.status_code, response['Upload-Offset']), (409, '0'))
+        self.assertEqual(self.patch(0, self.VIDEO[:100]).status_code, 204)
+
+    def test_resume_after_a_cut_off_chunk(self):
+        self.patch(0, self.VIDEO[:300])
+        # Bytes that reached disk without their offset being saved are dropped.
+        with open(self.upload.path, 'ab') as fh:
+            fh.write(b'garbage')
+        head = self.client.head(self.url)
+        self.assertEqual(head['Upload-Offset'], '300')
+        response = self.patch(300, self.VIDEO[300:])
+        self.assertEqual(response['Upload-Offset'], str(len(self.VIDEO)))
+        with open(self.upload.path, 'rb') as fh:
+            self.assertEqual(fh.read(), self.VIDEO)
+
+    def test_finalize_turns_a_complete_upload_into_a_post(self):
+        finalize = reverse('upload_finalize', args=[self.upload.pk])
+        self.patch(0, self.VIDEO[:500])
+        self.assertEqual(self.client.post(finalize, {'title': 'Clip'}).status_code, 409)
+        self.patch(500, self.VIDEO[500:])
+
+        data = self.client.post(finalize, {'title': 'Clip', 'description': ''}).json()
+        post = Post.objects.get(pk=data['post_id'])
+        self.assertEqual(post.video.read(), self.VIDEO)
+        self.assertEqual(ChunkedUpload.objects.get().post, post)
+        self.assertFalse(os.path.exists(self.upload.path))
+
+    def test_non_video_bytes_are_refused(self):
+        self.assertEqual(self.patch(0, b'\xff\xd8\xff' + bytes(100)).status_code, 415)
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+
+class BlobTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.media = os.path.join(tmp.name, 'media')
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+
+    def post(self, colour):
+        path = os.path.join(self.tmp, f'{colour}.jpg')
+        save_photo(path, colour)
+        with open(path, 'rb') as f:
+            return Post.objects.create(uploader=self.user, title=colour, image=File(f, name='photo.jpg'))
+
+    def stored(self, name):
+        return os.path.exists(os.path.join(self.media, name))
+
+    def test_identical_uploads_share_one_counted_blob(self):
+        first, second = self.post('red'), self.post('red')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(Blob.objects.get().refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(self.stored(second.image.name))
+        self.assertEqual(Blob.objects.get().refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(self.stored(second.image.name))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_replacing_an_image_releases_the_old_blob(self):
+        post = self.post('red')
+        old = post.image.name
+        save_photo(os.path.join(self.tmp, 'blue.jpg'), 'blue')
+        with open(os.path.join(self.tmp, 'blue.jpg'), 'rb') as f, self.captureOnCommitCallbacks(execute=True):
+            post.image = File(f, name='photo.jpg')
+            post.save()
+        self.assertFalse(self.stored(old))
+        self.assertEqual(list(Blob.objects.values_list('name', 'refcount')), [(post.image.name, 1)])
+
+    def test_reupload_before_the_delete_runs_keeps_the_file(self):
+        post = self.post('red')
+        with self.captureOnCommitCallbacks() as callbacks:
+            post.delete()
+            # The unused row is kept (at zero) until the file is gone.
+            self.assertEqual(Blob.objects.get().refcount, 0)
+            again = self.post('red')
+        for callback in callbacks:
+            callback()
+        self.assertTrue(self.stored(again.image.name))
+        self.assertEqual(Blob.objects.get().refcount, 1)
+
+
+@override_settings(MEDIA_SENDFILE_HEADER=None)
+class MediaServeTests(TestCase):
+    DATA = bytes(range(256)) * 4
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=tmp.name))
+        self.blob = 'blobs/ab/cd/abcd1234.mp4'
+        for name in ('clips/a.mp4', self.blob):
+            os.makedirs(os.path.join(tmp.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(tmp.name, name), 'wb') as f:
+                f.write(self.DATA)
+
+    def get(self, name='clips/a.mp4', **headers):
+        response = self.client.get(reverse('media', args=[name]), headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_whole_file(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, self.DATA))
+        self.assertEqual((response['Accept-Ranges'], response['Content-Length']), ('bytes', '1024'))
+
+    def test_byte_ranges(self):
+        response, body = self.get(Range='bytes=100-199')
+        self.assertEqual((response.status_code, body), (206, self.DATA[100:200]))
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1024')
+
+        response, body = self.get(Range='bytes=-24')
+        self.assertEqual((response['Content-Range'], body), ('bytes 1000-1023/1024', self.DATA[-24:]))
+
+        response, body = self.get(Range='bytes=1000-5000')
+        self.assertEqual((response['Content-Range'], body), ('bytes 1000-1023/1024', self.DATA[1000:]))
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(Range='bytes=2000-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */1024'))
+
+    def test_if_range(self):
+        etag = self.get()[0]['ETag']
+        response, body = self.get(Range='bytes=0-9', **{'If-Range': etag})
+        self.assertEqual((response.status_code, body), (206, self.DATA[:10]))
+        # The file changed since the client's copy: send all of it.
+        response, body = self.get(Range='bytes=0-9', **{'If-Range': '"stale"'})
+        self.assertEqual((response.status_code, body), (200, self.DATA))
+
+    def test_blobs_are_immutable(self):
+        response, _ = self.get(self.blob)
+        self.assertEqual(response['ETag'], '"abcd1234"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.get(self.blob, **{'If-None-Match': '"abcd1234"'})[0].status_code, 304)
+
+
+class CommentPagingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        cls.post = Post.objects.create(uploader=cls.user, title='Fort at dusk')
+        for i in range(5):
+            Comment.objects.create(user=cls.user, post=cls.post, text=f'c{i}')
+
+    def get(self, **params):
+        return self.client.get(reverse('get_comments', args=[self.post.pk]), {'page_size': 2, **params})
+
+    def texts(self, data):
+        return [c['text'] for c in data['comments']]
+
+    def test_pages_go_back_in_time(self):
+        first = self.get().json()
+        self.assertEqual(self.texts(first), ['c3', 'c4'])
+        older = self.get(cursor=first['next_cursor']).json()
+        self.assertEqual(self.texts(older), ['c1', 'c2'])
+        # Older pages don't move the newest comment seen.
+        self.assertIsNone(older['latest'])
+
+    def test_since_fetches_only_newer_comments(self):
+        latest = self.get().json()['latest']
+        nothing = self.get(since=latest).json()
+        self.assertEqual((self.texts(nothing), nothing['latest']), ([], latest))
+
+        for text in ('c5', 'c6', 'c7'):
+            Comment.objects.create(user=self.user, post=self.post, text=text)
+        newer = self.get(since=latest).json()
+        self.assertEqual(self.texts(newer), ['c5', 'c6'])
+        self.assertIsNotNone(newer['next_cursor'])
+        rest = self.get(since=newer['latest']).json()
+        self.assertEqual((self.texts(rest), rest['next_cursor'], rest['comment_count']), (['c7'], None, 8))
+
+    def test_invalid_since_is_a_bad_request(self):
+        self.assertEqual(self.get(since='nope').status_code, 400)
+
+
+@override_settings(ENGAGEMENT_MAX_POSTS=5, ENGAGEMENT_PREVIEW_COMMENTS=2)
+class EngagementTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        cls.ben = User.objects.create_user('ben', 'ben@example.com', 'pw')
+        cls.posts = [Post.objects.create(uploader=cls.ana, title=f'Post {i}') for i in range(3)]
+        for i in range(3):
+            Comment.objects.create(user=cls.ben, post=cls.posts[0], text=f'c{i}')
+        Like.objects.create(user=cls.ben, post=cls.posts[1])
+
+    def send(self, ops):
+        return self.client.post(reverse('post_engagement'), {'ops': ops}, content_type='application/json')
+
+    def test_state_for_a_page_of_posts(self):
+        self.client.force_login(self.ben)
+        ids = ','.join(str(p.pk) for p in self.posts) + ',0,x'
+        with self.assertNumQueries(5):   # session, user, counters, likes, comments
+            data = self.client.get(reverse('post_engagement'), {'ids': ids}).json()['posts']
+        self.assertEqual(set(data), {str(p.pk) for p in self.posts})
+        self.assertEqual([c['text'] for c in data[str(self.posts[0].pk)]['comments']], ['c1', 'c2'])
+        self.assertEqual(data[str(self.posts[0].pk)]['comment_count'], 3)
+        liked = data[str(self.posts[1].pk)]
+        self.assertEqual((liked['liked'], liked['like_count']), (True, 1))
+
+    def test_ops_apply_last_one_wins_and_resend_is_harmless(self):
+        self.client.force_login(self.ben)
+        first, second = self.posts[0].pk, self.posts[1].pk
+        ops = [
+            {'post_id': first, 'action': 'like'},
+            {'post_id': second, 'action': 'unlike'},
+            {'post_id': first, 'action': 'unlike'},
+            {'post_id': first, 'action': 'like'},
+            {'post_id': 0, 'action': 'like'},
+        ]
+        for _ in range(2):
+            data = self.send(ops).json()['posts']
+            self.assertEqual(
+                {pk: (state['liked'], state['like_count']) for pk, state in data.items()},
+                {str(first): (True, 1), str(second): (False, 0)},
+            )
+        self.assertEqual(list(Like.objects.values_list('post_id', flat=True)), [first])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.send([{'post_id': self.posts[0].pk, 'action': 'like'}]).status_code, 403)
+        self.client.force_login(self.ben)
+        self.assertEqual(self.send([{'post_id': self.posts[0].pk, 'action': 'toggle'}]).status_code, 400)
+        self.assertEqual(self.send([{'action': 'like'}]).status_code, 400)
+        self.assertEqual(self.send([{'post_id': 1, 'action': 'like'}] * 6).status_code, 400)
+        response = self.client.post(reverse('post_engagement'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pages'},
+    'cards': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pages'},
+    'uncached': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+@override_settings(PAGE_CACHE_ENABLED=True, CACHES=SHARED_CACHES)
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        cls.post = Post.objects.create(uploader=cls.ana, title='Fort at dusk')
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def get(self, name='explore', *args):
+        return self.client.get(reverse(name, args=args))
+
+    def test_hit_until_a_write_commits(self):
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(uploader=self.ana, title='Charminar at noon')
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Charminar at noon')
+
+    def test_writes_only_invalidate_their_scopes(self):
+        ben = User.objects.create_user('ben', 'ben@example.com', 'pw')
+        self.get('profile', 'ana'), self.get('profile', 'ben')
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=ben, post=self.post)
+        self.assertEqual(self.get('profile', 'ana')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('profile', 'ben')['X-Cache'], 'HIT')
+
+    def test_logged_in_visitors_are_not_served_cached_pages(self):
+        self.get()
+        self.client.force_login(self.ana)
+        response = self.get()
+        self.assertNotIn('X-Cache', response)
+        self.assertIn('private', response['Cache-Control'])
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    def test_off_without_a_shared_cache(self):
+        self.get()
+        self.assertNotIn('X-Cache', self.get())
+        with self.captureOnCommitCallbacks() as callbacks:
+            pagecache.invalidate(pagecache.FEED)
+        self.assertEqual(callbacks, [])
+
+
+@override_settings(PAGE_CACHE_ENABLED=True, CACHES=SHARED_CACHES)
+class CardCacheTests(TestCase):
+    template = Template('{% load cards %}{% post_card p %}')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', 'ana@example.com', 'pw')
+
+    def setUp(self):
+        caches['default'].clear()
+        self.post = Post.objects.create(uploader=self.ana, title='Fort at dusk')
+
+    def card(self):
+        post = Post.objects.select_related('uploader', 'location').get(pk=self.post.pk)
+        return self.template.render(Context({'p': post}))
+
+    def test_cached_until_the_post_scope_moves(self):
+        self.assertIn('Fort at dusk', self.card())
+        # A queryset update sends no signals: the cached card stays.
+        Post.objects.filter(pk=self.post.pk).update(title='Golconda')
+        self.assertIn('Fort at dusk', self.card())
+        with self.captureOnCommitCallbacks(execute=True):
+            pagecache.invalidate_cards([self.post.pk])
+        self.assertIn('Golconda', self.card())
+
+    def test_saving_the_post_changes_the_key(self):
+        self.card()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Golconda'
+            self.post.save()
+        self.assertIn('Golconda', self.card())
+
+    def test_counts_and_uploader_are_part_of_the_key(self):
+        before = pagecache.card_version(self.post)
+        self.assertIn('Comments (0)', self.card())
+        Comment.objects.create(user=self.ana, post=self.post, text='Lovely')
+        self.assertIn('Comments (1)', self.card())
+        with self.captureOnCommitCallbacks(execute=True):
+            pagecache.invalidate(pagecache.user_scope(self.ana.pk))
+        self.assertNotEqual(pagecache.card_version(self.post), before)
+
+
+@override_settings(PAGE_CACHE_ENABLED=True, CACHES=SHARED_CACHES)
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        cls.ben = User.objects.create_user('ben', 'ben@example.com', 'pw')
+        cls.post = Post.objects.create(uploader=cls.ana, title='Fort at dusk')
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_login(self.ben)
+
+    def test_profile_not_modified_until_it_changes(self):
+        url = reverse('profile', args=['ana'])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.ben, post=self.post, text='Lovely')
+        changed = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_profile_etag_depends_on_the_viewer(self):
+        url = reverse('profile', args=['ana'])
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.ana)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    def test_profile_not_modified_without_the_page_cache(self):
+        url = reverse('profile', args=['ana'])
+        changes = [
+            lambda: Like.objects.create(user=self.ben, post=self.post),
+            lambda: renditions.save(Post, self.post.pk, 'image', {'source': 'posts/x.jpg', 'widths': []}),
+            lambda: PhotographerProfile.objects.update_or_create(user=self.ana, defaults={'bio': 'Forts'}),
+            lambda: Post.objects.create(uploader=self.ana, title='Gate'),
+        ]
+        for change in changes:
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(3):   # session, user, the ETag query
+                self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+            change()
+            self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_comments_not_modified_after_one_query(self):
+        Comment.objects.create(user=self.ben, post=self.post, text='Lovely')
+        url = reverse('get_comments', args=[self.post.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):   # the ETag query; no session or user lookup
+            response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        Like.objects.create(user=self.ana, post=self.post)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+
+@override_settings(NEARBY_MAX_RESULTS=50, NEARBY_POSTS_PER_LOCATION=2, NEARBY_MAX_RADIUS_KM=100)
+class NearbyTests(TestCase):
+    # Charminar, Hyderabad
+    LAT, LNG = 17.3616, 78.4747
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        # ~1.1 km per 0.01 degree of latitude
+        cls.spots = [
+            Location.objects.create(name=f'{km} km north', latitude=cls.LAT + km / 111.2, longitude=cls.LNG)
+            for km in (3, 0.5, 8, 1.5)
+        ]
+        Location.objects.create(name='No coordinates')
+
+    def get(self, **params):
+        return self.client.get(reverse('nearby_spots'), {'lat': self.LAT, 'lng': self.LNG, **params})
+
+    def test_within_radius_nearest_first(self):
+        data = self.get(radius_km=5).json()['locations']
+        self.assertEqual([spot['name'] for spot in data], ['0.5 km north', '1.5 km north', '3 km north'])
+        self.assertAlmostEqual(data[0]['distance_km'], 0.5, places=2)
+        self.assertEqual(len(self.get(radius_km=5, limit=2).json()['locations']), 2)
+
+    def test_matches_a_full_scan_across_cell_edges(self):
+        rng = random.Random(7)
+        # Straddle the equator and the prime meridian, where geohash prefixes change most.
+        points = [(round(rng.uniform(-0.3, 0.3), 6), round(rng.uniform(-0.3, 0.3), 6)) for _ in range(300)]
+        Location.objects.bulk_create([
+            Location(name='r', latitude=lat, longitude=lng, geohash=geo.encode(lat, lng)) for lat, lng in points
+        ])
+        found = [(round(d, 6), loc.pk) for d, loc in geo.nearby(0.01, -0.01, 12, 1000)]
+        expected = sorted(
+            (round(geo.distance_km(0.01, -0.01, loc.latitude, loc.longitude), 6), loc.pk)
+            for loc in Location.objects.filter(name='r')
+            if geo.distance_km(0.01, -0.01, loc.latitude, loc.longitude) <= 12
+        )
+        self.assertGreater(len(expected), 20)
+        self.assertEqual(found, expected)
+
+    def test_newest_posts_per_spot(self):
+        spot = self.spots[1]
+        posts = [Post.objects.create(uploader=self.user, title=f'p{i}', location=spot) for i in range(3)]
+        data = self.get(radius_km=1).json()['locations']
+        self.assertEqual([p['id'] for p in data[0]['posts']], [posts[2].pk, posts[1].pk])
+
+    def test_bad_parameters(self):
+        for params in ({'lat': 91}, {'radius_km': 0}, {'radius_km': 101}, {'lng': 'east'}):
+            self.assertEqual(self.get(**params).status_code, 400)
+        self.assertEqual(self.client.get(reverse('nearby_spots')).status_code, 400)
+
+
+class ClusterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        rng = random.Random(3)
+        cls.spots = [
+            Location.objects.create(name=f'spot {i}', latitude=17 + rng.random(), longitude=78 + rng.random())
+            for i in range(40)
+        ]
+        cls.posts = [Post.objects.create(uploader=cls.user, title='p', location=spot) for spot in cls.spots[:30]]
+
+    def assertSameIndex(self, patched, rebuilt):
+        self.assertEqual(len(patched.levels), len(rebuilt.levels))
+        for a, b in zip(patched.levels, rebuilt.levels):
+            for name in ('keys', 'count', 'posts', 'ids'):
+                self.assertTrue(np.array_equal(getattr(a, name), getattr(b, name)), name)
+            self.assertTrue(np.allclose(a.sx, b.sx) and np.allclose(a.sy, b.sy))
+
+    def test_incremental_refresh_matches_a_full_rebuild(self):
+        index = clusters.ClusterIndex()
+        index.rebuild()
+
+        Post.objects.create(uploader=self.user, title='p', location=self.spots[35])   # appears on the map
+        self.posts[0].delete()                                                        # disappears
+        moved = self.posts[1]
+        moved.location = self.spots[2]                                                # one cell loses, one gains
+        moved.save()
+        self.spots[3].latitude = 17.5
+        self.spots[3].save()                                                          # changes cell
+        self.assertGreater(index.apply_changes(), 0)
+
+        rebuilt = clusters.ClusterIndex()
+        rebuilt.rebuild()
+        self.assertSameIndex(index, rebuilt)
+        for zoom in (3, 9, 12):
+            markers = [
+                sorted((round(lat, 6), round(lng, 6), *rest) for lat, lng, *rest in i.query(77.9, 16.9, 79.1, 18.1, zoom))
+                for i in (index, rebuilt)
+            ]
+            self.assertEqual(markers[0], markers[1])
+
+    def test_saving_a_post_reads_its_old_values_once(self):
+        post = self.posts[5]
+        post.location = self.spots[6]
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        lookups = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and '"main_post"."location_id"' in q['sql']]
+        self.assertEqual(len(lookups), 1)
+        self.assertIn('"main_post"."image"', lookups[0])
+
+
+@override_settings(AUTOCOMPLETE_REFRESH_SECONDS=0, AUTOCOMPLETE_DEFAULT_RESULTS=3, AUTOCOMPLETE_MAX_RESULTS=4)
+class AutocompleteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        cls.montmartre = Location.objects.create(name='Montmartre', city='Paris')
+        cls.mont_blanc = Location.objects.create(name='Mont Blanc', city='Chamonix')
+        cls.le_mont = Location.objects.create(name='Le Mont-Saint-Michel', city='Normandie')
+        cls.montreal = Location.objects.create(name='Vieux-Port', city='Montréal')
+        cls.cafe = Location.objects.create(name='Café de Flore', city='Paris')
+        for _ in range(2):
+            Post.objects.create(uploader=cls.user, title='p', location=cls.montreal)
+
+    def setUp(self):
+        self.enterContext(mock.patch.object(autocomplete, 'index', autocomplete.LocationIndex()))
+
+    def names(self, **params):
+        response = self.client.get(reverse('location_autocomplete'), params)
+        self.assertEqual(response.status_code, 200)
+        return [r['name'] for r in response.json()['results']]
+
+    def test_prefix_ranks_name_starts_then_posts(self):
+        self.assertEqual(self.names(q='mont', limit=4), ['Mont Blanc', 'Montmartre', 'Vieux-Port', 'Le Mont-Saint-Michel'])
+        self.assertEqual(self.names(q='mont'), ['Mont Blanc', 'Montmartre', 'Vieux-Port'])
+        self.assertEqual(self.names(q='mont', limit=50), self.names(q='mont', limit=4))
+
+    def test_every_word_must_match_name_or_city(self):
+        self.assertEqual(self.names(q='mont par'), ['Montmartre'])
+        self.assertEqual(self.names(q='saint mich'), ['Le Mont-Saint-Michel'])
+        self.assertEqual(self.names(q='xyz'), [])
+        self.assertEqual(self.names(q=''), [])
+
+    def test_accents_are_ignored_both_ways(self):
+        self.assertEqual(self.names(q='cafe'), ['Café de Flore'])
+        self.assertEqual(self.names(q='CAFÉ'), ['Café de Flore'])
+        self.assertEqual(self.names(q='montre'), ['Vieux-Port'])
+
+    def test_index_follows_edits(self):
+        self.names(q='mont')
+        self.cafe.name = 'Montparnasse'
+        self.cafe.save()
+        self.assertIn('Montparnasse', self.names(q='montp'))
+
+    def test_bad_limit_is_a_bad_request(self):
+        for limit in ('0', '-1', 'ten'):
+            response = self.client.get(reverse('location_autocomplete'), {'q': 'mont', 'limit': limit})
+            self.assertEqual(response.status_code, 400)
+
+
+@override_settings(METRICS_TOKEN='s3cret')
+class MetricsTests(TestCase):
+
+    def scrape(self, **headers):
+        return self.client.get(reverse('metrics'), headers=headers)
+
+    def sample(self, text, line):
+        found = re.search(r'^%s (\S+)$' % re.escape(line), text, re.M)
+        return float(found.group(1)) if found else 0.0
+
+    def test_only_staff_or_the_token(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(Authorization='Bearer nope').status_code, 403)
+        self.assertEqual(self.scrape(Authorization='Bearer s3cret').status_code, 200)
+        self.client.force_login(User.objects.create_user('ops', 'ops@example.com', 'pw', is_staff=True))
+        self.assertEqual(self.scrape().status_code, 200)
+
+    def test_requests_are_counted_per_route(self):
+        responses = 'photoshoot_http_responses_total{method="GET",status="200",view="explore"}'
+        queries = 'photoshoot_db_queries_per_request_count{view="explore"}'
+        before = self.scrape(Authorization='Bearer s3cret').content.decode()
+        self.client.get(reverse('explore'))
+        self.client.get(reverse('explore'))
+        after = self.scrape(Authorization='Bearer s3cret')
+        self.assertTrue(after['Content-Type'].startswith('text/plain'))
+        text = after.content.decode()
+        self.assertEqual(self.sample(text, responses) - self.sample(before, responses), 2)
+        self.assertEqual(self.sample(text, queries) - self.sample(before, queries), 2)
+        self.assertIn('photoshoot_http_request_duration_seconds_bucket{le="0.005",method="GET",view="explore"}', text)
+
+    def test_smtp_send_time_is_recorded(self):
+        sent = 'photoshoot_smtp_send_seconds_count{result="sent"}'
+        failed = 'photoshoot_smtp_send_seconds_count{result="failed"}'
+        before = self.scrape(Authorization='Bearer s3cret').content.decode()
+        outbox.enqueue('Booked', 'See you there', ['ana@example.com'])
+        outbox.enqueue('Booked', 'See you there', ['bounce@example.com'])
+        outbox.send_batch(connection=FlakyBackend())
+        text = self.scrape(Authorization='Bearer s3cret').content.decode()
+        self.assertEqual(self.sample(text, sent) - self.sample(before, sent), 1)
+        self.assertEqual(self.sample(text, failed) - self.sample(before, failed), 1)
+
+
+class CountingBackend(LocmemBackend):
+    """locmem backend that records how many connections were opened."""
+    opened = 0
+    is_open = False
+
+    def open(self):
+        if self.is_open:
+            return False
+        self.is_open = True
+        CountingBackend.opened += 1
+        return True
+
+    def close(self):
+        self.is_open = False
+
+
+class FlakyBackend(LocmemBackend):
+    """Fails for any message addressed to a 'bounce' recipient."""
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(r.startswith('bounce') for r in message.to):
+                raise SMTPServerDisconnected('connection dropped')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    OUTBOX_MAX_ATTEMPTS=3,
+    OUTBOX_BACKOFF_SECONDS=60,
+    OUTBOX_BACKOFF_MAX_SECONDS=600,
+)
+class OutboxTests(TestCase):
+
+    def test_booking_enqueues_without_sending(self):
+        photographer = User.objects.create_user('cam', 'cam@example.com', 'pw')
+        profile = PhotographerProfile.objects.create(user=photographer)
+        client = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        self.client.force_login(client)
+
+        response = self.client.post(reverse('book_photoshoot', args=[profile.id]), {
+            'date': '2026-11-01', 'event_type': 'Wedding', 'message': 'Hi!',
+        })
+
+        self.assertRedirects(response, reverse('profile', args=['cam']), fetch_redirect_response=False)
+        self.assertEqual(mail.outbox, [])
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.to, ['cam@example.com'])
+        self.assertEqual(email.reply_to, ['ana@example.com'])
+        self.assertEqual(email.status, OutboundEmail.PENDING)
+
+    @override_settings(EMAIL_BACKEND='main.tests.CountingBackend')
+    def test_worker_sends_batch_over_one_connection(self):
+        for i in range(5):
+            outbox.enqueue(f'Booking {i}', 'body', [f'p{i}@example.com'])
+        CountingBackend.opened = 0
+
+        call_command('send_outbox', batch_size=10, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.SENT).count(), 5)
+
+    def test_batch_size_and_due_time_respected(self):
+        for i in range(3):
+            outbox.enqueue('now', 'body', ['a@example.com'])
+        later = outbox.enqueue('later', 'body', ['a@example.com'])
+        later.next_attempt_at = timezone.now() + timedelta(hours=1)
+        later.save()
+
+        self.assertEqual(outbox.send_batch(batch_size=2), (2, 0, 0))
+        self.assertEqual(outbox.send_batch(batch_size=2), (1, 0, 0))
+        self.assertEqual(outbox.send_batch(batch_size=2), (0, 0, 0))
+        self.assertEqual(len(mail.outbox), 3)
+
+    @override_settings(EMAIL_BACKEND='main.tests.FlakyBackend')
+    def test_failures_back_off_then_dead_letter(self):
+        good = outbox.enqueue('ok', 'body', ['ok@example.com'])
+        bad = outbox.enqueue('bounce', 'body', ['bounce@example.com'])
+        now = timezone.now()
+
+        # One failure doesn't stop the rest of the batch.
+        self.assertEqual(outbox.send_batch(now=now), (1, 1, 0))
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual(good.status, OutboundEmail.SENT)
+        self.assertEqual(bad.attempts, 1)
+        self.assertEqual(bad.next_attempt_at, now + timedelta(seconds=60))
+        self.assertIn('connection dropped', bad.last_error)
+
+        # Not due yet.
+        self.assertEqual(outbox.send_batch(now=now + timedelta(seconds=30)), (0, 0, 0))
+
+        now += timedelta(seconds=60)
+        self.assertEqual(outbox.send_batch(now=now), (0, 1, 0))
+        bad.refresh_from_db()
+        self.assertEqual(bad.next_attempt_at, now + timedelta(seconds=120))
+
+        now += timedelta(seconds=120)
+        self.assertEqual(outbox.send_batch(now=now), (0, 0, 1))
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, OutboundEmail.DEAD)
+        self.assertEqual(bad.attempts, 3)
+        self.assertEqual(outbox.send_batch(now=now + timedelta(days=1)), (0, 0, 0))
+
+    def test_backoff_is_capped(self):
+        self.assertEqual(outbox.backoff(1), timedelta(seconds=60))
+        self.assertEqual(outbox.backoff(3), timedelta(seconds=240))
+        self.assertEqual(outbox.backoff(10), timedelta(seconds=600))
+
+
+class SeedDataTests(TestCase):
+
+    def seed(self, **options):
+        options = {'users': 30, 'profiles': 5, 'locations': 10, 'posts': 60, 'likes': 400, 'comments': 100, **options}
+        call_command('seed_data', stdout=StringIO(), **options)
+
+    def test_seeds_requested_rows_with_consistent_counters(self):
+        self.seed()
+        self.assertEqual(User.objects.filter(username__startswith='seed-').count(), 30)
+        self.assertEqual(PhotographerProfile.objects.count(), 5)
+        self.assertEqual(Location.objects.exclude(geohash='').count(), 10)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(0 < Like.objects.count() <= 400)
+        self.assertFalse(Post.objects.exclude(uploader__photographerprofile__isnull=False).exists())
+
+        counted = Post.objects.annotate(likes_n=Count('likes', distinct=True), comments_n=Count('comments', distinct=True))
+        for post in counted:
+            self.assertEqual((post.like_count, post.comment_count), (post.likes_n, post.comments_n))
+        for like in Like.objects.select_related('post')[:50]:
+            self.assertGreaterEqual(like.created_at, like.post.created_at)
+
+    def test_engagement_is_skewed(self):
+        self.seed(posts=200, likes=2000, comments=0)
+        counts = sorted(Post.objects.values_list('like_count', flat=True), reverse=True)
+        # The top 10% of posts get far more than 10% of the likes.
+        self.assertGreater(sum(counts[:20]), sum(counts) * 0.3)
+
+    def test_refuses_to_reuse_prefix(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+
+class ReplicaRouterTests(unittest.TestCase):
+    """
+    The primary is the test database and the replica a second SQLite file
+    holding deliberately different data, so each read shows where it went.
+    A plain TestCase: Django's test classes only allow the aliases in
+    settings.DATABASES, and this one is added on the fly.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = connections.configure_settings({
+            'default': connections.settings['default'],
+            'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.tmp.name, 'replica.sqlite3')},
+        })['replica']
+        with override_settings(DATABASE_ROUTERS=[]):
+            call_command('migrate', database='replica', verbosity=0)
+        cls.enterClassContext(override_settings(DATABASE_REPLICAS=['replica'], DATABASE_PIN_SECONDS=5))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        Location.objects.using('default').create(pk=1, name='primary copy')
+        Location.objects.using('replica').create(pk=1, name='replica copy')
+        for alias in ('default', 'replica'):
+            self.addCleanup(Location.objects.using(alias).filter(pk=1).delete)
+
+    def respond(self, request, write=False):
+        def view(request):
+            if write:
+                Location.objects.filter(pk=1).update(city='Goa')
+            return HttpResponse(Location.objects.get(pk=1).name)
+        return replicas.ReplicaMiddleware(view)(request)
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.respond(self.factory.get('/')).content, b'replica copy')
+        self.assertEqual(self.respond(self.factory.head('/')).content, b'replica copy')
+
+    def test_unsafe_requests_use_primary_and_pin(self):
+        response = self.respond(self.factory.post('/'), write=True)
+        self.assertEqual(response.content, b'primary copy')
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]['max-age'], 5)
+
+    def test_reads_after_a_write_in_the_same_request_use_primary(self):
+        response = self.respond(self.factory.get('/'), write=True)
+        self.assertEqual(response.content, b'primary copy')
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_pin_cookie_keeps_reads_on_primary_until_it_expires(self):
+        request = self.factory.get('/')
+        request.COOKIES[replicas.PIN_COOKIE] = str(time.time() + 5)
+        self.assertEqual(self.respond(request).content, b'primary copy')
+
+        request = self.factory.get('/')
+        request.COOKIES[replicas.PIN_COOKIE] = str(time.time() - 1)
+        self.assertEqual(self.respond(request).content, b'replica copy')
+
+        request = self.factory.get('/')
+        request.COOKIES[replicas.PIN_COOKIE] = 'junk'
+        self.assertEqual(self.respond(request).content, b'replica copy')
+
+    def test_outside_requests_and_transactions_use_primary(self):
+        self.assertEqual(Location.objects.get(pk=1).name, 'primary copy')
+
+        def view(request):
+            with transaction.atomic():
+                return HttpResponse(Location.objects.get(pk=1).name)
+        self.assertEqual(replicas.ReplicaMiddleware(view)(self.factory.get('/')).content, b'primary copy')
+
+    @override_settings(PAGE_CACHE_ENABLED=True, CACHES=SHARED_CACHES)
+    def test_page_cache_misses_render_from_primary(self):
+        @pagecache.cache_anonymous_page(lambda request: [pagecache.FEED])
+        def view(request):
+            return HttpResponse(Location.objects.get(pk=1).name)
+
+        def anonymous_get():
+            request = self.factory.get('/')
+            request.user, request.session = AnonymousUser(), {}
+            return replicas.ReplicaMiddleware(view)(request)
+
+        miss = anonymous_get()
+        self.assertEqual((miss['X-Cache'], miss.content), ('MISS', b'primary copy'))
+        hit = anonymous_get()
+        self.assertEqual((hit['X-Cache'], hit.content), ('HIT', b'primary copy'))
+
+    def test_cards_read_from_a_replica_are_not_stored(self):
+        seen = []
+
+        def view(request):
+            seen.append(replicas.reads_from_primary())
+            replicas.use_primary()
+            seen.append(replicas.reads_from_primary())
+            return HttpResponse()
+        replicas.ReplicaMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(seen, [False, True])
+        self.assertTrue(replicas.reads_from_primary())
+
+    def test_replicas_are_not_migrated(self):
+        router = replicas.ReplicaRouter()
+        self.assertFalse(router.allow_migrate('replica', 'main'))
+        self.assertTrue(router.allow_migrate('default', 'main'))
+
+
+class AsyncAjaxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        cls.post = Post.objects.create(uploader=cls.user, title='Fort at dusk')
+
+    async def test_like_toggles_and_keeps_count(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('like_post')
+
+        liked = await self.async_client.post(url, {'post_id': self.post.pk})
+        self.assertEqual(liked.json(), {'liked': True, 'count': 1})
+        unliked = await self.async_client.post(url, {'post_id': self.post.pk})
+        self.assertEqual(unliked.json(), {'liked': False, 'count': 0})
+        self.assertFalse(await Like.objects.aexists())
+
+        missing = await self.async_client.post(url, {'post_id': 0})
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_add_comment_then_fetch_with_etag(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(reverse('add_comment'), {'post_id': self.post.pk, 'comment': 'Lovely'})
+        self.assertEqual(response.json()['comment_count'], 1)
+
+        url = reverse('get_comments', args=[self.post.pk])
+        first = await self.async_client.get(url)
+        self.assertEqual([c['text'] for c in first.json()['comments']], ['Lovely'])
+        cached = await self.async_client.get(url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+        await Comment.objects.acreate(user=self.user, post=self.post, text='Again')
+        changed = await self.async_client.get(url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()['comments']), 2)
+
+        self.assertEqual((await self.async_client.get(reverse('get_comments', args=[0]))).status_code, 404)
+
+
+class StaticFilesTests(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with open(os.path.join(tmp.name, 'site.css'), 'w') as fh:
+            fh.write('body { margin: 0 }')
+        self.enterContext(override_settings(STATIC_ROOT=tmp.name, WHITENOISE_AUTOREFRESH=False))
+
+    def test_served_in_the_sync_stack(self):
+        response = self.client.get('/static/site.css')
+        self.assertEqual(b''.join(response.streaming_content), b'body { margin: 0 }')
+        self.assertEqual(response['Content-Type'], 'text/css; charset="utf-8"')
+
+    async def test_served_without_leaving_the_async_stack(self):
+        self.assertTrue(iscoroutinefunction(static.StaticFilesMiddleware(mock.AsyncMock())))
+        response = await self.async_client.get('/static/site.css')
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([block async for block in response]), b'body { margin: 0 }')
+
+        cached = await self.async_client.get('/static/site.css', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual((await self.async_client.get('/static/missing.css')).status_code, 404)
+
+
+class RecordingBroker(live.MemoryBroker):
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        super().publish(channel, message)
+
+
+@override_settings(LIVE_UPDATES=True, LIVE_BROKER='main.tests.RecordingBroker', LIVE_HEARTBEAT_SECONDS=0.05)
+class LiveUpdatesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ana', 'ana@example.com', 'pw')
+        cls.post = Post.objects.create(uploader=cls.user, title='Fort at dusk')
+
+    def setUp(self):
+        live.get_broker().published.clear()
+
+    def published(self):
+        return [(channel, message['event'], message['like_count'], message['comment_count'])
+                for channel, message in live.get_broker().published]
+
+    def test_comments_and_likes_are_published_on_commit(self):
+        channel = live.channel(self.post.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = Comment.objects.create(user=self.user, post=self.post, text='Lovely')
+            self.assertEqual(self.published(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.user, post=self.post)
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.delete()
+        self.assertEqual(self.published(), [
+            (channel, 'comment', 0, 1), (channel, 'counts', 1, 1), (channel, 'counts', 1, 0),
+        ])
+        self.assertEqual(live.get_broker().published[0][1]['comment']['text'], 'Lovely')
+
+    @override_settings(LIVE_UPDATES=False)
+    def test_nothing_is_published_without_streams(self):
+        self.client.force_login(self.user)
+        ops = [{'post_id': self.post.pk, 'action': 'like'}]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            comment = Comment.objects.create(user=self.user, post=self.post, text='Lovely')
+            self.client.post(reverse('post_engagement'), {'ops': ops}, content_type='application/json')
+            comment.delete()
+        self.assertEqual(self.published(), [])
+        self.assertNotIn(live.__name__, {callback.__module__ for callback in callbacks})
+
+    def test_batch_likes_are_published(self):
+        self.client.force_login(self.user)
+        ops = [{'post_id': self.post.pk, 'action': 'like'}]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post_engagement'), {'ops': ops}, content_type='application/json')
+        self.assertEqual(self.published(), [(live.channel(self.post.pk), 'counts', 1, 0)])
+
+    async def test_stream_sends_events_and_pings(self):
+        stream = live.stream([self.post.pk])
+        self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+        self.assertEqual(await anext(stream), ': ping\n\n')   # subscribed by now
+        live.get_broker().publish(live.channel(self.post.pk), {'event': 'counts', 'post': self.post.pk})
+        self.assertEqual(await anext(stream), f'event: counts\ndata: {{"event": "counts", "post": {self.post.pk}}}\n\n')
+        await stream.aclose()
+        self.assertEqual(live.get_broker()._subscribers, {})
+
+    def test_view_needs_asgi_and_valid_posts(self):
+        url = reverse('live_updates')
+        with self.settings(LIVE_UPDATES=False):
+            self.assertEqual(self.client.get(url, {'posts': self.post.pk}).status_code, 204)
+        with self.settings(LIVE_UPDATES=True):
+            self.assertEqual(self.client.get(url, {'posts': 'x'}).status_code, 400)
+            self.assertEqual(self.client.get(url).status_code, 400)
+
+
+def save_photo(path, colour, gps=None):
+    exif = Image.Exif()
+    if gps:
+        ifd = exif.get_ifd(IFD.GPSInfo)
+        for ref, value, tags in zip('NE', gps, ((1, 2), (3, 4))):
+            minutes = value % 1 * 60
+            ifd[tags[0]], ifd[tags[1]] = ref, (float(int(value)), float(int(minutes)), round(minutes % 1 * 60, 3))
+    Image.new('RGB', (400, 300), colour).save(path, exif=exif)
+
+
+class ImportShootTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cam', 'cam@example.com', 'pw')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=os.path.join(tmp.name, 'media')))
+        self.shoot = os.path.join(tmp.name, 'Golconda Fort')
+        os.makedirs(os.path.join(self.shoot, 'day2'))
+        save_photo(os.path.join(self.shoot, 'a.jpg'), 'red', gps=(17.3833, 78.4011))
+        save_photo(os.path.join(self.shoot, 'b.jpg'), 'green', gps=(17.3834, 78.4012))
+        save_photo(os.path.join(self.shoot, 'day2', 'c.png'), 'blue')
+        save_photo(os.path.join(self.shoot, 'day2', 'a-copy.jpg'), 'red', gps=(17.3833, 78.4011))
+        with open(os.path.join(self.shoot, 'broken.jpg'), 'wb') as f:
+            f.write(b'not an image')
+
+    def run_import(self):
+        out = StringIO()
+        call_command('import_shoot', self.shoot, user='cam', workers=1, batch_size=2, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_imports_posts_locations_and_renditions(self):
+        output = self.run_import()
+        posts = Post.objects.order_by('id')
+        self.assertEqual(posts.count(), 3)
+        self.assertEqual({post.title for post in posts}, {'Golconda Fort'})
+        location = Location.objects.get()
+        self.assertEqual((location.name, location.geohash[:5]), ('Golconda Fort', 'tepfb'))
+        self.assertEqual([post.location_id for post in posts], [location.pk, location.pk, None])
+        for post in posts:
+            self.assertEqual(post.image_renditions['source'], post.image.name)
+            self.assertEqual(Blob.objects.get(name=post.image.name).refcount, 1)
+        self.assertIn('1 duplicates, 1 invalid', output)
+
+    def test_rerun_skips_imported_photos_and_snaps_to_existing_location(self):
+        spot = Location.objects.create(name='Golconda', latitude=17.3835, longitude=78.4013)
+        self.run_import()
+        self.assertIn('3 already imported', self.run_import())
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(Location.objects.get(), spot)
+        self.assertEqual(Post.objects.filter(location=spot).count(), 2)
+
+
+class GeotagTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cam', 'cam@example.com', 'pw')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.enterContext(override_settings(MEDIA_ROOT=os.path.join(tmp.name, 'media')))
+        self.fort = Location.objects.create(name='Golconda Fort', latitude=17.3833, longitude=78.4011)
+
+    def post(self, colour, gps=None, **fields):
+        path = os.path.join(self.tmp, f'{colour}.jpg')
+        save_photo(path, colour, gps=gps)
+        with open(path, 'rb') as f, self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(uploader=self.user, title=colour, image=File(f, name='photo.jpg'), **fields)
+
+    def test_new_images_are_queued_once(self):
+        post = self.post('red')
+        self.assertTrue(GeotagJob.objects.filter(post=post).exists())
+        GeotagJob.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            post.title = 'Renamed'
+            post.save()
+        self.assertFalse(GeotagJob.objects.exists())
+
+    def test_positions_snap_fill_or_stay_as_suggestions(self):
+        near = self.post('red', gps=(17.3836, 78.4014))
+        blank_spot = Location.objects.create(name='Charminar')
+        fills = self.post('green', gps=(17.3616, 78.4747), location=blank_spot)
+        far = self.post('blue', gps=(12.9716, 77.5946))
+        no_gps = self.post('white')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            outcomes = geotag.run_batch()
+        self.assertEqual(outcomes, {geotag.SNAPPED: 1, geotag.FILLED: 1, geotag.SUGGESTED: 1, geotag.NO_GPS: 1})
+        self.assertFalse(GeotagJob.objects.exists())
+
+        near.refresh_from_db()
+        self.assertEqual(near.location, self.fort)
+        blank_spot.refresh_from_db()
+        self.assertEqual((float(blank_spot.latitude), blank_spot.geohash[:4]), (17.3616, 'tepf'))
+        far.refresh_from_db()
+        self.assertIsNone(far.location)
+        self.assertEqual((float(far.photo_latitude), float(far.photo_longitude)), (12.9716, 77.5946))
+        no_gps.refresh_from_db()
+        self.assertIsNone(no_gps.photo_latitude)
+        self.assertEqual(Location.objects.count(), 2)
+
+    def test_posts_are_leased_before_reading(self):
+        post = self.post('red', gps=(17.3836, 78.4014))
+        real_read, seen = geotag.read_position, []
+
+        def read_position(fieldfile):
+            seen.append(GeotagJob.objects.get().claimed_until > timezone.now())
+            # A new image is saved while the old one is read.
+            geotag.enqueue([post])
+            return real_read(fieldfile)
+
+        with mock.patch.object(geotag, 'read_position', read_position):
+            self.assertEqual(geotag.run_batch(), {geotag.SNAPPED: 1})
+        self.assertEqual(seen, [True])
+        self.assertIsNone(GeotagJob.objects.get(post=post).claimed_until)
+
+        GeotagJob.objects.update(claimed_until=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(geotag.run_batch(), {})
+        GeotagJob.objects.update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(geotag.run_batch(), {geotag.SUGGESTED: 1})
+        self.assertFalse(GeotagJob.objects.exists())
+
+    def test_command_backfills_and_drains_queue(self):
+        post = self.post('red', gps=(17.3836, 78.4014))
+        GeotagJob.objects.all().delete()
+        out = StringIO()
+        call_command('geotag_photos', backfill=True, stdout=out)
+        self.assertIn('1 snapped', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.location, self.fort)
+
+    def test_media_worker_drains_queue(self):
+        post = self.post('red', gps=(17.3836, 78.4014))
+        out = StringIO()
+        call_command('media_worker', stdout=out)
+        self.assertIn('Geotag: 1 snapped', out.getvalue())
+        self.assertFalse(GeotagJob.objects.exists())
+        post.refresh_from_db()
+        self.assertEqual(post.location, self.fort)
+
+
+def load_settings(**environ):
+    """photoshoot/settings.py evaluated afresh under `environ`."""
+    with mock.patch.dict(os.environ, environ):
+        return runpy.run_module('photoshoot.settings')
+
+
+class SettingsTests(unittest.TestCase):
+
+    def test_redis_url_backends_import(self):
+        configured = load_settings(REDIS_URL='redis://localhost:6379/0')
+        caches_ = CacheHandler(configured['CACHES'])
+        self.assertIsInstance(caches_['default'], RedisCache)
+        # Django only imports `redis` when the client is first used;
+        # get_client() builds it without connecting.
+        self.assertEqual(type(caches_['default']._cache.get_client()).__module__, 'redis.client')
+        broker = import_string(configured['LIVE_BROKER'])(configured['LIVE_REDIS_URL'])
+        self.assertIsInstance(broker, live.RedisBroker)
+
+    def test_page_cache_is_on_with_redis_url_only(self):
+        self.assertFalse(load_settings(REDIS_URL='')['PAGE_CACHE_ENABLED'])
+        configured = load_settings(REDIS_URL='redis://localhost:6379/0')
+        self.assertTrue(configured['PAGE_CACHE_ENABLED'])
+        cards = CacheHandler(configured['CACHES'])['cards']
+        self.assertIsInstance(cards, RedisCache)
+        self.assertEqual(type(cards._cache.get_client()).__module__, 'redis.client')
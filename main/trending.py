@@ -0,0 +1,136 @@
+"""
+Time-decayed trending scores.
+
+Every like or comment adds `weight * 2 ** ((t - epoch) / half_life)` to its
+post's TrendingScore. Because all scores share the same epoch, comparing the
+stored numbers gives the same order as comparing properly decayed scores at
+any moment, so a refresh only has to touch posts that got new engagement.
+The epoch is moved forward (and all scores rescaled once) before the numbers
+get large enough to lose float precision.
+
+Rows are picked up by created_at, each exactly once: a refresh counts what
+was created up to WATERMARK_LAG ago and moves the watermark there. Ids would
+not do as a watermark, since a row can commit after one with a higher id
+has already been counted.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Like, Comment, TrendingScore, TrendingState
+
+# Rebase once the newest events weigh 2**REBASE_AFTER times the epoch.
+REBASE_AFTER = 200
+# Scores whose decayed value drops below this are removed from the table.
+PRUNE_BELOW = 0.01
+# Only count rows created at least this long ago, so those committed late by
+# slow transactions are not skipped. Unlike clusters.py, which re-reads its
+# lag window, a refresh adds to the scores and must not see a row twice.
+WATERMARK_LAG = timedelta(seconds=60)
+
+
+def _half_life_seconds():
+    return getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24) * 3600
+
+
+def _weights():
+    return {
+        'like': getattr(settings, 'TRENDING_LIKE_WEIGHT', 2),
+        'comment': getattr(settings, 'TRENDING_COMMENT_WEIGHT', 1),
+    }
+
+
+def _growth(since, until):
+    """Number of half-lives between two datetimes."""
+    return (until - since).total_seconds() / _half_life_seconds()
+
+
+def _collect(model, since, until, epoch, weight, deltas, batch_size):
+    """
+    Add the weighted contribution of every `model` row created after `since`
+    (None: from the start) and up to `until` into deltas.
+    """
+    rows = model.objects.filter(created_at__lte=until).order_by('created_at', 'id')
+    if since is not None:
+        rows = rows.filter(created_at__gt=since)
+    last = None
+    while True:
+        batch = rows
+        if last is not None:
+            batch = batch.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+        batch = list(batch.values_list('id', 'post_id', 'created_at')[:batch_size])
+        if not batch:
+            return
+        for row_id, post_id, created_at in batch:
+            deltas[post_id] += weight * 2 ** _growth(epoch, created_at)
+        last = (batch[-1][2], batch[-1][0])
+
+
+def _rebase(state, now):
+    factor = 2 ** -_growth(state.epoch, now)
+    TrendingScore.objects.update(score=F('score') * factor)
+    state.epoch = now
+
+
+@transaction.atomic
+def refresh(now=None, batch_size=5000):
+    """
+    Fold Like/Comment rows created since the last watermark (and at least
+    WATERMARK_LAG before `now`) into TrendingScore. Returns the number of
+    posts whose score changed.
+    """
+    now = now or timezone.now()
+    state = TrendingState.objects.select_for_update().first()
+    if state is None:
+        state = TrendingState.objects.create(epoch=now)
+
+    if _growth(state.epoch, now) > REBASE_AFTER:
+        _rebase(state, now)
+
+    since = state.counted_until
+    until = now - WATERMARK_LAG
+    if since is not None and until < since:
+        until = since
+    weights = _weights()
+    deltas = defaultdict(float)
+    _collect(Like, since, until, state.epoch, weights['like'], deltas, batch_size)
+    _collect(Comment, since, until, state.epoch, weights['comment'], deltas, batch_size)
+    state.counted_until = until
+
+    if deltas:
+        existing = dict(
+            TrendingScore.objects.filter(post_id__in=deltas).values_list('post_id', 'score')
+        )
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(post_id=post_id, score=existing.get(post_id, 0) + delta, updated_at=now)
+                for post_id, delta in deltas.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['post'],
+            update_fields=['score', 'updated_at'],
+            batch_size=batch_size,
+        )
+
+    # Drop posts that have decayed to nothing so the table stays small.
+    TrendingScore.objects.filter(score__lt=PRUNE_BELOW * 2 ** _growth(state.epoch, now)).delete()
+
+    state.refreshed_at = now
+    state.save()
+    return len(deltas)
+
+
+def top_posts(limit=6):
+    """
+    The current top-N trending posts, read straight off the score index.
+    """
+    return [
+        row.post for row in
+        TrendingScore.objects
+        .select_related('post', 'post__uploader', 'post__location')
+        .order_by('-score', '-post_id')[:limit]
+    ]
@@ -0,0 +1,201 @@
+"""
+Streaming upload handling.
+
+StreamingUploadHandler replaces Django's memory/temp-file pair: every file
+part goes straight to a temporary file on disk, whatever its size, and while
+the chunks stream past it
+
+- hashes them (SHA-256, available as `upload.sha256`),
+- sniffs the real MIME type from the leading bytes (`upload.sniffed_type`),
+- enforces per-type size limits and per-field allowed types,
+
+aborting the request as soon as a limit is crossed instead of after the whole
+body has been received. Rejections are recorded on `request.upload_errors`
+({field_name: message}) for the view/form to report.
+"""
+import fcntl
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+MB = 1024 * 1024
+DEFAULT_MAX_SIZES = {
+    'image': 20 * MB,
+    'video': 200 * MB,
+    'other': 5 * MB,
+}
+
+# (offset, magic bytes, mime type); first match wins.
+SIGNATURES = (
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (8, b'WEBP', 'image/webp'),
+    (8, b'AVI ', 'video/x-msvideo'),
+    (4, b'ftypheic', 'image/heic'),
+    (4, b'ftypheix', 'image/heic'),
+    (4, b'ftypmif1', 'image/heif'),
+    (4, b'ftypavif', 'image/avif'),
+    (4, b'ftypqt', 'video/quicktime'),
+    (4, b'ftyp', 'video/mp4'),
+    (0, b'\x1a\x45\xdf\xa3', 'video/webm'),
+)
+SNIFF_BYTES = 16
+
+
+def sniff(head):
+    for offset, magic, mime in SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return mime
+    return 'application/octet-stream'
+
+
+def family(mime):
+    kind = mime.split('/', 1)[0]
+    return kind if kind in ('image', 'video') else 'other'
+
+
+class StreamedUploadedFile(TemporaryUploadedFile):
+    sha256 = None
+    sniffed_type = None
+
+
+class StreamingUploadHandler(FileUploadHandler):
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = StreamedUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+        self.digest = hashlib.sha256()
+        self.head = b''
+        self.limit = None
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.limit is None:
+            self.head += raw_data[:SNIFF_BYTES]
+            if len(self.head) >= SNIFF_BYTES:
+                self._check_type()
+
+        self.received += len(raw_data)
+        if self.limit is not None and self.received > self.limit:
+            self._reject(f"File is too large (limit {filesizeformat(self.limit)}).")
+
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.limit is None:
+            # Tiny file: fewer than SNIFF_BYTES arrived in total.
+            self._check_type()
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        self.file.content_type = self.file.sniffed_type
+        return self.file
+
+    def upload_interrupted(self):
+        self._discard()
+
+    def _check_type(self):
+        self.file.sniffed_type = sniff(self.head)
+        kind = family(self.file.sniffed_type)
+
+        allowed = getattr(settings, 'UPLOAD_ALLOWED_TYPES', {}).get(self.field_name)
+        if allowed and kind not in allowed:
+            self._reject(f"Unsupported file type ({self.file.sniffed_type}).")
+
+        self.limit = getattr(settings, 'UPLOAD_MAX_SIZES', DEFAULT_MAX_SIZES).get(kind, DEFAULT_MAX_SIZES[kind])
+        if self.content_length and self.content_length > self.limit:
+            self._reject(f"File is too large (limit {filesizeformat(self.limit)}).")
+
+    def _reject(self, message):
+        if not hasattr(self.request, 'upload_errors'):
+            self.request.upload_errors = {}
+        self.request.upload_errors[self.field_name] = message
+        self._discard()
+        # Stop reading the body right here rather than draining the rest.
+        raise StopUpload(connection_reset=True)
+
+    def _discard(self):
+        if hasattr(self, 'file'):
+            path = self.file.temporary_file_path()
+            try:
+                self.file.close()
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# -----------------------------
+# Resumable (tus-style) uploads
+# -----------------------------
+READ_SIZE = 64 * 1024
+
+
+class AssembledFile(File):
+    """
+    A finished ChunkedUpload. Exposes temporary_file_path() so
+    FileSystemStorage moves it into place instead of copying it.
+    """
+    def __init__(self, upload):
+        super().__init__(open(upload.path, 'rb'), name=upload.filename)
+        self.size = upload.length
+        self._path = upload.path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def append_chunk(upload, offset, stream):
+    """
+    Append the request body to the upload's file at `offset`, never writing
+    past upload.length, then advance the stored offset. Reads in small
+    pieces, so memory use does not depend on the chunk size.
+
+    No transaction or row lock is held while the body streams: an exclusive
+    lock on the file keeps concurrent PATCHes apart, and the offset only
+    moves with a conditional UPDATE from the offset the chunk was written at.
+    Returns the number of bytes written (the offset is advanced even if the
+    client disconnects part way), or None if another request holds the file
+    or has already moved the offset.
+    """
+    os.makedirs(os.path.dirname(upload.path), exist_ok=True)
+    uploads = type(upload).objects.filter(pk=upload.pk, offset=offset)
+    written = 0
+    with open(upload.path, 'ab') as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        if not uploads.exists():
+            return None
+        # Drop anything past the acknowledged offset (a chunk that was cut off
+        # after the bytes hit disk but before the offset was saved).
+        fh.truncate(offset)
+        try:
+            while offset + written < upload.length:
+                data = stream.read(min(READ_SIZE, upload.length - offset - written))
+                if not data:
+                    break
+                if offset == 0 and written == 0:
+                    upload.content_type = sniff(data[:SNIFF_BYTES])
+                fh.write(data)
+                written += len(data)
+        finally:
+            fh.flush()
+            advanced = uploads.update(
+                offset=offset + written, content_type=upload.content_type, updated_at=timezone.now()
+            )
+    if not advanced:
+        return None
+    upload.offset = offset + written
+    return written
@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.explore, name='explore'),
+    path('explore/page/', views.explore_page, name='explore_page'),  # infinite scroll
     path('post/new/', views.post_create, name='post_create'),
     path('post/<int:pk>/', views.post_detail, name='post_detail'),
     path('profile/<str:username>/', views.profile, name='profile'),
@@ -13,9 +14,18 @@ urlpatterns = [
     path('logout/', views.user_logout, name='logout'),
     path('edit-profile/', views.edit_profile, name='edit_profile'),
     path("get-comments/<int:post_id>/", views.get_comments, name="get_comments"),
+    path('engagement/', views.post_engagement, name='post_engagement'),  # batch state + like/unlike ops
+    path('live/', views.live_updates, name='live_updates'),  # SSE: new comments and counts
+    path('nearby/', views.nearby_spots, name='nearby_spots'),
+    path('map/clusters/', views.map_clusters, name='map_clusters'),
+    path('locations/autocomplete/', views.location_autocomplete, name='location_autocomplete'),
     # path('comment/', views.add_comment, name='add_comment'),
     path('book_photoshoot/<int:profile_id>/', views.book_photoshoot, name='book_photoshoot'),
     path('delete-post/<int:pk>/', views.delete_post, name='delete_post'),
+    # resumable video uploads
+    path('uploads/', views.upload_create, name='upload_create'),
+    path('uploads/<uuid:upload_id>/', views.upload_detail, name='upload_detail'),
+    path('uploads/<uuid:upload_id>/finalize/', views.upload_finalize, name='upload_finalize'),
 
 
 
@@ -5,6 +5,8 @@ from django.contrib import messages
 from django.contrib.auth import login, authenticate, logout as auth_logout
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponseBadRequest
+from django.template.loader import render_to_string
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
 from django.db.models import Count, F, ExpressionWrapper, IntegerField, Q
@@ -468,18 +470,33 @@ def book_photoshoot(request, profile_id):
         
 
         # main/views.py
+import hashlib
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.contrib.auth import login, authenticate, logout as auth_logout
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import Http404, JsonResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.conf import settings
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
-from django.db.models import Count, F, ExpressionWrapper, IntegerField, Q
+from django.db.models import Count, F, ExpressionWrapper, IntegerField, Max, Q
 
 from .models import Post, Location, Like, Comment, PhotographerProfile
 from .forms import PostForm, CommentForm, SignUpForm, PhotographerProfileForm
+from .pagination import (
+    InvalidCursor, akeyset_page, akeyset_page_after, encode_cursor, get_page_size, keyset_page,
+)
+from . import autocomplete, clusters, engagement, geo, live, pagecache
+from .renditions import url as rendition_url
+from .search import search_page
+from .trending import top_posts
 
 # -----------------------------
 # Helper / Home views
@@ -525,48 +542,79 @@ from .forms import PostForm, CommentForm, SignUpForm, PhotographerProfileForm
 
 
 
-def explore(request):
-    q = request.GET.get('q', '').strip()
+def _feed_page(q, cursor=None, page_size=12):
+    """
+    One page of the explore feed: ranked full-text results when searching,
+    otherwise newest-first keyset pages.
+    """
+    if q:
+        return search_page(q, cursor=cursor, page_size=page_size)
+    posts = Post.objects.select_related('uploader', 'location')
+    return keyset_page(posts, cursor=cursor, page_size=page_size)
 
-    posts = (
-        Post.objects
-        .select_related('uploader', 'location')
-        .annotate(
-            like_count=Count('likes', distinct=True),
-            comment_count=Count('comments', distinct=True)
-        )
-    )
 
-    if q:
-        posts = posts.filter(
-            Q(location__name__icontains=q) |
-            Q(location__city__icontains=q) |
-            Q(title__icontains=q) |
-            Q(description__icontains=q)
-        )
+def _liked_ids(user, posts):
+    """
+    Which of these posts the user has liked, in one query (rendered live on the cards).
+    """
+    if not user.is_authenticated:
+        return set()
+    return set(Like.objects.filter(user=user, post__in=posts).values_list('post_id', flat=True))
 
-    posts = posts.order_by('-created_at')
 
-    trending = (
-        Post.objects
-        .annotate(
-            like_count=Count('likes', distinct=True),
-            comment_count=Count('comments', distinct=True),
-            score=ExpressionWrapper(
-                F('like_count') * 2 + F('comment_count'),
-                output_field=IntegerField()
-            )
-        )
-        .order_by('-score', '-created_at')[:6]
-    )
+def _feed_scopes(request):
+    return [pagecache.FEED]
+
+
+def _profile_scopes(request, username):
+    user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+    return user_id and [pagecache.profile_scope(user_id)]
+
+
+@pagecache.cache_anonymous_page(_feed_scopes)
+def explore(request):
+    q = request.GET.get('q', '').strip()
+
+    # Only the first page is rendered here; the rest is pulled in by
+    # explore_page as the user scrolls.
+    posts, next_cursor = _feed_page(q, page_size=get_page_size(None))
+
+    # Precomputed by `manage.py refresh_trending`; see main/trending.py
+    trending = top_posts(6)
 
     return render(request, 'main/explore.html', {
         'posts': posts,
+        'next_cursor': next_cursor,
         'trending': trending,
+        'liked_ids': _liked_ids(request.user, list(posts) + list(trending)),
         'query': q
     })
 
 
+@pagecache.cache_anonymous_page(_feed_scopes)
+def explore_page(request):
+    """
+    Infinite-scroll fragment for the explore feed.
+    Expects ?cursor=<token> (and optional q, size).
+    Returns JSON: { 'html': str, 'next_cursor': str|null }
+    """
+    q = request.GET.get('q', '').strip()
+    try:
+        posts, next_cursor = _feed_page(
+            q,
+            cursor=request.GET.get('cursor') or None,
+            page_size=get_page_size(request.GET.get('size')),
+        )
+    except InvalidCursor:
+        return JsonResponse({'error': 'invalid cursor'}, status=400)
+
+    html = render_to_string('main/post_cards.html', {
+        'posts': posts,
+        'liked_ids': _liked_ids(request.user, posts),
+    }, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+
 
 
 # -----------------------------
@@ -579,7 +627,9 @@ def post_create(request):
     Make sure the form in template uses enctype="multipart/form-data".
     """
     if request.method == 'POST':
-        form = PostForm(request.POST, request.FILES)
+        # Files arrive as disk-backed StreamedUploadedFile objects (main/uploads.py);
+        # anything rejected mid-stream is reported through upload_errors.
+        form = PostForm(request.POST, request.FILES, upload_errors=getattr(request, 'upload_errors', None))
         if form.is_valid():
             p = form.save(commit=False)
             p.uploader = request.user
@@ -601,9 +651,9 @@ def post_detail(request, pk):
     """
     post = get_object_or_404(Post.objects.select_related('uploader', 'location'), pk=pk)
     comment_form = CommentForm()
-    # Preload comments and likes count to reduce DB queries in template
+    # Preload comments to reduce DB queries in template
     comments = post.comments.select_related('user').order_by('created_at')
-    like_count = post.likes.count()
+    like_count = post.like_count
     context = {
         'post': post,
         'comment_form': comment_form,
@@ -617,11 +667,14 @@ def post_detail(request, pk):
 # Like / Comment endpoints (AJAX)
 # -----------------------------
 @login_required
-def like_post(request):
+async def like_post(request):
     """
     Toggle like/unlike via AJAX POST.
     Expects 'post_id' in POST body.
     Returns JSON: { 'liked': bool, 'count': int }
+
+    Async: the handful of queries are awaited with the async ORM, so under
+    ASGI a worker serves other requests while these wait on the database.
     """
     if request.method != 'POST':
         return HttpResponseBadRequest('Invalid request method.')
@@ -630,17 +683,24 @@ def like_post(request):
     if not post_id:
         return JsonResponse({'error': 'post_id required'}, status=400)
 
-    post = get_object_or_404(Post, id=post_id)
+    post = await _aget_post(post_id)
+    user = await request.auser()
 
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
-    if not created:
+    # The Like signal handlers keep post.like_count in step; delete() is a
+    # no-op (and leaves the count alone) if a concurrent unlike got there first.
+    like = await Like.objects.filter(user=user, post=post).afirst()
+    if like:
         # Like existed: remove it (toggle off)
-        like.delete()
+        await like.adelete()
         liked = False
     else:
+        try:
+            await Like.objects.acreate(user=user, post=post)
+        except IntegrityError:
+            pass  # a concurrent request liked it first
         liked = True
+    count = await Post.objects.filter(pk=post.pk).values_list('like_count', flat=True).aget()
 
-    count = post.likes.count()
     return JsonResponse({'liked': liked, 'count': count})
 
 
@@ -779,7 +839,7 @@ from .models import Post, Comment  # Adjust import based on your app
 
 
 @login_required
-def add_comment(request):
+async def add_comment(request):
     """
     Add a comment via AJAX POST (supports JSON and form-data).
     Returns JSON with new comment info + updated comment count.
@@ -805,22 +865,17 @@ def add_comment(request):
     if not post_id or not text:
         return JsonResponse({"error": "post_id and comment are required."}, status=400)
 
-    post = get_object_or_404(Post, id=post_id)
+    post = await _aget_post(post_id)
+    user = await request.auser()
 
-    # Create comment
-    comment = Comment.objects.create(
-        user=request.user,
-        post=post,
-        text=text
-    )
-
-    # Updated live comment count
-    comment_count = post.comments.count()
+    # Create comment (post_save bumps post.comment_count in the same transaction)
+    comment = await Comment.objects.acreate(user=user, post=post, text=text)
+    comment_count = await Post.objects.filter(pk=post.pk).values_list('comment_count', flat=True).aget()
 
     # Response sent to frontend
     return JsonResponse({
         "success": True,
-        "user": request.user.username,
+        "user": user.username,
         "comment": comment.text,
         "created": comment.created_at.strftime("%d %b %Y %H:%M"),
         "comment_count": comment_count
@@ -847,22 +902,47 @@ def add_comment(request):
 # main/views.py (replace profile view)
 from django.db.models import Count
 
+def _profile_etag(request, username):
+    """
+    Changes whenever the profile page can: a post comes or goes, a post or
+    the profile is saved or its counters or renditions move (all of which
+    set updated_at). One query on the uploader's posts and the profile row;
+    nothing is rendered. With the page cache on, every such write already
+    moves the profile's pagecache version (see main/signals.py), so the
+    version is read instead, from the cache.
+    """
+    users = User.objects.filter(username=username)
+    if settings.PAGE_CACHE_ENABLED:
+        row = users.values_list('id', flat=True).first()
+    else:
+        row = (
+            users.annotate(post_count=Count('posts'), last_post=Max('posts__updated_at'))
+            .values_list('id', 'post_count', 'last_post', 'photographerprofile__updated_at')
+            .first()
+        )
+    if row is None or pagecache.has_pending_messages(request):
+        return None
+    if settings.PAGE_CACHE_ENABLED:
+        scopes = [pagecache.profile_scope(row)]
+        if request.user.is_authenticated:
+            scopes.append(pagecache.user_scope(request.user.pk))
+        parts = pagecache.versions(*scopes)
+    else:
+        parts = [str(row)]
+    parts.append(str(request.user.pk))
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+@condition(etag_func=_profile_etag)
+@pagecache.cache_anonymous_page(_profile_scopes)
 def profile(request, username):
     """
     Show a user's profile and their posts.
-    Annotate each post with like/comment counts so template can show them.
+    Like/comment counts come from the denormalized columns on Post.
     """
     owner = get_object_or_404(User, username=username)
 
-    posts = (
-        owner.posts
-        .select_related('location')
-        .annotate(
-            likes_count=Count('likes', distinct=True),
-            comments_count=Count('comments', distinct=True)
-        )
-        .order_by('-created_at')
-    )
+    posts = owner.posts.select_related('location').order_by('-created_at')
 
     profile = PhotographerProfile.objects.filter(user=owner).first()
     return render(request, 'main/profile.html', {'owner': owner, 'posts': posts, 'profile': profile})
@@ -924,6 +1004,14 @@ def edit_profile(request):
     profile = PhotographerProfile.objects.get_or_create(user=request.user)[0]
 
     if request.method == "POST":
+        upload_errors = getattr(request, 'upload_errors', {})
+        if upload_errors:
+            # The streaming handler aborted the upload, so the rest of the form
+            # may be incomplete too; don't save anything.
+            for message in upload_errors.values():
+                messages.error(request, message)
+            return redirect('edit_profile')
+
         profile.bio = request.POST.get("bio")
         profile.contact = request.POST.get("contact")
         profile.portfolio_link = request.POST.get("portfolio_link")
@@ -968,28 +1056,230 @@ from django.http import JsonResponse
 
 
 
-def get_comments(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.select_related('user').order_by('created_at')
-    like_count = post.likes.count()  # <-- fetch like count from DB
-    comment_count = comments.count()
-
+def nearby_spots(request):
+    """
+    Locations within ?radius_km of ?lat/?lng, nearest first, each with its
+    newest posts. See main/geo.py for how the lookup stays an index scan.
+    """
+    try:
+        lat, lng, radius, limit = geo.parse_point(request.GET)
+    except (KeyError, ValueError) as exc:
+        return JsonResponse({"error": f"Invalid parameters: {exc}"}, status=400)
 
+    spots = geo.nearby(lat, lng, radius, limit)
+    posts = geo.recent_posts([loc.pk for _, loc in spots], settings.NEARBY_POSTS_PER_LOCATION)
     return JsonResponse({
-        "like_count": like_count,
-        "comment_count": comment_count,
-        "comments": [
+        "locations": [
             {
-                "user": c.user.username,
-                "text": c.text,
-                "created": c.created_at.strftime("%d %b %Y %H:%M"),
-                "profile_pic_url": c.user.photographerprofile.profile_pic.url if hasattr(c.user, 'photographerprofile') and c.user.photographerprofile.profile_pic else None
+                "id": loc.id,
+                "name": loc.name,
+                "city": loc.city,
+                "lat": float(loc.latitude),
+                "lng": float(loc.longitude),
+                "distance_km": round(distance, 3),
+                "posts": [
+                    {
+                        "id": p.id,
+                        "title": p.title,
+                        "url": reverse('post_detail', args=[p.id]),
+                        "thumbnail": rendition_url(p.image, 320) if p.image else None,
+                    }
+                    for p in posts[loc.pk]
+                ],
             }
-            for c in comments
+            for distance, loc in spots
         ]
     })
 
 
+def map_clusters(request):
+    """
+    Map markers for ?bbox=west,south,east,north at ?zoom: one marker per
+    occupied grid cell on screen, either a cluster (count > 1) or a single
+    location. See main/clusters.py.
+    """
+    try:
+        west, south, east, north, zoom = clusters.parse_bbox(request.GET)
+        markers = clusters.index.query(west, south, east, north, zoom)
+    except (KeyError, ValueError) as exc:
+        return JsonResponse({"error": f"Invalid parameters: {exc}"}, status=400)
+
+    names = dict(
+        Location.objects.filter(pk__in=[m[4] for m in markers if m[4]]).values_list('id', 'name')
+    )
+    return JsonResponse({
+        "zoom": zoom,
+        "markers": [
+            {"type": "location", "id": pk, "name": names.get(pk, ""), "lat": lat, "lng": lng, "posts": posts}
+            if pk else
+            {"type": "cluster", "count": count, "lat": lat, "lng": lng, "posts": posts}
+            for lat, lng, count, posts, pk in markers
+        ],
+    })
+
+def location_autocomplete(request):
+    """
+    Locations whose name/city words start with the words of ?q, best first,
+    at most ?limit of them. Served from an in-memory index
+    (main/autocomplete.py); backs the location field of PostForm.
+    """
+    try:
+        query, limit = autocomplete.parse_query(request.GET)
+    except ValueError as exc:
+        return JsonResponse({"error": f"Invalid parameters: {exc}"}, status=400)
+
+    return JsonResponse({
+        "results": [
+            {"id": pk, "name": name, "city": city, "label": autocomplete.label(name, city)}
+            for pk, name, city in autocomplete.index.search(query, limit)
+        ]
+    })
+
+async def _aget_post(post_id):
+    """
+    get_object_or_404(Post, id=post_id) for async views.
+    """
+    try:
+        return await Post.objects.aget(id=post_id)
+    except (Post.DoesNotExist, ValueError):
+        raise Http404("No Post matches the given query.")
+
+
+async def _comments_etag(request, post_id):
+    """
+    Changes whenever the get_comments response can: a comment is added or
+    deleted or the like count moves. One query on the post row and the
+    (post, created_at, id) comment index; no comments are loaded.
+    """
+    row = await (
+        Post.objects.filter(pk=post_id)
+        .annotate(last_comment=Max('comments__id'))
+        .values_list('like_count', 'comment_count', 'last_comment')
+        .afirst()
+    )
+    if row is None:
+        return None
+    return quote_etag(hashlib.md5(f'{row}|{request.GET.urlencode()}'.encode()).hexdigest())
+
+
+@cache_control(no_cache=True)
+async def get_comments(request, post_id):
+    """
+    A page of comments on a post, oldest first within the page.
+
+    - no cursor: the newest COMMENTS_PAGE_SIZE comments
+    - ?cursor=<next_cursor>: the page of older comments before those
+    - ?since=<latest>: comments posted after `latest` (refreshing an open popup)
+
+    `latest` in the response is the newest comment seen so far; pass it back
+    as `since`. In `since` mode `next_cursor` means more new comments wait.
+
+    Answers If-None-Match with a 304 after the one ETag query. (Django's
+    @condition would run that query synchronously inside the event loop.)
+    """
+    etag = await _comments_etag(request, post_id)
+    if etag is None:
+        raise Http404("No Post matches the given query.")
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = await _comments_page(request, post_id)
+    response.headers.setdefault('ETag', etag)
+    return response
+
+
+async def _comments_page(request, post_id):
+    post = await _aget_post(post_id)
+    page_size = get_page_size(
+        request.GET.get('page_size'), settings.COMMENTS_PAGE_SIZE, settings.COMMENTS_MAX_PAGE_SIZE
+    )
+    comments = post.comments.select_related('user__photographerprofile')
+    since = request.GET.get('since')
+    try:
+        if since:
+            rows, next_cursor = await akeyset_page_after(comments, since, page_size)
+        else:
+            rows, next_cursor = await akeyset_page(comments, request.GET.get('cursor'), page_size)
+            rows.reverse()
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor."}, status=400)
+
+    latest = since
+    if rows and (since or not request.GET.get('cursor')):
+        latest = encode_cursor(rows[-1].created_at, rows[-1].pk)
+
+    return JsonResponse({
+        "like_count": post.like_count,
+        "comment_count": post.comment_count,
+        "next_cursor": next_cursor,
+        "latest": latest,
+        "comments": [live.comment_json(c) for c in rows],
+    })
+
+
+def post_engagement(request):
+    """
+    Engagement state for a batch of posts, e.g. every card on a feed page.
+
+    GET  ?ids=1,2,3
+    POST {"ops": [{"post_id": 1, "action": "like"}, {"post_id": 2, "action": "unlike"}]}
+         applies queued like/unlike operations (last one per post wins), then
+         returns the state of those posts.
+
+    Response: {"posts": {"<id>": {"liked", "like_count", "comment_count", "comments"}}}
+    """
+    if request.method == 'POST':
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Login required."}, status=403)
+        try:
+            payload = json.loads(request.body.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return JsonResponse({"error": "Invalid JSON."}, status=400)
+        try:
+            wanted = engagement.parse_ops(payload.get('ops') if isinstance(payload, dict) else None)
+        except engagement.InvalidOps as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        try:
+            post_ids = engagement.apply_like_ops(request.user, wanted)
+        except IntegrityError:
+            return JsonResponse({"error": "Conflicting update, please retry."}, status=409)
+    elif request.method == 'GET':
+        post_ids = engagement.parse_ids(request.GET.get('ids', ''))
+    else:
+        return HttpResponseBadRequest("Invalid request method.")
+
+    posts = engagement.state(request.user, post_ids)
+    return JsonResponse({
+        "posts": {
+            str(pk): dict(data, comments=[live.comment_json(c) for c in data['comments']])
+            for pk, data in posts.items()
+        }
+    })
+
+
+async def live_updates(request):
+    """
+    Server-Sent Events for a set of posts, e.g. every card on a feed page:
+
+    GET ?posts=1,2,3
+
+    event: comment  {"post", "comment", "latest", "like_count", "comment_count"}
+    event: counts   {"post", "like_count", "comment_count"}
+
+    Answers 204 (EventSource then stops retrying) when LIVE_UPDATES is off,
+    i.e. not running under ASGI.
+    """
+    if not settings.LIVE_UPDATES:
+        return HttpResponse(status=204)
+    try:
+        post_ids = live.parse_posts(request.GET)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    response = StreamingHttpResponse(live.stream(post_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx hold events back
+    return response
+
+
 
 
 
@@ -1038,7 +1328,7 @@ from .models import PhotographerProfile  # Assuming your profile model is named
 
 
 
-from django.core.mail import send_mail
+from . import outbox
 from django.conf import settings
 from django.contrib import messages
 from django.shortcuts import get_object_or_404, redirect
@@ -1071,13 +1361,13 @@ def book_photoshoot(request, profile_id):
 
         recipient_list = [profile.user.email]
 
-        # ALWAYS send from your Gmail
-        send_mail(
+        # ALWAYS send from your Gmail. Queued; `manage.py send_outbox` delivers it.
+        outbox.enqueue(
             subject,
             message_body,
-            settings.EMAIL_HOST_USER,   # FIXED
             recipient_list,
-            fail_silently=False
+            from_email=settings.EMAIL_HOST_USER,
+            reply_to=[request.user.email] if request.user.email else (),
         )
 
         messages.success(request, "Your booking request has been sent successfully!")
@@ -1128,3 +1418,150 @@ def delete_post(request, pk):
     post.delete()
     return redirect('profile', username=request.user.username)
 
+
+
+
+
+
+
+# -----------------------------
+# Resumable video uploads (tus-style)
+# -----------------------------
+import base64
+import os
+
+from django.http import HttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+
+from .models import ChunkedUpload
+from .uploads import AssembledFile, append_chunk, family
+
+TUS_VERSION = '1.0.0'
+
+
+def _tus_response(status=204, **headers):
+    response = HttpResponse(status=status)
+    response['Tus-Resumable'] = TUS_VERSION
+    response['Cache-Control'] = 'no-store'
+    for name, value in headers.items():
+        response[name.replace('_', '-')] = str(value)
+    return response
+
+
+def _parse_upload_metadata(header):
+    """
+    Upload-Metadata: "filename <base64>,filetype <base64>" -> dict
+    """
+    metadata = {}
+    for pair in filter(None, (p.strip() for p in header.split(','))):
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value).decode() if value else ''
+        except (ValueError, UnicodeDecodeError):
+            continue
+    return metadata
+
+
+@login_required
+@require_POST
+def upload_create(request):
+    """
+    Start a resumable upload.
+    Expects headers Upload-Length and optionally Upload-Metadata (filename).
+    Returns 201 with Location pointing at the upload.
+    """
+    try:
+        length = int(request.headers.get('Upload-Length', ''))
+    except ValueError:
+        return _tus_response(400)
+
+    limit = settings.UPLOAD_MAX_SIZES['video']
+    if length <= 0 or length > limit:
+        return _tus_response(413, Tus_Max_Size=limit)
+
+    metadata = _parse_upload_metadata(request.headers.get('Upload-Metadata', ''))
+    upload = ChunkedUpload.objects.create(
+        user=request.user,
+        filename=os.path.basename(metadata.get('filename', '')) or 'video',
+        length=length,
+    )
+    return _tus_response(
+        201,
+        Location=reverse('upload_detail', args=[upload.id]),
+        Upload_Offset=0,
+    )
+
+
+@login_required
+def upload_detail(request, upload_id):
+    """
+    HEAD   -> current Upload-Offset, so a client can resume.
+    PATCH  -> append a chunk at Upload-Offset (application/offset+octet-stream).
+    DELETE -> abandon the upload.
+    """
+    upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user, post__isnull=True)
+
+    if request.method == 'HEAD':
+        return _tus_response(200, Upload_Offset=upload.offset, Upload_Length=upload.length)
+
+    if request.method == 'DELETE':
+        upload.discard()
+        return _tus_response(204)
+
+    if request.method != 'PATCH':
+        return _tus_response(405)
+
+    if request.content_type != 'application/offset+octet-stream':
+        return _tus_response(415)
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return _tus_response(400)
+
+    if offset != upload.offset:
+        return _tus_response(409, Upload_Offset=upload.offset)
+
+    # No transaction around the body: append_chunk locks the file rather
+    # than the row, and only advances the offset if nobody else has.
+    if append_chunk(upload, offset, request) is None:
+        current = get_object_or_404(ChunkedUpload, pk=upload.pk).offset
+        return _tus_response(409, Upload_Offset=current)
+
+    if upload.content_type and family(upload.content_type) != 'video':
+        upload.discard()
+        return _tus_response(415)
+
+    return _tus_response(204, Upload_Offset=upload.offset)
+
+
+@login_required
+@require_POST
+def upload_finalize(request, upload_id):
+    """
+    Turn a completed upload into a Post.
+    Expects the usual PostForm fields (title, description, location, image).
+    Returns JSON: { 'post_id': int, 'redirect': str }
+    """
+    upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user, post__isnull=True)
+    if not upload.is_complete:
+        return JsonResponse({'error': 'upload incomplete', 'offset': upload.offset}, status=409)
+
+    form = PostForm(request.POST, request.FILES, upload_errors=getattr(request, 'upload_errors', None))
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    with transaction.atomic():
+        post = form.save(commit=False)
+        post.uploader = request.user
+        # Moved (not copied) from CHUNKED_UPLOAD_DIR into storage.
+        with AssembledFile(upload) as assembled:
+            post.video.save(upload.filename, assembled, save=False)
+        post.save()
+        upload.post = post
+        upload.save(update_fields=['post', 'updated_at'])
+
+    return JsonResponse({
+        'post_id': post.id,
+        'redirect': reverse('profile', args=[request.user.username]),
+    })
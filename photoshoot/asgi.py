@@ -3,6 +3,11 @@ ASGI config for photoshoot project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with `GUNICORN_PROFILE=asgi gunicorn` (see gunicorn.conf.py). The
+AJAX endpoints (likes, comments) are async views and run on the event loop
+here; everything else runs in worker threads as under WSGI. Static files
+are served by WhiteNoise in both (main/static.py).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +17,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'photoshoot.settings')
+# Turns on LIVE_UPDATES, which need ASGI.
+os.environ['DJANGO_ASGI'] = '1'
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.metrics.MetricsMiddleware',
+    'main.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,7 +52,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise, able to run in an ASGI stack too (main/static.py).
+    'main.static.StaticFilesMiddleware',
 ]
 
 ROOT_URLCONF = 'photoshoot.urls'
@@ -92,6 +96,17 @@ DATABASES = {
     'default': dj_database_url.parse(os.environ.get("DATABASE_URL"))
 }
 
+# Read replicas (main/replicas.py): DATABASE_REPLICA_URLS is a comma-separated
+# list of URLs, added as aliases replica1, replica2, ... GET/HEAD requests read
+# from one of them unless the browser wrote within DATABASE_PIN_SECONDS; keep
+# that above the usual replication lag.
+DATABASE_REPLICAS = []
+for i, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    DATABASES[f'replica{i}'] = dict(dj_database_url.parse(url.strip()), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica{i}')
+DATABASE_ROUTERS = ['main.replicas.ReplicaRouter']
+DATABASE_PIN_SECONDS = 5
+
 ALLOWED_HOSTS = ['*']
 
 # Password validation
@@ -145,7 +160,6 @@ MEDIA_URL = '/media/'
 # MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 STATIC_URL = '/static/'
-STATICFILES_DIRS = [ BASE_DIR / "media" ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 
@@ -160,7 +174,142 @@ EMAIL_HOST_USER = 'abothulapavani16@gmail.com'
 EMAIL_HOST_PASSWORD = 'iqoj ypdl udmg wvxg'
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Email outbox (main/outbox.py), drained by `python manage.py send_outbox`.
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_BACKOFF_SECONDS = 60
+OUTBOX_BACKOFF_MAX_SECONDS = 60 * 60
+OUTBOX_LEASE_SECONDS = 5 * 60
+
+
+# Uploads are streamed to temp files by main.uploads.StreamingUploadHandler,
+# so file size is limited per type below rather than by how much fits in RAM.
+FILE_UPLOAD_HANDLERS = ['main.uploads.StreamingUploadHandler']
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5 MB of non-file form data
+UPLOAD_MAX_SIZES = {
+    'image': 20 * 1024 * 1024,    # 20 MB
+    'video': 200 * 1024 * 1024,   # 200 MB
+    'other': 5 * 1024 * 1024,     # 5 MB
+}
+UPLOAD_ALLOWED_TYPES = {
+    'image': ('image',),
+    'video': ('video',),
+    'profile_pic': ('image',),
+}
+
 
-# Allow bigger uploads
-DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100 MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100 MB
+# Explore feed pagination (keyset / infinite scroll)
+EXPLORE_PAGE_SIZE = 12
+EXPLORE_MAX_PAGE_SIZE = 48
+
+# Cache shared by all worker processes on this machine. Set REDIS_URL to use
+# Redis instead (needs the `redis` package), which every instance and cron
+# job can reach.
+if os.environ.get('REDIS_URL'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.cache'),
+    }}
+
+# The page cache, profile ETags and feed card fragments (main/pagecache.py)
+# are invalidated by moving versions kept in the cache, which only works if
+# every process that writes (other instances, cron jobs) shares that cache.
+# So they are only on with REDIS_URL; card fragments use the 'cards' alias,
+# or 'uncached' when they were read from a replica.
+PAGE_CACHE_ENABLED = bool(os.environ.get('REDIS_URL'))
+CACHES['uncached'] = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+CACHES['cards'] = CACHES['default'] if PAGE_CACHE_ENABLED else CACHES['uncached']
+
+# Anonymous full-page cache (main/pagecache.py). Pages live at most
+# PAGE_CACHE_TIMEOUT seconds in our cache (they are invalidated on writes
+# anyway); PAGE_CACHE_SHARED_MAX_AGE lets a proxy/CDN reuse them for that
+# many seconds without revalidating (0 = always revalidate via ETag).
+PAGE_CACHE_TIMEOUT = 10 * 60
+PAGE_CACHE_SHARED_MAX_AGE = 0
+# Per-post feed card fragments (main/templatetags/cards.py); keys are versioned,
+# so this only bounds how long unused fragments linger.
+CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Comments popup pagination (get_comments)
+COMMENTS_PAGE_SIZE = 20
+COMMENTS_MAX_PAGE_SIZE = 100
+
+# Batch engagement API (main/engagement.py): posts / like ops per request,
+# and how many latest comments to include per post.
+ENGAGEMENT_MAX_POSTS = 100
+ENGAGEMENT_PREVIEW_COMMENTS = 3
+
+# Live updates over Server-Sent Events (main/live.py). Streams are only served
+# under ASGI, where an idle connection does not hold a worker. LIVE_BROKER
+# fans events out in this process; with several workers use
+# 'main.live.RedisBroker' (defaults to it when REDIS_URL is set).
+LIVE_UPDATES = bool(os.environ.get('DJANGO_ASGI'))
+LIVE_REDIS_URL = os.environ.get('LIVE_REDIS_URL') or os.environ.get('REDIS_URL')
+LIVE_BROKER = 'main.live.RedisBroker' if LIVE_REDIS_URL else 'main.live.MemoryBroker'
+LIVE_MAX_POSTS = 100
+# Seconds between keep-alive pings, seconds before a stream ends (the browser
+# reconnects after LIVE_RETRY_MS), and events a slow stream may fall behind.
+LIVE_HEARTBEAT_SECONDS = 20
+LIVE_STREAM_SECONDS = 10 * 60
+LIVE_RETRY_MS = 3000
+LIVE_QUEUE_SIZE = 100
+
+# Nearby spots API (main/geo.py)
+NEARBY_DEFAULT_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 100
+NEARBY_MAX_RESULTS = 50
+NEARBY_POSTS_PER_LOCATION = 3
+
+# Photo geotagging (main/geotag.py): a post without a location is matched to
+# the nearest existing location within this distance of where its photo was taken.
+GEOTAG_SNAP_KM = 0.2
+
+# Map marker clustering (main/clusters.py): grid cell size in screen pixels,
+# deepest zoom kept pre-aggregated in memory, most cells one request may
+# cover, and how often a process checks for location changes.
+CLUSTER_CELL_PX = 64
+CLUSTER_MAX_ZOOM = 14
+CLUSTER_MAX_CELLS = 4096
+CLUSTER_REFRESH_SECONDS = 5
+
+# Location autocomplete (main/autocomplete.py): results per request by
+# default and at most, and how often a process checks for location changes.
+AUTOCOMPLETE_DEFAULT_RESULTS = 10
+AUTOCOMPLETE_MAX_RESULTS = 25
+AUTOCOMPLETE_REFRESH_SECONDS = 5
+
+# Prometheus metrics at /metrics (main/metrics.py): staff users, or scrapers
+# sending "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Trending: score = sum(weight * decay) over likes/comments, halving every N hours.
+# Refreshed incrementally by `python manage.py refresh_trending`.
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_LIKE_WEIGHT = 2
+TRENDING_COMMENT_WEIGHT = 1
+
+# Image renditions (main/renditions.py): widths generated per image field, in WebP and JPEG.
+RENDITION_WIDTHS = {
+    'image': (320, 640, 1080),
+    'profile_pic': (64, 160, 320),
+}
+# Queued rendition and geotag jobs are leased to a worker for this long; one
+# that dies mid-batch only delays its jobs until then.
+MEDIA_JOB_LEASE_SECONDS = 10 * 60
+
+# Resumable video uploads are assembled here before being moved into MEDIA_ROOT.
+# Keep it on the same filesystem as MEDIA_ROOT so the final move is a rename.
+CHUNKED_UPLOAD_DIR = os.path.join(BASE_DIR, 'uploads_tmp')
+CHUNKED_UPLOAD_EXPIRY_HOURS = 24
+
+# Media serving (main/media.py). Content-addressed blobs are cached for a year;
+# everything else for MEDIA_CACHE_MAX_AGE seconds. Behind nginx/Apache set
+# MEDIA_SENDFILE_HEADER to 'X-Accel-Redirect' (files served from the internal
+# location MEDIA_ACCEL_PREFIX) or 'X-Sendfile' so the web server sends the bytes.
+MEDIA_CACHE_MAX_AGE = 60 * 60
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER') or None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
@@ -26,14 +26,16 @@ from django.urls import path
 
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from main import media, metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('main.urls')),
+    # Served in production too: Range requests, ETags, long-lived caching.
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), media.serve, name='media'),
+    # Prometheus scrape target; staff or METRICS_TOKEN only.
+    path('metrics', metrics.metrics_view, name='metrics'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)